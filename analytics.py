@@ -0,0 +1,167 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+
+from log_index import entry_labels
+
+logger = logging.getLogger(__name__)
+
+# Time windows supported by windowed queries, in hourly buckets
+ANALYSIS_WINDOWS = {
+    "hour": 1,
+    "day": 24,
+    "week": 24 * 7
+}
+
+
+def entry_detection_count(log_entry):
+    """Number of objects recorded by a log entry (image/webcam or video)."""
+    return log_entry.get("detection_count", log_entry.get("total_detections", 0))
+
+
+class DetectionAggregates:
+    def __init__(self):
+        """
+        Initialize running analysis aggregates.
+
+        Totals, per-source, per-class and per-day counters are updated as each
+        log entry is added, and an hourly rollup bucket is kept alongside them
+        so windowed queries only touch the buckets inside the window.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all aggregates."""
+        self.total_detections = 0
+        self.detection_by_source = defaultdict(int)
+        self.detection_by_class = Counter()
+        self.detection_over_time = defaultdict(int)
+        # "YYYY-MM-DDTHH" -> rollup for that hour
+        self.hourly_buckets = {}
+
+    def rebuild(self, logs, summaries=()):
+        """
+        Rebuild all aggregates from a full list of log entries.
+
+        Args:
+            logs: Iterable of log entries
+            summaries: Hourly summary records of compacted log entries
+        """
+        with self._lock:
+            self.reset()
+            for summary in summaries:
+                self._add_counts(summary["hour"], summary["source_type"], summary["total_detections"],
+                                 summary["detection_by_class"])
+            for log_entry in logs:
+                self._add(log_entry)
+
+    def add(self, log_entry):
+        """
+        Fold a single new log entry into the aggregates.
+
+        Args:
+            log_entry: Log entry as written by DetectionLogger
+        """
+        with self._lock:
+            self._add(log_entry)
+
+    def _add(self, log_entry):
+        self._add_counts(log_entry["timestamp"][:13], log_entry["source_type"],
+                         entry_detection_count(log_entry), entry_labels(log_entry))
+
+    def _add_counts(self, hour_key, source_type, count, classes):
+        """Add detections to the totals and to an hour's bucket (classes: labels or a class -> count mapping)."""
+        self.total_detections += count
+        self.detection_by_source[source_type] += count
+        self.detection_by_class.update(classes)
+        self.detection_over_time[hour_key[:10]] += count
+
+        bucket = self.hourly_buckets.get(hour_key)
+        if bucket is None:
+            bucket = {
+                "total_detections": 0,
+                "detection_by_source": defaultdict(int),
+                "detection_by_class": Counter()
+            }
+            self.hourly_buckets[hour_key] = bucket
+        bucket["total_detections"] += count
+        bucket["detection_by_source"][source_type] += count
+        bucket["detection_by_class"].update(classes)
+
+    def drop_before(self, hour_key):
+        """
+        Remove everything counted in hours before hour_key, as if it had never been added.
+
+        Args:
+            hour_key: "YYYY-MM-DDTHH" of the first hour to keep
+        """
+        with self._lock:
+            dropped = [key for key in self.hourly_buckets if key < hour_key]
+            for key in dropped:
+                bucket = self.hourly_buckets.pop(key)
+                self.total_detections -= bucket["total_detections"]
+                for source_type, count in bucket["detection_by_source"].items():
+                    self.detection_by_source[source_type] -= count
+                    if not self.detection_by_source[source_type]:
+                        del self.detection_by_source[source_type]
+                # Counter subtraction also drops classes whose count reaches zero
+                self.detection_by_class -= bucket["detection_by_class"]
+                self.detection_over_time[key[:10]] -= bucket["total_detections"]
+
+            remaining_days = {key[:10] for key in self.hourly_buckets}
+            for day in {key[:10] for key in dropped} - remaining_days:
+                del self.detection_over_time[day]
+
+    def snapshot(self, window=None, now=None):
+        """
+        Return the current analysis data.
+
+        Args:
+            window: None for all-time data, or one of ANALYSIS_WINDOWS
+            now: Reference time for windowed queries (defaults to datetime.now())
+
+        Returns:
+            Dictionary containing various analysis metrics
+        """
+        if window is None:
+            with self._lock:
+                return {
+                    "total_detections": self.total_detections,
+                    "detection_by_source": dict(self.detection_by_source),
+                    "detection_by_class": dict(self.detection_by_class),
+                    "detection_over_time": dict(self.detection_over_time)
+                }
+
+        if window not in ANALYSIS_WINDOWS:
+            raise ValueError(f"Unknown analysis window: {window}")
+
+        hours = ANALYSIS_WINDOWS[window]
+        now = now or datetime.now()
+        # Daily resolution for the week view, hourly otherwise
+        over_time_key_length = 10 if hours > 24 else 13
+
+        total_detections = 0
+        detection_by_source = defaultdict(int)
+        detection_by_class = Counter()
+        detection_over_time = defaultdict(int)
+
+        with self._lock:
+            for offset in range(hours):
+                hour_key = (now - timedelta(hours=offset)).strftime("%Y-%m-%dT%H")
+                bucket = self.hourly_buckets.get(hour_key)
+                if bucket is None:
+                    continue
+                total_detections += bucket["total_detections"]
+                for source_type, count in bucket["detection_by_source"].items():
+                    detection_by_source[source_type] += count
+                detection_by_class.update(bucket["detection_by_class"])
+                detection_over_time[hour_key[:over_time_key_length]] += bucket["total_detections"]
+
+        return {
+            "total_detections": total_detections,
+            "detection_by_source": dict(detection_by_source),
+            "detection_by_class": dict(detection_by_class),
+            "detection_over_time": dict(sorted(detection_over_time.items()))
+        }
@@ -1,40 +1,399 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context, g
 import cv2
-import numpy as np
 import base64
 import time
 import json
+import uuid
 from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
-from detector import ObjectDetector
+from detection_result import DetectionResult, json_default
+from detector import ObjectDetector, detector_options_from_env, parse_input_size
+from inference_service import InferenceClient, authkey_from_env
 from logger import DetectionLogger
+from analytics import ANALYSIS_WINDOWS
+from video_pipeline import VideoPipeline
+from bulk_detect import BulkImageDetector, detach_uploads, iter_upload_images
+from tracker import ObjectTracker, StreamTrackers
+from motion_gate import MotionGate
+from tiling import TiledDetector, parse_rois
+from video_jobs import VideoJobManager, JobQueueFullError
+from frame_gate import LatestFrameGate
+from result_cache import DetectionResultCache
+from metrics import REGISTRY, timed
+from preprocess import ImageDecoder, scale_detections
+from retention import RetentionPolicy
+from ingestion import IngestionScheduler, acquire_ingest_lock, create_source, parse_sources
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+class DetectionJSONProvider(DefaultJSONProvider):
+    """Serializes DetectionResult as its list of detection dictionaries."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, DetectionResult):
+            return o.to_dicts()
+        return DefaultJSONProvider.default(o)
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = DetectionJSONProvider(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "border_security_secret")
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max upload size
+app.config["DETECTOR_OPTIONS"] = detector_options_from_env()
+app.config["DETECTOR_PRELOAD"] = os.environ.get("DETECTOR_PRELOAD", "1") == "1"
+app.config["INFERENCE_SERVICE"] = os.environ.get("INFERENCE_SERVICE", "")  # socket path or "host:port"; empty = in-process
+app.config["LOG_DIR"] = os.environ.get("DETECTION_LOG_DIR", "detection_logs")
+app.config["LOG_FSYNC_POLICY"] = os.environ.get("DETECTION_LOG_FSYNC", "interval")
+app.config["LOG_WRITE_MODE"] = os.environ.get("DETECTION_LOG_WRITE_MODE", "background")  # "sync" = persist before responding
+app.config["LOG_BATCH_SIZE"] = int(os.environ.get("DETECTION_LOG_BATCH_SIZE", "256"))
+app.config["LOG_FLUSH_INTERVAL"] = float(os.environ.get("DETECTION_LOG_FLUSH_INTERVAL", "0.5"))  # seconds
+app.config["LOG_QUEUE_SIZE"] = int(os.environ.get("DETECTION_LOG_QUEUE_SIZE", "10000"))
+app.config["DETECTION_STORE"] = os.environ.get("DETECTION_STORE", "")  # SQLAlchemy URL; empty = JSONL log files
+app.config["LOG_RETENTION_DAYS"] = float(os.environ.get("DETECTION_LOG_RETENTION_DAYS", "0"))  # 0 = keep raw events forever
+app.config["LOG_SUMMARY_RETENTION_DAYS"] = float(os.environ.get("DETECTION_LOG_SUMMARY_RETENTION_DAYS", "0"))  # 0 = forever
+app.config["LOG_COMPACTION_INTERVAL"] = float(os.environ.get("DETECTION_LOG_COMPACTION_INTERVAL", "3600"))  # seconds
+app.config["REDUCED_DECODE"] = os.environ.get("REDUCED_DECODE", "1") == "1"  # decode large JPEGs near model input size
+app.config["ANNOTATED_JPEG_QUALITY"] = int(os.environ.get("ANNOTATED_JPEG_QUALITY", "95"))
+app.config["ANNOTATED_MAX_WIDTH"] = int(os.environ.get("ANNOTATED_MAX_WIDTH", "0"))  # 0 = full resolution
+app.config["RESULT_CACHE_SIZE"] = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+app.config["RESULT_CACHE_MAX_BYTES"] = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+app.config["RESULT_CACHE_DIR"] = os.environ.get("RESULT_CACHE_DIR", "")  # empty = memory only
+app.config["VIDEO_BATCH_SIZE"] = int(os.environ.get("VIDEO_BATCH_SIZE", "8"))
+app.config["VIDEO_SAMPLE_RATE"] = float(os.environ.get("VIDEO_SAMPLE_RATE", "1.0"))  # frames analysed per second
+app.config["VIDEO_WORKERS"] = int(os.environ.get("VIDEO_WORKERS", "0")) or None  # 0 = one per CPU
+app.config["TRACK_DETECT_INTERVAL"] = int(os.environ.get("TRACK_DETECT_INTERVAL", "5"))  # frames between detector runs
+app.config["VIDEO_TRACK_SAMPLE_RATE"] = float(os.environ.get("VIDEO_TRACK_SAMPLE_RATE", "10"))  # frames/second with track=1
+app.config["MOTION_GATE"] = os.environ.get("MOTION_GATE", "1") == "1"  # reuse detections for unchanged frames
+app.config["MOTION_PIXEL_THRESHOLD"] = int(os.environ.get("MOTION_PIXEL_THRESHOLD", "25"))
+app.config["MOTION_MIN_CHANGED"] = float(os.environ.get("MOTION_MIN_CHANGED", "0.005"))  # fraction of changed pixels
+app.config["MOTION_MAX_SKIPPED"] = int(os.environ.get("MOTION_MAX_SKIPPED", "30"))
+app.config["TILE_SIZE"] = os.environ.get("TILE_SIZE", "")  # e.g. "416"; empty = model input size
+app.config["TILE_OVERLAP"] = float(os.environ.get("TILE_OVERLAP", "0.2"))
+app.config["TILE_FULL_FRAME"] = os.environ.get("TILE_FULL_FRAME", "1") == "1"
+app.config["DETECTOR_ROIS"] = parse_rois(os.environ.get("DETECTOR_ROIS", ""))  # {"<source>": [[x, y, w, h], ...]}
+app.config["BULK_BATCH_SIZE"] = int(os.environ.get("BULK_BATCH_SIZE", "8"))  # images per detect_batch call
+app.config["BULK_DECODE_WORKERS"] = int(os.environ.get("BULK_DECODE_WORKERS", "0")) or None  # 0 = one per CPU
+app.config["BULK_MAX_IMAGES"] = int(os.environ.get("BULK_MAX_IMAGES", "10000"))
+app.config["BULK_MAX_CONTENT_LENGTH"] = int(os.environ.get("BULK_MAX_CONTENT_LENGTH", str(1024 * 1024 * 1024)))  # 1GB
+app.config["VIDEO_JOB_WORKERS"] = int(os.environ.get("VIDEO_JOB_WORKERS", "1"))
+app.config["VIDEO_JOB_QUEUE_SIZE"] = int(os.environ.get("VIDEO_JOB_QUEUE_SIZE", "8"))
+app.config["VIDEO_JOB_DIR"] = os.environ.get("VIDEO_JOB_DIR", "video_jobs")
+app.config["VIDEO_JOB_TTL"] = int(os.environ.get("VIDEO_JOB_TTL", "86400"))  # seconds finished job snapshots are kept (0 = forever)
+app.config["INGEST_SOURCES"] = parse_sources(os.environ.get("INGEST_SOURCES", ""))  # [{"name": ..., "url" | "directory": ..., "fps": ...}]
+app.config["INGEST_BATCH_SIZE"] = int(os.environ.get("INGEST_BATCH_SIZE", "8"))  # frames per detect_batch call
+app.config["INGEST_MAX_LAG"] = float(os.environ.get("INGEST_MAX_LAG", "2.0"))  # seconds before a stream frame is dropped
+app.config["INGEST_LOCK_FILE"] = os.environ.get("INGEST_LOCK_FILE", "ingest.lock")
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"  # stage/route timings and /metrics
+
+# Stage timings in detector.py and logger.py use the same process-wide registry
+REGISTRY.enabled = app.config["METRICS_ENABLED"]
 
 # Create upload folder if it doesn't exist
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
 # Initialize object detector and logger
-detector = ObjectDetector()
-detection_logger = DetectionLogger()
+detector = ObjectDetector(**app.config["DETECTOR_OPTIONS"])
+image_decoder = ImageDecoder(detector.model.input_size, reduced=app.config["REDUCED_DECODE"])
+
+# Detection runs in the shared inference service when one is configured;
+# the local detector is then only used for drawing and never loads its model
+if app.config["INFERENCE_SERVICE"]:
+    # Required: the service only accepts clients presenting its INFERENCE_AUTHKEY
+    inference = InferenceClient(app.config["INFERENCE_SERVICE"], authkey=authkey_from_env())
+else:
+    inference = detector
+if app.config["DETECTOR_PRELOAD"] and inference is detector:
+    # Load and warm up in the background; requests arriving earlier wait for it
+    detector.load_async()
+# Raw events past their retention period are compacted into hourly summaries
+retention = RetentionPolicy(
+    raw_days=app.config["LOG_RETENTION_DAYS"],
+    summary_days=app.config["LOG_SUMMARY_RETENTION_DAYS"],
+    interval=app.config["LOG_COMPACTION_INTERVAL"]
+)
+if app.config["DETECTION_STORE"]:
+    # Optional dependency: only needed when a database store is configured
+    from sql_store import SqlDetectionLogger
+    detection_logger = SqlDetectionLogger(
+        app.config["DETECTION_STORE"],
+        import_log_dir=app.config["LOG_DIR"],
+        write_mode=app.config["LOG_WRITE_MODE"],
+        batch_size=app.config["LOG_BATCH_SIZE"],
+        flush_interval=app.config["LOG_FLUSH_INTERVAL"],
+        max_queued=app.config["LOG_QUEUE_SIZE"],
+        retention=retention
+    )
+else:
+    detection_logger = DetectionLogger(
+        log_dir=app.config["LOG_DIR"],
+        fsync_policy=app.config["LOG_FSYNC_POLICY"],
+        write_mode=app.config["LOG_WRITE_MODE"],
+        batch_size=app.config["LOG_BATCH_SIZE"],
+        flush_interval=app.config["LOG_FLUSH_INTERVAL"],
+        max_queued=app.config["LOG_QUEUE_SIZE"],
+        retention=retention
+    )
+motion_gate = MotionGate(
+    pixel_threshold=app.config["MOTION_PIXEL_THRESHOLD"],
+    min_changed_ratio=app.config["MOTION_MIN_CHANGED"],
+    max_skipped=app.config["MOTION_MAX_SKIPPED"]
+) if app.config["MOTION_GATE"] else None
+webcam_trackers = StreamTrackers(lambda: ObjectTracker(inference, detect_interval=app.config["TRACK_DETECT_INTERVAL"]))
+webcam_frame_gate = LatestFrameGate()
+result_cache = DetectionResultCache(
+    max_entries=app.config["RESULT_CACHE_SIZE"],
+    max_bytes=app.config["RESULT_CACHE_MAX_BYTES"],
+    disk_dir=app.config["RESULT_CACHE_DIR"] or None
+)
+video_jobs = VideoJobManager(
+    inference,
+    detection_logger,
+    workers=app.config["VIDEO_JOB_WORKERS"],
+    max_queued=app.config["VIDEO_JOB_QUEUE_SIZE"],
+    job_dir=app.config["VIDEO_JOB_DIR"],
+    snapshot_ttl=app.config["VIDEO_JOB_TTL"] or None,
+    pipeline_options={
+        "batch_size": app.config["VIDEO_BATCH_SIZE"],
+        "workers": app.config["VIDEO_WORKERS"],
+        "motion_gate": motion_gate,
+        "target_size": detector.model.input_size
+    }
+)
+
+# Server-side ingestion from cameras, video files and drop directories; with
+# several gunicorn workers only the one holding the lock file ingests
+ingest_scheduler = None
+if app.config["INGEST_SOURCES"]:
+    ingest_lock = acquire_ingest_lock(app.config["INGEST_LOCK_FILE"])
+    if ingest_lock is not None:
+        ingest_scheduler = IngestionScheduler(
+            inference,
+            detection_logger,
+            [create_source(spec, decode=image_decoder.decode) for spec in app.config["INGEST_SOURCES"]],
+            batch_size=app.config["INGEST_BATCH_SIZE"],
+            max_lag=app.config["INGEST_MAX_LAG"]
+        )
+        ingest_scheduler.start()
+
+request_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+REGISTRY.callback("video_job_queue_depth", "Video jobs waiting to start", video_jobs.queue_depth)
+if detection_logger.writer is not None:
+    REGISTRY.callback("detection_log_queue_depth", "Log entries waiting for the background writer",
+                      detection_logger.writer.queue_depth)
+if detection_logger.compactor is not None:
+    REGISTRY.callback("detection_log_events_compacted_total", "Log entries compacted into hourly summaries",
+                      lambda: detection_logger.compactor.stats()["events_compacted"], metric_type="counter")
+    REGISTRY.callback("detection_log_compaction_seconds", "Duration of the last log compaction run",
+                      lambda: detection_logger.compactor.stats()["last_duration"])
+REGISTRY.callback(
+    "result_cache_lookups_total", "Result cache lookups by outcome",
+    lambda: {(outcome,): result_cache.stats()[outcome] for outcome in ("hits", "disk_hits", "misses")},
+    metric_type="counter", labelnames=("outcome",))
+REGISTRY.callback("result_cache_hit_rate", "Fraction of result cache lookups served from cache",
+                  lambda: result_cache.stats()["hit_rate"])
+REGISTRY.callback("result_cache_entries", "Entries in the result cache", lambda: result_cache.stats()["entries"])
+REGISTRY.callback("result_cache_bytes", "Bytes held by the result cache", lambda: result_cache.stats()["bytes"])
+REGISTRY.callback(
+    "image_decodes_total", "Uploaded images decoded, by resolution",
+    lambda: {("reduced",): image_decoder.stats()["reduced_decodes"],
+             ("full",): image_decoder.stats()["decoded"] - image_decoder.stats()["reduced_decodes"]},
+    metric_type="counter", labelnames=("resolution",))
+REGISTRY.callback(
+    "webcam_frames_total", "Webcam frames admitted or dropped by the latest-frame gate",
+    lambda: {(key.split("_")[1],): count for key, count in webcam_frame_gate.stats().items()},
+    metric_type="counter", labelnames=("state",))
+if motion_gate is not None:
+    REGISTRY.callback("motion_gate_frames_checked_total", "Frames checked by the motion gate",
+                      lambda: motion_gate.stats()["frames_checked"], metric_type="counter")
+    REGISTRY.callback("motion_gate_inferences_skipped_total", "Detector runs skipped on static frames",
+                      lambda: motion_gate.stats()["inferences_skipped"], metric_type="counter")
+if ingest_scheduler is not None:
+    REGISTRY.callback(
+        "ingest_frames_total", "Ingested frames by source and outcome",
+        lambda: {(source["name"], state): source[f"frames_{state}"]
+                 for source in ingest_scheduler.stats()["sources"]
+                 for state in ("read", "processed", "dropped", "stale")},
+        metric_type="counter", labelnames=("source", "state"))
+    REGISTRY.callback(
+        "ingest_lag_seconds", "Smoothed capture-to-log lag per ingestion source",
+        lambda: {(source["name"],): source["lag_seconds"] for source in ingest_scheduler.stats()["sources"]},
+        labelnames=("source",))
+    REGISTRY.callback(
+        "ingest_throughput_fps", "Frames processed per second per ingestion source",
+        lambda: {(source["name"],): source["throughput_fps"] for source in ingest_scheduler.stats()["sources"]},
+        labelnames=("source",))
 
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
 ALLOWED_VIDEO_EXTENSIONS = {"mp4", "avi", "mov", "mkv"}
 
+# Log page sizes
+DEFAULT_LOG_PAGE_SIZE = 100
+MAX_LOG_PAGE_SIZE = 1000
+
+@app.before_request
+def start_request_timer():
+    if REGISTRY.enabled:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses are timed up to the first byte
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        request_seconds.observe(time.perf_counter() - start, route, request.method, str(response.status_code))
+    return response
+
 def allowed_file(filename, allowed_extensions):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in allowed_extensions
 
+def motion_gated_detect(stream_id, decoded, enabled=True, engine=None):
+    """
+    Run detection unless the frame is unchanged since the stream's last detector run.
+    
+    Reused detections are only valid for the same engine on the same decode
+    scale, so the gate keeps separate state per (stream id, engine
+    signature, decode scale). Frames without a stream id always run the
+    detector, since there is nothing to tell one client's stream from another's.
+    
+    Args:
+        stream_id: Client-supplied stream id, or None
+        decoded: DecodedImage to run detection on
+        engine: Detector to run (defaults to the shared inference detector)
+    
+    Returns:
+        Tuple of (detections in decoded image coordinates, whether inference was skipped)
+    """
+    engine = engine or inference
+    with timed("detect"):
+        if motion_gate is None or not enabled or not stream_id:
+            return engine.detect(decoded.image), False
+        source = (stream_id, engine.config_signature(), decoded.scale)
+        return motion_gate.detect(source, decoded.image, engine.detect)
+
+def parse_tiled_option(values):
+    """tiled defaults to off; "1"/"true" runs the detector on overlapping tiles."""
+    return str(values.get("tiled", "0")).lower() in ("1", "true", "yes")
+
+def tiled_detector(*sources):
+    """
+    TiledDetector over the ROIs configured for the first matching source name.
+    
+    Falls back to the "default" ROIs, then to the whole frame.
+    """
+    rois = app.config["DETECTOR_ROIS"]
+    regions = next((rois[source] for source in (*sources, "default") if source in rois), None)
+    return TiledDetector(
+        inference,
+        tile_size=parse_input_size(app.config["TILE_SIZE"]) or detector.model.input_size,
+        overlap=app.config["TILE_OVERLAP"],
+        rois=regions,
+        full_frame=app.config["TILE_FULL_FRAME"]
+    )
+
+def parse_motion_option(values):
+    """motion defaults to on; "0"/"false" always runs the detector."""
+    return str(values.get("motion", "1")).lower() not in ("0", "false", "no")
+
+def parse_render_options(values):
+    """
+    Parse response rendering options from form fields, query args or a JSON body.
+    
+    annotate defaults to on; "0"/"false" returns detections only so the
+    client can draw the boxes itself. jpeg_quality and max_width apply to the
+    annotated image.
+    
+    Raises:
+        ValueError: If an option is malformed
+    """
+    annotate = str(values.get("annotate", "1")).lower() not in ("0", "false", "no")
+    jpeg_quality = int(values.get("jpeg_quality") or app.config["ANNOTATED_JPEG_QUALITY"])
+    max_width = int(values.get("max_width") or app.config["ANNOTATED_MAX_WIDTH"])
+    if not 1 <= jpeg_quality <= 100:
+        raise ValueError("jpeg_quality must be between 1 and 100")
+    if max_width < 0:
+        raise ValueError("max_width must not be negative")
+    return {"annotate": annotate, "jpeg_quality": jpeg_quality, "max_width": max_width}
+
+def encode_annotated_image(img, results, jpeg_quality, max_width=0, image_scale=1):
+    """
+    Draw detections and encode the image as a base64 JPEG data URL.
+    
+    Large images are downscaled before drawing when max_width is set, so the
+    draw and encode passes only touch the output resolution.
+    
+    Args:
+        image_scale: Original image size divided by img's size; results are
+            in original image coordinates
+    """
+    height, width = img.shape[:2]
+    scale = 1 / image_scale
+    resized = max_width and width > max_width
+    if resized:
+        img = cv2.resize(img, (max_width, int(round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+        scale *= max_width / width
+    results = scale_detections(results, scale)
+    # A resized image is already a private buffer, so draw in place
+    img_with_detections = detector.draw_detections(img, results, copy=not resized)
+    
+    with timed("encode"):
+        _, buffer = cv2.imencode(".jpg", img_with_detections, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        return "data:image/jpeg;base64," + base64.b64encode(buffer).decode("utf-8")
+
+def encode_annotated_upload(decoded, img_bytes, results, render):
+    """
+    Annotate an uploaded image, decoding it again if the detection decode is too small.
+    
+    Detection may have used a reduced decode; the annotated image keeps the
+    resolution it always had (full size, or max_width), so it is drawn on a
+    decode that is at least that large.
+    
+    Args:
+        decoded: DecodedImage used for detection (None to always decode)
+        img_bytes: Encoded upload
+        results: Detections in original image coordinates
+        render: Options from parse_render_options()
+    """
+    max_width = render["max_width"]
+    if decoded is None or decoded.image.shape[1] < min(max_width or decoded.original_size[0], decoded.original_size[0]):
+        decoded = image_decoder.decode(img_bytes, min_width=max_width, full_resolution=not max_width)
+    return encode_annotated_image(decoded.image, results, render["jpeg_quality"], max_width, decoded.scale)
+
+def parse_log_query_args(args):
+    """
+    Parse log filter and pagination query parameters.
+    
+    Raises:
+        ValueError: If a parameter is malformed
+    """
+    query = {
+        "source_type": args.get("source_type") or None,
+        "detected_class": args.get("class") or None,
+        "summary": args.get("view", "summary") != "full",
+        "limit": min(args.get("limit", DEFAULT_LOG_PAGE_SIZE, type=int), MAX_LOG_PAGE_SIZE)
+    }
+    if query["limit"] < 1:
+        raise ValueError("limit must be positive")
+    
+    for key in ("since", "until"):
+        if args.get(key):
+            # Normalize so timestamps compare correctly against stored ISO strings
+            query[key] = datetime.fromisoformat(args[key]).isoformat()
+    if args.get("min_confidence"):
+        query["min_confidence"] = float(args["min_confidence"])
+    if args.get("cursor"):
+        query["cursor"] = int(args["cursor"])
+    
+    return query
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -53,12 +412,15 @@ def webcam():
 
 @app.route("/logs")
 def logs():
-    all_logs = detection_logger.get_all_logs()
-    return render_template("logs.html", logs=all_logs)
+    first_page, _ = detection_logger.query_logs(limit=DEFAULT_LOG_PAGE_SIZE)
+    return render_template("logs.html", logs=first_page)
 
 @app.route("/analysis")
 def analysis():
-    analysis_data = detection_logger.get_analysis_data()
+    window = request.args.get("window")
+    if window not in ANALYSIS_WINDOWS:
+        window = None
+    analysis_data = detection_logger.get_analysis_data(window)
     return render_template("analysis.html", analysis_data=analysis_data)
 
 @app.route("/api/detect/image", methods=["POST"])
@@ -72,15 +434,37 @@ def detect_image():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+        try:
+            render = parse_render_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid render options: {str(e)}"}), 400
+        
         try:
             # Read image file
             img_bytes = file.read()
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             
-            # Run detection
+            # Tiled mode covers the image's ROIs with model-sized tiles to find small objects
+            engine = tiled_detector("image") if parse_tiled_option(request.form) else inference
+            
+            # Look up a previous result for identical bytes under the same detector configuration
+            result_cache.check_signature(inference.config_signature())
+            cache_key = result_cache.make_key(img_bytes, f"{engine.config_signature()}|{image_decoder.signature()}")
+            render_key = result_cache.render_key(render["jpeg_quality"], render["max_width"])
+            cached = result_cache.get(cache_key)
+            
+            decoded = None
             start_time = time.time()
-            results = detector.detect(img)
+            if cached is not None:
+                results = cached["detections"]
+            else:
+                # Tiles are cut from the full-resolution image
+                decoded = image_decoder.decode(img_bytes, full_resolution=engine is not inference)
+                if decoded is None:
+                    return jsonify({"error": "Could not decode image data"}), 400
+                
+                # Run detection
+                with timed("detect"):
+                    results = decoded.to_original(engine.detect(decoded.image))
             process_time = time.time() - start_time
             
             # Log detection
@@ -88,19 +472,24 @@ def detect_image():
             source_name = secure_filename(file.filename)
             detection_logger.log_detection(source_type, source_name, results, process_time)
             
-            # Draw detections
-            img_with_detections = detector.draw_detections(img, results)
-            
-            # Encode result as base64 string
-            _, buffer = cv2.imencode(".jpg", img_with_detections)
-            img_str = base64.b64encode(buffer).decode("utf-8")
-            
-            return jsonify({
+            response = {
                 "success": True,
-                "image": f"data:image/jpeg;base64,{img_str}",
                 "detections": results,
-                "process_time": process_time
-            })
+                "process_time": process_time,
+                "cached": cached is not None
+            }
+            
+            # Draw and encode detections unless the client renders them itself
+            if render["annotate"]:
+                image = cached["images"].get(render_key) if cached is not None else None
+                if image is None:
+                    image = encode_annotated_upload(decoded, img_bytes, results, render)
+                    result_cache.put(cache_key, results, render_key, image)
+                response["image"] = image
+            elif cached is None:
+                result_cache.put(cache_key, results)
+            
+            return jsonify(response)
             
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
@@ -108,6 +497,79 @@ def detect_image():
     
     return jsonify({"error": "File type not allowed"}), 400
 
+@app.route("/api/detect/images", methods=["POST"])
+def detect_images():
+    """
+    Bulk image detection: many images per request, results streamed as NDJSON.
+    
+    Form fields:
+        files: Image files and/or .zip/.tar(.gz) archives of images (repeatable)
+        annotate: "1" to also return annotated images as JPEG data URLs
+        jpeg_quality, max_width: Encoding options for the annotated images
+        tiled: "1" to detect on overlapping tiles over the image ROIs
+    """
+    # A folder of snapshots is far larger than the single-image upload limit
+    request.max_content_length = app.config["BULK_MAX_CONTENT_LENGTH"]
+    request.max_form_parts = app.config["BULK_MAX_IMAGES"] + 100
+    
+    files = [file for file in request.files.getlist("files") + request.files.getlist("file") if file.filename]
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    
+    try:
+        # Detections only unless the client opts in to annotated images
+        render = parse_render_options({"annotate": "0", **request.form.to_dict()})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid render options: {str(e)}"}), 400
+    
+    tiled = parse_tiled_option(request.form)
+    engine = tiled_detector("image") if tiled else inference
+    # Annotated images keep their usual resolution, so decode at least that large
+    min_width = render["max_width"] if render["annotate"] else 0
+    full_resolution = tiled or (render["annotate"] and not min_width)
+    bulk = BulkImageDetector(
+        engine,
+        batch_size=app.config["BULK_BATCH_SIZE"],
+        workers=app.config["BULK_DECODE_WORKERS"],
+        max_images=app.config["BULK_MAX_IMAGES"],
+        decode=lambda data: image_decoder.decode(data, min_width=min_width, full_resolution=full_resolution)
+    )
+    return Response(
+        stream_with_context(stream_bulk_detections(bulk, detach_uploads(files), render)),
+        mimetype="application/x-ndjson"
+    )
+
+def stream_bulk_detections(bulk, uploads, render):
+    """Yield an NDJSON line per image as its batch completes, then log every result in one bulk write."""
+    records = []
+    failed = 0
+    try:
+        for result in bulk.detect(iter_upload_images(uploads, ALLOWED_IMAGE_EXTENSIONS)):
+            img = result.pop("image", None)
+            image_scale = result.pop("image_scale", 1)
+            if "error" in result:
+                failed += 1
+            else:
+                records.append((result["name"], result["detections"], result["process_time"]))
+                if render["annotate"]:
+                    result["image"] = encode_annotated_image(
+                        img, result["detections"], render["jpeg_quality"], render["max_width"], image_scale)
+            yield json.dumps({"type": "image", **result}, default=json_default) + "\n"
+        
+        yield json.dumps({
+            "type": "complete",
+            "success": True,
+            "message": f"{len(records)} images processed, {failed} failed.",
+            "processed": len(records),
+            "failed": failed
+        }) + "\n"
+    except Exception as e:
+        logger.error(f"Error processing images: {str(e)}")
+        yield json.dumps({"type": "error", "error": f"Error processing images: {str(e)}"}) + "\n"
+    finally:
+        # Log what was processed even if the client went away mid-stream
+        detection_logger.log_detections_bulk("image", records)
+
 @app.route("/api/detect/video", methods=["POST"])
 def detect_video():
     if "file" not in request.files:
@@ -119,62 +581,160 @@ def detect_video():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename, ALLOWED_VIDEO_EXTENSIONS):
+        track = request.form.get("track") == "1"
+        engine = tiled_detector(secure_filename(file.filename), "video") if parse_tiled_option(request.form) else inference
+        default_rate = app.config["VIDEO_TRACK_SAMPLE_RATE"] if track else app.config["VIDEO_SAMPLE_RATE"]
         try:
-            # Save the file temporarily
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            file.save(filepath)
-            
-            # Process video (frame by frame)
-            cap = cv2.VideoCapture(filepath)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Process only a subset of frames for efficiency (1 frame per second)
-            sample_frames = max(1, int(fps))
-            current_frame = 0
-            all_detections = []
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Process only selected frames
-                if current_frame % sample_frames == 0:
-                    # Detect objects in the frame
-                    results = detector.detect(frame)
-                    timestamp = current_frame / fps
-                    all_detections.append({
-                        "timestamp": timestamp,
-                        "detections": results
-                    })
-                
-                current_frame += 1
-            
-            cap.release()
-            
-            # Remove the temporary file
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            sample_rate = request.form.get("sample_rate", default_rate, type=float)
+            pipeline = VideoPipeline(
+                engine,
+                sample_rate=sample_rate,
+                batch_size=app.config["VIDEO_BATCH_SIZE"],
+                workers=app.config["VIDEO_WORKERS"],
+                target_size=detector.model.input_size,
+                # The tracker needs every frame; it skips the detector itself
+                motion_gate=motion_gate if parse_motion_option(request.form) and not track else None
+            )
+        except ValueError as e:
+            return jsonify({"error": f"Invalid sampling rate: {str(e)}"}), 400
+        
+        # Save the file temporarily (unique name so concurrent uploads don't collide)
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{filename}")
+        file.save(filepath)
+        
+        # With tracking the detector only runs every few frames; tracks fill in the rest
+        tracker = ObjectTracker(engine, detect_interval=app.config["TRACK_DETECT_INTERVAL"]) if track else None
+        
+        if request.form.get("stream") == "1":
+            # Progressive results as NDJSON, one line per analysed frame
+            return Response(
+                stream_with_context(stream_video_detections(pipeline, filepath, filename, tracker)),
+                mimetype="application/x-ndjson"
+            )
+        
+        try:
+            if tracker is not None:
+                all_detections = list(pipeline.track(filepath, tracker))
+            else:
+                all_detections = list(pipeline.process(filepath))
             
             # Log detection
             source_type = "video"
             source_name = filename
             detection_logger.log_video_detection(source_type, source_name, all_detections)
             
-            return jsonify({
+            response = {
                 "success": True,
                 "message": f"Video processed. {len(all_detections)} frames analyzed.",
                 "detections": all_detections
-            })
+            }
+            if tracker is not None:
+                response["tracks"] = tracker.summary()
+                response["detector_runs"] = tracker.detector_runs
+            return jsonify(response)
             
         except Exception as e:
             logger.error(f"Error processing video: {str(e)}")
             return jsonify({"error": f"Error processing video: {str(e)}"}), 500
+        finally:
+            # Remove the temporary file
+            if os.path.exists(filepath):
+                os.remove(filepath)
     
     return jsonify({"error": "File type not allowed"}), 400
 
+def stream_video_detections(pipeline, filepath, filename, tracker=None):
+    """Yield NDJSON lines for each analysed frame, then log the whole video."""
+    all_detections = []
+    try:
+        frames = pipeline.track(filepath, tracker) if tracker is not None else pipeline.process(filepath)
+        for frame_result in frames:
+            all_detections.append(frame_result)
+            yield json.dumps({"type": "frame", **frame_result}, default=json_default) + "\n"
+        
+        detection_logger.log_video_detection("video", filename, all_detections)
+        complete = {
+            "type": "complete",
+            "success": True,
+            "message": f"Video processed. {len(all_detections)} frames analyzed."
+        }
+        if tracker is not None:
+            complete["tracks"] = tracker.summary()
+            complete["detector_runs"] = tracker.detector_runs
+        yield json.dumps(complete) + "\n"
+    except Exception as e:
+        logger.error(f"Error processing video: {str(e)}")
+        yield json.dumps({"type": "error", "error": f"Error processing video: {str(e)}"}) + "\n"
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+@app.route("/api/jobs/video", methods=["POST"])
+def submit_video_job():
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    
+    file = request.files["file"]
+    
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+    
+    if not allowed_file(file.filename, ALLOWED_VIDEO_EXTENSIONS):
+        return jsonify({"error": "File type not allowed"}), 400
+    
+    sample_rate = request.form.get("sample_rate", app.config["VIDEO_SAMPLE_RATE"], type=float)
+    if sample_rate <= 0:
+        return jsonify({"error": "Invalid sampling rate: sample_rate must be positive"}), 400
+    
+    # Refuse early, before accepting the upload onto disk
+    if video_jobs.queue_depth() >= app.config["VIDEO_JOB_QUEUE_SIZE"]:
+        return jsonify({"error": "Video job queue is full, try again later"}), 503, {"Retry-After": "10"}
+    
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{filename}")
+    file.save(filepath)
+    
+    try:
+        job = video_jobs.submit(filepath, filename, sample_rate)
+    except JobQueueFullError as e:
+        os.remove(filepath)
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "10"}
+    
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": url_for("get_video_job", job_id=job.id),
+        "result_url": url_for("get_video_job_result", job_id=job.id)
+    }), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_video_job(job_id):
+    # Partial detections are returned from index `since` onwards so clients can poll incrementally
+    since = request.args.get("since", 0, type=int)
+    job = video_jobs.get(job_id, since=since)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def get_video_job_result(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"], "job_id": job_id}), 500
+    if job["status"] != "completed":
+        return jsonify({"success": False, "status": job["status"], "progress": job["progress"]}), 202
+    
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "message": f"Video processed. {len(job['detections'])} frames analyzed.",
+        "detections": job["detections"]
+    })
+
 @app.route("/api/detect/webcam", methods=["POST"])
 def detect_webcam():
     try:
@@ -183,15 +743,26 @@ def detect_webcam():
         if not content or "image" not in content:
             return jsonify({"error": "No image data provided"}), 400
         
+        try:
+            render = parse_render_options(content)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid render options: {str(e)}"}), 400
+        
         # Decode base64 image
-        img_data = content["image"].split(",")[1]
-        img_bytes = base64.b64decode(img_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with timed("base64"):
+            img_data = content["image"].split(",")[1]
+            img_bytes = base64.b64decode(img_data)
+        tiled = parse_tiled_option(content)
+        decoded = image_decoder.decode(img_bytes, full_resolution=tiled)
+        if decoded is None:
+            return jsonify({"error": "Could not decode image data"}), 400
         
-        # Run detection
+        # Run detection, reusing the last result if the camera view hasn't changed
         start_time = time.time()
-        results = detector.detect(img)
+        stream_id = content.get("stream")
+        engine = tiled_detector(stream_id, "webcam") if tiled else None
+        results, motion_skipped = motion_gated_detect(stream_id, decoded, parse_motion_option(content), engine)
+        results = decoded.to_original(results)
         process_time = time.time() - start_time
         
         # Log detection
@@ -199,46 +770,173 @@ def detect_webcam():
         source_name = "live-feed"
         detection_logger.log_detection(source_type, source_name, results, process_time)
         
-        # Draw detections
-        img_with_detections = detector.draw_detections(img, results)
-        
-        # Encode result as base64 string
-        _, buffer = cv2.imencode(".jpg", img_with_detections)
-        img_str = base64.b64encode(buffer).decode("utf-8")
-        
-        return jsonify({
+        response = {
             "success": True,
-            "image": f"data:image/jpeg;base64,{img_str}",
             "detections": results,
+            "motion_skipped": motion_skipped,
             "process_time": process_time
-        })
+        }
+        
+        # Draw and encode detections unless the client renders them itself
+        if render["annotate"]:
+            response["image"] = encode_annotated_upload(decoded, img_bytes, results, render)
+        
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error processing webcam image: {str(e)}")
         return jsonify({"error": f"Error processing webcam image: {str(e)}"}), 500
 
+@app.route("/api/detect/webcam/frame", methods=["POST"])
+def detect_webcam_frame():
+    """
+    Streaming webcam path: the body is a raw JPEG frame (no base64/JSON wrapping).
+    
+    Query parameters:
+        stream: Client stream id (required), so each browser session is gated separately
+        seq: Increasing frame sequence number used to drop stale frames
+        annotate: "1" to also return the annotated frame as a JPEG data URL
+        jpeg_quality, max_width: Encoding options for the annotated frame
+        track: "1" to track objects across the stream's frames, running the
+            detector only every few frames and tagging detections with track ids
+        motion: "0" to run the detector even when the frame is unchanged
+        tiled: "1" to detect on overlapping tiles over the stream's ROIs
+    """
+    img_bytes = request.get_data()
+    if not img_bytes:
+        return jsonify({"error": "No image data provided"}), 400
+    
+    stream_id = request.args.get("stream")
+    if not stream_id:
+        return jsonify({"error": "No stream id provided"}), 400
+    seq = request.args.get("seq", 0, type=int)
+    track = request.args.get("track") == "1"
+    try:
+        # Detections only unless the client opts in to an annotated frame
+        render = parse_render_options({"annotate": "0", **request.args.to_dict()})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid render options: {str(e)}"}), 400
+    
+    with webcam_frame_gate.admit(stream_id, seq) as admitted:
+        if not admitted:
+            # A newer frame from this stream is already waiting; skip this one
+            return jsonify({"success": True, "dropped": True, "seq": seq})
+        
+        try:
+            tiled = parse_tiled_option(request.args) and not track
+            decoded = image_decoder.decode(img_bytes, full_resolution=tiled)
+            if decoded is None:
+                return jsonify({"error": "Could not decode image data"}), 400
+            
+            # Run detection (or follow existing tracks between detector runs)
+            start_time = time.time()
+            if track:
+                with timed("detect"):
+                    results, detector_ran = webcam_trackers.get(stream_id).update(decoded.image)
+            else:
+                engine = tiled_detector(stream_id, "webcam") if tiled else None
+                results, motion_skipped = motion_gated_detect(stream_id, decoded, parse_motion_option(request.args), engine)
+                detector_ran = not motion_skipped
+            results = decoded.to_original(results)
+            process_time = time.time() - start_time
+            
+            # Log detection
+            detection_logger.log_detection("webcam", "live-feed", results, process_time)
+            
+            response = {
+                "success": True,
+                "dropped": False,
+                "detector_ran": detector_ran,
+                "seq": seq,
+                "width": decoded.original_size[0],
+                "height": decoded.original_size[1],
+                "detections": results,
+                "process_time": process_time
+            }
+            
+            if render["annotate"]:
+                response["image"] = encode_annotated_upload(decoded, img_bytes, results, render)
+            
+            return jsonify(response)
+            
+        except Exception as e:
+            logger.error(f"Error processing webcam frame: {str(e)}")
+            return jsonify({"error": f"Error processing webcam frame: {str(e)}"}), 500
+
 @app.route("/api/logs", methods=["GET"])
 def get_logs():
     try:
-        logs = detection_logger.get_all_logs()
-        return jsonify({"success": True, "logs": logs})
+        query = parse_log_query_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid log query: {str(e)}"}), 400
+    
+    try:
+        logs, next_cursor = detection_logger.query_logs(**query)
+        return jsonify({
+            "success": True,
+            "logs": logs,
+            "next_cursor": next_cursor,
+            "total_logs": detection_logger.count(),
+            "source_types": detection_logger.get_source_types()
+        })
     except Exception as e:
         logger.error(f"Error retrieving logs: {str(e)}")
         return jsonify({"error": f"Error retrieving logs: {str(e)}"}), 500
 
+@app.route("/api/logs/<int:log_id>", methods=["GET"])
+def get_log(log_id):
+    log_entry = detection_logger.get_log(log_id)
+    if log_entry is None:
+        return jsonify({"error": "Log entry not found"}), 404
+    return jsonify({"success": True, "log": log_entry})
+
 @app.route("/api/logs/webcam", methods=["GET"])
 def get_webcam_logs():
     try:
-        webcam_logs = detection_logger.get_logs_by_source_type("webcam")
-        return jsonify({"success": True, "logs": webcam_logs})
+        query = parse_log_query_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid log query: {str(e)}"}), 400
+    query["source_type"] = "webcam"
+    
+    try:
+        webcam_logs, next_cursor = detection_logger.query_logs(**query)
+        return jsonify({"success": True, "logs": webcam_logs, "next_cursor": next_cursor})
     except Exception as e:
         logger.error(f"Error retrieving webcam logs: {str(e)}")
         return jsonify({"error": f"Error retrieving webcam logs: {str(e)}"}), 500
 
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({"success": True, "stats": result_cache.stats()})
+
+@app.route("/api/motion/stats", methods=["GET"])
+def get_motion_stats():
+    if motion_gate is None:
+        return jsonify({"success": True, "enabled": False})
+    return jsonify({"success": True, "enabled": True, "stats": motion_gate.stats()})
+
+@app.route("/api/ingest/stats", methods=["GET"])
+def get_ingest_stats():
+    """Per-source ingestion stats (only the process running the ingestion reports them)."""
+    if ingest_scheduler is None:
+        return jsonify({"success": True, "enabled": False})
+    return jsonify({"success": True, "enabled": True, "stats": ingest_scheduler.stats()})
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus scrape endpoint (per process; each gunicorn worker reports its own)."""
+    if not REGISTRY.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/analysis", methods=["GET"])
 def get_analysis():
+    window = request.args.get("window")
+    if window is not None and window not in ANALYSIS_WINDOWS:
+        return jsonify({"error": f"Unknown window: {window}"}), 400
+    
     try:
-        analysis_data = detection_logger.get_analysis_data()
+        analysis_data = detection_logger.get_analysis_data(window)
         return jsonify({"success": True, "data": analysis_data})
     except Exception as e:
         logger.error(f"Error retrieving analysis data: {str(e)}")
@@ -0,0 +1,310 @@
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from preprocess import BlobBuilder
+
+logger = logging.getLogger(__name__)
+
+# Registered backend classes by name
+BACKENDS = {}
+
+
+def register_backend(name):
+    """Class decorator adding a DetectorBackend subclass to the registry."""
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def create_backend(name, **options):
+    """
+    Instantiate a registered backend (without loading its model).
+
+    Args:
+        name: Registered backend name
+        **options: DetectorBackend keyword arguments
+
+    Raises:
+        ValueError: If no backend is registered under that name
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {name} (available: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name](**options)
+
+
+def _empty_result():
+    return (np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32))
+
+
+class DetectorBackend:
+    name = None
+    # (width, height) the network expects unless overridden
+    default_input_size = None
+    default_conf_threshold = 0.5
+    default_nms_threshold = 0.4
+
+    def __init__(self, num_classes=80, model_path=None, config_path=None, input_size=None,
+                 conf_threshold=None, nms_threshold=None, class_aware_nms=False):
+        """
+        Base class for model backends.
+
+        Constructing a backend is cheap; the model itself is only read in load().
+
+        Args:
+            num_classes: Number of class labels the model predicts
+            model_path: Model weights file
+            config_path: Model configuration file (Darknet cfg / Caffe prototxt)
+            input_size: (width, height) network input size, or None for the backend default
+            conf_threshold: Minimum confidence, or None for the backend default
+            nms_threshold: NMS IoU threshold, or None for the backend default
+            class_aware_nms: Only suppress overlapping boxes of the same class
+        """
+        self.num_classes = num_classes
+        self.model_path = model_path
+        self.config_path = config_path
+        self.input_size = tuple(input_size) if input_size else self.default_input_size
+        self.conf_threshold = self.default_conf_threshold if conf_threshold is None else conf_threshold
+        self.nms_threshold = self.default_nms_threshold if nms_threshold is None else nms_threshold
+        self.class_aware_nms = class_aware_nms
+
+        self.net = None
+        # cv2.dnn.Net is not safe for concurrent setInput/forward calls
+        self._net_lock = threading.Lock()
+
+    def signature(self):
+        """String that changes whenever anything affecting the output changes."""
+        return (f"{self.name}|{self.model_path}|{self.config_path}|{self.input_size}|"
+                f"{self.conf_threshold}|{self.nms_threshold}|{self.class_aware_nms}")
+
+    def load(self):
+        """Read the model (called once, on first use)."""
+
+    def detect_batch(self, images):
+        """
+        Run detection over a batch of images.
+
+        Returns:
+            One (boxes int32 [N, 4] as x, y, w, h; confidences float32 [N];
+            class_ids int32 [N]) tuple per image, after NMS
+        """
+        raise NotImplementedError
+
+    def _forward(self, blob, output_names=None):
+        with self._net_lock:
+            self.net.setInput(blob)
+            if output_names is None:
+                return self.net.forward()
+            return self.net.forward(output_names)
+
+    def apply_nms(self, boxes, confidences, class_ids):
+        """
+        Run non-maximum suppression over decoded boxes
+
+        Boxes of different classes suppress each other unless
+        class_aware_nms is set.
+
+        Returns:
+            Tuple of the kept (boxes, confidences, class_ids)
+        """
+        if len(boxes) == 0:
+            return _empty_result()
+
+        if self.class_aware_nms:
+            indices = cv2.dnn.NMSBoxesBatched(boxes.tolist(), confidences.tolist(), class_ids.tolist(), self.conf_threshold, self.nms_threshold)
+        else:
+            indices = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.conf_threshold, self.nms_threshold)
+        keep = np.asarray(indices, dtype=np.int64).reshape(-1)
+        return boxes[keep], confidences[keep], class_ids[keep]
+
+
+@register_backend("mock")
+class MockBackend(DetectorBackend):
+    """Random detections for demonstration when no model files are available."""
+    default_input_size = (416, 416)
+
+    def detect_batch(self, images):
+        return [self._mock_detection(image) for image in images]
+
+    def _mock_detection(self, image):
+        height, width = image.shape[:2]
+
+        # Create random detections
+        num_detections = np.random.randint(1, 5)
+        boxes = np.empty((num_detections, 4), dtype=np.int32)
+        for i in range(num_detections):
+            # Random box
+            w = np.random.randint(width // 10, width // 3)
+            h = np.random.randint(height // 10, height // 3)
+            boxes[i] = (np.random.randint(0, width - w), np.random.randint(0, height - h), w, h)
+
+        class_ids = np.random.randint(0, self.num_classes, num_detections).astype(np.int32)
+        confidences = np.random.uniform(0.6, 0.95, num_detections).astype(np.float32)
+        return boxes, confidences, class_ids
+
+
+@register_backend("yolov3")
+class YoloBackend(DetectorBackend):
+    """YOLOv3 (Darknet cfg + weights) through OpenCV DNN."""
+    default_input_size = (416, 416)
+
+    def load(self):
+        self.net = cv2.dnn.readNetFromDarknet(self.config_path, self.model_path)
+        self.output_names = self.net.getUnconnectedOutLayersNames()
+        self.blob = BlobBuilder(self.input_size, 1/255.0, swap_rb=True)
+
+    def detect_batch(self, images):
+        # Create a single blob from all images
+        blob = self.blob.build(images)
+        outputs = self._forward(blob, self.output_names)
+
+        results = []
+        for i, image in enumerate(images):
+            # Each output layer stacks the rows of every image in the batch
+            image_outputs = [output.reshape(len(images), -1, output.shape[-1])[i] for output in outputs]
+            decoded = self.decode_outputs(image_outputs, image.shape[1], image.shape[0])
+            results.append(self.apply_nms(*decoded))
+        return results
+
+    def decode_outputs(self, outputs, width, height):
+        """
+        Decode raw YOLO output layers into boxes with batched array operations
+
+        Args:
+            outputs: Sequence of (N, 5 + num_classes) arrays from the output layers
+            width: Original image width
+            height: Original image height
+
+        Returns:
+            Tuple of (boxes int32 [N, 4] as x, y, w, h; confidences float32 [N]; class_ids int32 [N])
+        """
+        rows = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+        scores = rows[:, 5:]
+
+        # Best class per row, then filter weak detections
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(rows)), class_ids]
+        mask = confidences > self.conf_threshold
+        rows = rows[mask]
+
+        # YOLO returns normalized center coordinates; truncate like int() does
+        centers = (rows[:, 0:2] * (width, height)).astype(np.int32)
+        sizes = (rows[:, 2:4] * (width, height)).astype(np.int32)
+        corners = (centers - sizes / 2).astype(np.int32)
+        boxes = np.hstack([corners, sizes])
+
+        return boxes, confidences[mask].astype(np.float32), class_ids[mask].astype(np.int32)
+
+
+@register_backend("mobilenet_ssd")
+class SsdBackend(DetectorBackend):
+    """MobileNet-SSD (Caffe prototxt + caffemodel) through OpenCV DNN."""
+    default_input_size = (300, 300)
+
+    def load(self):
+        self.net = cv2.dnn.readNetFromCaffe(self.config_path, self.model_path)
+        # The model was trained on (pixel - 127.5) / 127.5 in every channel
+        self.blob = BlobBuilder(self.input_size, 0.007843, (127.5, 127.5, 127.5))
+
+    def detect_batch(self, images):
+        # Prepare a single blob for all images
+        blob = self.blob.build(images)
+
+        # Get detections; column 0 holds the index of the source image
+        outputs = self._forward(blob).reshape(-1, 7)
+        return [
+            self.apply_nms(*self.decode_outputs(outputs[outputs[:, 0] == i], image.shape[1], image.shape[0]))
+            for i, image in enumerate(images)
+        ]
+
+    def decode_outputs(self, outputs, width, height):
+        """
+        Decode a raw MobileNet SSD output blob into boxes with batched array operations
+
+        Args:
+            outputs: Array reshapeable to (N, 7) of [image_id, class_id, confidence, x1, y1, x2, y2]
+            width: Original image width
+            height: Original image height
+
+        Returns:
+            Tuple of (boxes int32 [N, 4] as x, y, w, h; confidences float32 [N]; class_ids int32 [N])
+        """
+        rows = outputs.reshape(-1, 7)
+        rows = rows[rows[:, 2] > self.conf_threshold]
+
+        # SSD returns normalized corner coordinates; convert to YOLO format [x, y, w, h]
+        corners = (rows[:, 3:7] * (width, height, width, height)).astype(np.int32)
+        boxes = np.hstack([corners[:, 0:2], corners[:, 2:4] - corners[:, 0:2]])
+
+        return boxes, rows[:, 2].astype(np.float32), rows[:, 1].astype(np.int32)
+
+
+@register_backend("onnx")
+class OnnxBackend(DetectorBackend):
+    """
+    YOLO-family ONNX export (cv2.dnn.readNetFromONNX).
+
+    Handles both the YOLOv5 layout ([N, rows, 5 + classes] with an objectness
+    column) and the YOLOv8 layout ([N, 4 + classes, rows], no objectness),
+    with box centres and sizes in network input pixels.
+    """
+    default_input_size = (640, 640)
+
+    def load(self):
+        self.net = cv2.dnn.readNetFromONNX(self.model_path)
+        # Many exports have a fixed batch size of 1; found out on the first batch
+        self.supports_batching = True
+        self.blob = BlobBuilder(self.input_size, 1/255.0, swap_rb=True)
+
+    def detect_batch(self, images):
+        if len(images) > 1 and self.supports_batching:
+            blob = self.blob.build(images)
+            try:
+                outputs = self._forward(blob)
+            except cv2.error:
+                logger.info("ONNX model does not accept batched input, running images one at a time")
+                self.supports_batching = False
+        if len(images) == 1 or not self.supports_batching:
+            outputs = np.concatenate([
+                self._forward(self.blob.build([image]))
+                for image in images
+            ])
+
+        outputs = outputs.reshape(len(images), *outputs.shape[-2:])
+        return [
+            self.apply_nms(*self.decode_outputs(outputs[i], image.shape[1], image.shape[0]))
+            for i, image in enumerate(images)
+        ]
+
+    def decode_outputs(self, output, width, height):
+        """
+        Decode one image's ONNX output into boxes with batched array operations
+
+        Returns:
+            Tuple of (boxes int32 [N, 4] as x, y, w, h; confidences float32 [N]; class_ids int32 [N])
+        """
+        # YOLOv8 exports are channel-first: (4 + classes, rows)
+        if output.shape[0] < output.shape[1]:
+            output = output.T
+
+        if output.shape[1] == 5 + self.num_classes:
+            scores = output[:, 5:] * output[:, 4:5]
+        else:
+            scores = output[:, 4:]
+
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(output)), class_ids]
+        mask = confidences > self.conf_threshold
+        rows = output[mask]
+
+        # Scale from network input pixels back to the original image
+        scale = (width / self.input_size[0], height / self.input_size[1])
+        sizes = rows[:, 2:4] * scale
+        corners = rows[:, 0:2] * scale - sizes / 2
+        boxes = np.hstack([corners, sizes]).astype(np.int32)
+
+        return boxes, confidences[mask].astype(np.float32), class_ids[mask].astype(np.int32)
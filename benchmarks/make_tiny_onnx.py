@@ -0,0 +1,81 @@
+"""
+Generate the tiny YOLOv8-layout ONNX model used by the benchmarks.
+
+The model is a single strided convolution with random weights: it is not
+trained to detect anything, but it has the real input/output layout
+(N x 3 x 320 x 320 in, N x 84 x 1600 out) and runs through the same
+OpenCV DNN and post-processing path as an exported YOLOv8 model, so the
+benchmarks exercise the ONNX backend without downloading weights.
+
+The generated file is committed as benchmarks/models/tiny_yolov8.onnx;
+rerun this script (requires the onnx package) only to change the model.
+
+Usage:
+    python benchmarks/make_tiny_onnx.py [--output benchmarks/models/tiny_yolov8.onnx]
+"""
+import argparse
+import os
+
+import numpy as np
+
+INPUT_SIZE = 320
+STRIDE = 8
+NUM_CLASSES = 80
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "tiny_yolov8.onnx")
+
+
+def build_model():
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(0)
+    channels = 4 + NUM_CLASSES
+    weights = rng.normal(0, 0.05, (channels, 3, STRIDE, STRIDE)).astype(np.float32)
+    bias = np.zeros(channels, dtype=np.float32)
+    # Class scores centred below the default 0.5 threshold so only a handful of rows pass
+    bias[4:] = -1.5
+    # Box centres/sizes come out of the sigmoid in [0, 1]; scale them to input pixels
+    scale = np.ones((channels, 1, 1), dtype=np.float32)
+    scale[0:2] = INPUT_SIZE
+    scale[2:4] = INPUT_SIZE / 4
+
+    nodes = [
+        helper.make_node("Conv", ["images", "weights", "bias"], ["conv"], kernel_shape=[STRIDE, STRIDE], strides=[STRIDE, STRIDE]),
+        helper.make_node("Sigmoid", ["conv"], ["activated"]),
+        helper.make_node("Mul", ["activated", "scale"], ["scaled"]),
+        helper.make_node("Reshape", ["scaled", "shape"], ["output0"]),
+    ]
+    initializers = [
+        numpy_helper.from_array(weights, "weights"),
+        numpy_helper.from_array(bias, "bias"),
+        numpy_helper.from_array(scale, "scale"),
+        numpy_helper.from_array(np.array([0, channels, -1], dtype=np.int64), "shape"),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "tiny_yolov8",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, INPUT_SIZE, INPUT_SIZE])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", channels, None])],
+        initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    import onnx
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    onnx.save(build_model(), args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+End-to-end benchmarks: per-stage latency, HTTP throughput and logger scaling.
+
+Runs fully offline on synthetic images and videos, with the mock backend
+and the tiny ONNX model in benchmarks/models (see make_tiny_onnx.py), and
+writes machine-readable results that a later run can be compared against.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--output results.json]
+    python benchmarks/run_benchmarks.py --compare baseline.json [--tolerance 0.15]
+    python benchmarks/run_benchmarks.py --suites stages,logger --onnx-model my_model.onnx
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detector import ObjectDetector
+from logger import DetectionLogger
+
+DEFAULT_ONNX_MODEL = os.path.join(ROOT, "benchmarks", "models", "tiny_yolov8.onnx")
+SUITES = ("stages", "http", "logger")
+IMAGE_SIZES = {"480p": (640, 480), "1080p": (1920, 1080)}
+
+
+def summarize(samples):
+    """Latency summary in milliseconds from a list of durations in seconds."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "min_ms": round(float(ms.min()), 4)
+    }
+
+
+def measure(func, repeat, warmup=2):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_image(rng, width, height):
+    """Synthetic scene: textured background with a few solid objects, so JPEG sizes are realistic."""
+    image = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    for _ in range(6):
+        w, h = int(rng.integers(width // 20, width // 5)), int(rng.integers(height // 20, height // 5))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, -1)
+    return image
+
+
+def make_video(path, rng, num_frames=120, width=640, height=480, fps=30):
+    """Synthetic MJPG video of an object moving over a static background."""
+    background = make_image(rng, width, height)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for i in range(num_frames):
+        frame = background.copy()
+        x = int((width - 80) * i / max(1, num_frames - 1))
+        cv2.rectangle(frame, (x, height // 2 - 40), (x + 80, height // 2 + 40), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def make_detectors(onnx_model):
+    detectors = {"mock": ObjectDetector(backend="mock")}
+    if onnx_model and os.path.exists(onnx_model):
+        detectors["onnx"] = ObjectDetector(backend="onnx", model_path=onnx_model, input_size=(320, 320))
+    else:
+        print(f"ONNX model not found ({onnx_model}), skipping ONNX runs")
+    for detector in detectors.values():
+        detector.load()
+    return detectors
+
+
+def bench_stages(results, detectors, repeat, workdir):
+    """Per-stage latency of the image path: decode, detect, draw, encode, log."""
+    rng = np.random.default_rng(0)
+    logger = DetectionLogger(log_dir=os.path.join(workdir, "stage_logs"),
+                             legacy_log_file=os.path.join(workdir, "none.json"), fsync_policy="never")
+
+    for size_name, (width, height) in IMAGE_SIZES.items():
+        image = make_image(rng, width, height)
+        jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        prefix = f"stage.{size_name}"
+
+        results[f"{prefix}.decode"] = summarize(measure(
+            lambda: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR), repeat))
+
+        for backend, detector in detectors.items():
+            results[f"{prefix}.{backend}.detect"] = summarize(measure(lambda: detector.detect(image), repeat))
+            batch = [image] * 8
+            results[f"{prefix}.{backend}.detect_batch8"] = summarize(measure(lambda: detector.detect_batch(batch), max(3, repeat // 4)))
+
+        detections = detectors["mock"].detect(image)
+        results[f"{prefix}.draw"] = summarize(measure(lambda: detectors["mock"].draw_detections(image, detections), repeat))
+        annotated = detectors["mock"].draw_detections(image, detections)
+        results[f"{prefix}.encode"] = summarize(measure(
+            lambda: base64.b64encode(cv2.imencode(".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, 95])[1]), repeat))
+        results[f"{prefix}.log"] = summarize(measure(
+            lambda: logger.log_detection("image", "bench.jpg", detections, 0.01), repeat))
+
+
+def load_app(workdir, backend, onnx_model):
+    """Import the Flask app configured for benchmarking inside workdir."""
+    # Every path the app writes to points into workdir (uploads are relative to the cwd)
+    os.environ.update({
+        "DETECTOR_BACKEND": backend,
+        "DETECTION_LOG_DIR": os.path.join(workdir, "http_logs"),
+        "DETECTION_LOG_FSYNC": "never",
+        "RESULT_CACHE_DIR": "",
+        "VIDEO_JOB_DIR": "",
+        "INGEST_SOURCES": "",
+        "INFERENCE_SERVICE": "",
+        # Every request must reach the detector
+        "MOTION_GATE": "0"
+    })
+    if backend == "onnx":
+        os.environ.update({"DETECTOR_MODEL": onnx_model, "DETECTOR_INPUT_SIZE": "320"})
+    os.chdir(workdir)
+    import app as app_module
+    app_module.detector.load()
+    return app_module.app
+
+
+def run_concurrent(app, concurrency, payloads, send):
+    """Send every payload from `concurrency` threads; returns (wall seconds, per-request latencies)."""
+    local = threading.local()
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(payload):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        start = time.perf_counter()
+        response = send(client, payload)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, payloads))
+    return time.perf_counter() - start, latencies
+
+
+def bench_http(results, concurrency_levels, num_requests, workdir, backend, onnx_model):
+    """Throughput and latency of the HTTP endpoints at increasing concurrency."""
+    app = load_app(workdir, backend, onnx_model)
+    rng = np.random.default_rng(1)
+    base = make_image(rng, 640, 480)
+
+    # Distinct images per request (across all runs) so the result cache never answers
+    counter = iter(range(1 << 62))
+
+    def jpegs(count):
+        images = []
+        for _ in range(count):
+            i = next(counter)
+            image = base.copy()
+            image[0, :8] = np.frombuffer(i.to_bytes(8, "little") * 3, dtype=np.uint8).reshape(8, 3)
+            images.append(cv2.imencode(".jpg", image)[1].tobytes())
+        return images
+
+    endpoints = {
+        "image_annotated": lambda client, jpeg: client.post(
+            "/api/detect/image", data={"file": (io.BytesIO(jpeg), "bench.jpg")},
+            content_type="multipart/form-data"),
+        "image_raw": lambda client, jpeg: client.post(
+            "/api/detect/image", data={"file": (io.BytesIO(jpeg), "bench.jpg"), "annotate": "0"},
+            content_type="multipart/form-data"),
+        "webcam_frame": lambda client, jpeg: client.post(
+            f"/api/detect/webcam/frame?stream={threading.get_ident()}", data=jpeg, content_type="image/jpeg"),
+    }
+    for name, send in endpoints.items():
+        for concurrency in concurrency_levels:
+            wall, latencies = run_concurrent(app, concurrency, jpegs(num_requests), send)
+            results[f"http.{backend}.{name}.c{concurrency}"] = {
+                **summarize(latencies),
+                "throughput_rps": round(len(latencies) / wall, 2)
+            }
+
+    video_path = os.path.join(workdir, "bench.avi")
+    make_video(video_path, rng)
+    video = open(video_path, "rb").read()
+    client = app.test_client()
+
+    def post_video():
+        response = client.post("/api/detect/video", data={"file": (io.BytesIO(video), "bench.avi"), "sample_rate": "30"},
+                               content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return len(response.get_json()["detections"])
+
+    frames = post_video()
+    samples = measure(post_video, 3, warmup=0)
+    results[f"http.{backend}.video"] = {
+        **summarize(samples),
+        "frames": frames,
+        "throughput_fps": round(frames / float(np.median(samples)), 2)
+    }
+
+
+def bench_logger(results, history_sizes, repeat, workdir):
+    """How logging, reloading, analysis and queries scale with history size."""
+    rng = np.random.default_rng(2)
+    classes = ["person", "car", "truck", "bicycle", "dog"]
+
+    def detections():
+        return [{"class": classes[int(rng.integers(0, len(classes)))],
+                 "confidence": round(float(rng.uniform(0.5, 1.0)), 3),
+                 "bbox": [int(v) for v in rng.integers(0, 500, 4)]}
+                for _ in range(int(rng.integers(0, 6)))]
+
+    for size in history_sizes:
+        log_dir = os.path.join(workdir, f"logger_{size}")
+        legacy = os.path.join(workdir, "none.json")
+        logger = DetectionLogger(log_dir=log_dir, legacy_log_file=legacy, fsync_policy="never")
+
+        start = time.perf_counter()
+        for i in range(size):
+            logger.log_detection("image" if i % 3 else "webcam", f"img_{i}.jpg", detections(), 0.01)
+        fill = time.perf_counter() - start
+        prefix = f"logger.{size}"
+        results[f"{prefix}.fill"] = {"entries": size, "entries_per_s": round(size / max(fill, 1e-9), 1)}
+
+        results[f"{prefix}.append"] = summarize(measure(lambda: logger.log_detection("image", "x.jpg", detections(), 0.01), repeat))
+        results[f"{prefix}.analysis"] = summarize(measure(logger.get_analysis_data, repeat))
+        results[f"{prefix}.query_page"] = summarize(measure(lambda: logger.query_logs(limit=50), repeat))
+        results[f"{prefix}.query_class"] = summarize(measure(lambda: logger.query_logs(detected_class="truck", limit=50), repeat))
+        logger.store.close()
+        results[f"{prefix}.reload"] = summarize(measure(
+            lambda: DetectionLogger(log_dir=log_dir, legacy_log_file=legacy, fsync_policy="never").store.close(),
+            max(3, repeat // 10), warmup=1))
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print relative changes against a baseline run.
+
+    Returns:
+        Names of metrics that regressed by more than the tolerance
+    """
+    regressions = []
+    for name in sorted(set(current) & set(baseline)):
+        for metric, higher_is_better in (("p50_ms", False), ("throughput_rps", True), ("throughput_fps", True)):
+            old, new = baseline[name].get(metric), current[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ("improved" if worse < -tolerance else "")
+            print(f"{name + '.' + metric:55s} {old:12.3f} -> {new:12.3f}  {change * 100:+7.1f}%  {flag}")
+            if flag == "REGRESSION":
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def print_results(results):
+    for name, values in results.items():
+        details = "  ".join(f"{key}={value}" for key, value in values.items())
+        print(f"{name:45s} {details}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations and smaller sizes (smoke run)")
+    parser.add_argument("--repeat", type=int, default=None, help="Timed iterations per stage")
+    parser.add_argument("--onnx-model", default=DEFAULT_ONNX_MODEL, help="YOLOv5/v8-layout ONNX model for the onnx runs")
+    parser.add_argument("--http-backend", default="mock", choices=("mock", "onnx"))
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    repeat = args.repeat or (5 if args.quick else 30)
+    concurrency_levels = (1, 4) if args.quick else (1, 2, 4, 8)
+    num_requests = 16 if args.quick else 64
+    history_sizes = (1000,) if args.quick else (1000, 10000, 50000)
+
+    # The mock backend draws from the global NumPy generator
+    np.random.seed(0)
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="detection-bench-")
+    cwd = os.getcwd()
+    try:
+        if "stages" in suites:
+            bench_stages(results, make_detectors(args.onnx_model), repeat, workdir)
+        if "logger" in suites:
+            bench_logger(results, history_sizes, repeat, workdir)
+        if "http" in suites:
+            bench_http(results, concurrency_levels, num_requests, workdir, args.http_backend, args.onnx_model)
+    finally:
+        app_module = sys.modules.get("app")
+        if app_module is not None:
+            # Flush the app's background log writer before its directory goes away
+            app_module.detection_logger.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
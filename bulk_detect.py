@@ -0,0 +1,183 @@
+import io
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+from metrics import timed
+from preprocess import ImageDecoder
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _has_extension(name, allowed_extensions):
+    return "." in name and name.rsplit(".", 1)[1].lower() in allowed_extensions
+
+
+def iter_archive_images(fileobj, filename, allowed_extensions, max_member_bytes):
+    """
+    Yield (name, bytes) for each image in a zip or tar archive, one member at a time.
+
+    Members are read straight from the upload stream into memory; nothing is
+    extracted to disk. Tar archives are read sequentially (mode "r|*"), so
+    even a compressed tarball is never seeked. Oversized members are
+    reported with None bytes and skipped.
+    """
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _has_extension(info.filename, allowed_extensions):
+                    continue
+                if info.file_size > max_member_bytes:
+                    yield info.filename, None
+                    continue
+                yield info.filename, archive.read(info)
+        return
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not _has_extension(member.name, allowed_extensions):
+                continue
+            if member.size > max_member_bytes:
+                yield member.name, None
+                continue
+            yield member.name, archive.extractfile(member).read()
+
+
+def detach_uploads(files):
+    """
+    Take ownership of uploaded files' streams for use in a streamed response.
+
+    Werkzeug closes request files as soon as the view returns, before a
+    streamed response body is generated. The FileStorage objects are left
+    holding empty streams; the caller must close the returned ones.
+
+    Returns:
+        List of (filename, stream) tuples
+    """
+    uploads = []
+    for file in files:
+        uploads.append((file.filename, file.stream))
+        file.stream = io.BytesIO()
+    return uploads
+
+
+def iter_upload_images(uploads, allowed_extensions, max_member_bytes=16 * 1024 * 1024):
+    """
+    Yield (name, bytes) for uploaded image files and for the images inside uploaded archives.
+
+    Files that are neither allowed images nor archives are yielded with None
+    bytes. Each stream is closed once it has been read.
+
+    Args:
+        uploads: (filename, stream) tuples from detach_uploads()
+    """
+    try:
+        for filename, stream in uploads:
+            if is_archive(filename):
+                yield from iter_archive_images(stream, filename, allowed_extensions, max_member_bytes)
+            elif _has_extension(filename, allowed_extensions):
+                yield secure_filename(filename), stream.read()
+            else:
+                yield secure_filename(filename), None
+            stream.close()
+    finally:
+        # Also covers streams never reached when the generator is closed early
+        for _, stream in uploads:
+            stream.close()
+
+
+class BulkImageDetector:
+    def __init__(self, detector, batch_size=8, workers=None, max_images=10000, decode=None):
+        """
+        Detect objects in many images: parallel decode, batched inference.
+
+        Images are decoded on a thread pool a few batches ahead of the
+        detector, and each batch of decoded images goes through a single
+        detect_batch call. Results come back per batch, in upload order, so
+        the caller can stream them while later images are still decoding.
+
+        Args:
+            detector: ObjectDetector (or InferenceClient / TiledDetector)
+            batch_size: Images per detect_batch call
+            workers: Decode threads (defaults to the CPU count)
+            max_images: Most images accepted from one request
+            decode: Callable turning image bytes into a DecodedImage (or None);
+                defaults to a full-resolution ImageDecoder
+        """
+        self.detector = detector
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.max_images = max_images
+        self.decode = decode or ImageDecoder().decode
+
+    def detect(self, items):
+        """
+        Run detection over (name, bytes) pairs.
+
+        Args:
+            items: Iterable of (name, encoded image bytes); None bytes mark a rejected file
+
+        Yields:
+            Dictionaries with "index", "name" and either "image" (decoded BGR
+            array), "image_scale" (original size / decoded size), "detections"
+            (in original image coordinates) and "process_time", or "error"
+        """
+        max_in_flight = self.batch_size * 2
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-decode") as pool:
+            pending = deque()
+            count = 0
+            for name, data in items:
+                if count == self.max_images:
+                    yield {"index": count, "name": name, "error": f"Too many images (limit {self.max_images})"}
+                    break
+                pending.append((count, name, pool.submit(self.decode, data) if data is not None else None))
+                count += 1
+                if len(pending) >= max_in_flight:
+                    yield from self._detect_batch(pending, self.batch_size)
+
+            while pending:
+                yield from self._detect_batch(pending, self.batch_size)
+
+    def _detect_batch(self, pending, size):
+        """Wait for the next batch of decodes and run them through the detector."""
+        batch = [pending.popleft() for _ in range(min(size, len(pending)))]
+        results = []
+        images = []
+        for index, name, future in batch:
+            if future is None:
+                results.append({"index": index, "name": name, "error": "File type not allowed or file too large"})
+                continue
+            try:
+                decoded = future.result()
+            except Exception as e:
+                decoded = None
+                logger.error(f"Error decoding {name}: {str(e)}")
+            if decoded is None:
+                results.append({"index": index, "name": name, "error": "Could not decode image data"})
+                continue
+            result = {"index": index, "name": name, "image": decoded.image, "image_scale": decoded.scale}
+            results.append(result)
+            images.append((result, decoded))
+
+        if images:
+            with timed("detect"):
+                start = time.perf_counter()
+                detections = self.detector.detect_batch([decoded.image for _, decoded in images])
+                # Batched inference: each image is charged an equal share
+                process_time = (time.perf_counter() - start) / len(images)
+            for (result, decoded), image_detections in zip(images, detections):
+                result["detections"] = decoded.to_original(image_detections)
+                result["process_time"] = process_time
+        return results
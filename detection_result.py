@@ -0,0 +1,132 @@
+import sys
+
+import numpy as np
+
+# Keys of a plain detection; dicts with more (e.g. track_id) are kept as dicts
+DETECTION_KEYS = {"class", "confidence", "bbox"}
+
+
+def _class_name(classes, class_id):
+    try:
+        return classes[class_id]
+    except (IndexError, KeyError):
+        return f"Unknown-{class_id}"
+
+
+class DetectionResult:
+    """
+    Detections for one image, stored as NumPy arrays.
+
+    Boxes are int32 [N, 4] (x, y, w, h), confidences float32 [N] and class
+    ids int32 [N] indexing into a shared class name sequence, instead of one
+    dict per box. The list-of-dicts format of the API is a lazy view:
+    iterating, indexing or JSON-encoding (json_default) builds the dicts on
+    demand, so code written for plain detection lists keeps working.
+    """
+    __slots__ = ("boxes", "confidences", "class_ids", "classes")
+
+    def __init__(self, boxes, confidences, class_ids, classes):
+        """
+        Args:
+            boxes: [N, 4] x, y, w, h boxes
+            confidences: [N] confidences
+            class_ids: [N] indices into classes
+            classes: Sequence (or id -> name mapping) of class names
+        """
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.classes = classes
+
+    @classmethod
+    def from_dicts(cls, detections):
+        """Pack a list of detection dictionaries (class names are interned per result)."""
+        if isinstance(detections, DetectionResult):
+            return detections
+        names = {}
+        class_ids = [names.setdefault(sys.intern(det["class"]), len(names)) for det in detections]
+        return cls(
+            [det["bbox"] for det in detections],
+            [det["confidence"] for det in detections],
+            class_ids,
+            tuple(names)
+        )
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    def __bool__(self):
+        return len(self.class_ids) > 0
+
+    def __getitem__(self, index):
+        return self._dict(index if index >= 0 else len(self) + index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._dict(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (DetectionResult, list)):
+            return self.to_dicts() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"DetectionResult({self.to_dicts()!r})"
+
+    def __reduce__(self):
+        # Only ship the names of classes present, not the model's whole label list
+        used = {int(class_id): _class_name(self.classes, class_id) for class_id in np.unique(self.class_ids)}
+        return (DetectionResult, (self.boxes, self.confidences, self.class_ids, used))
+
+    def _dict(self, index):
+        x, y, w, h = self.boxes[index].tolist()
+        return {
+            "class": _class_name(self.classes, int(self.class_ids[index])),
+            "confidence": round(float(self.confidences[index]), 3),
+            "bbox": [x, y, w, h]
+        }
+
+    def to_dicts(self):
+        """The detections as a list of {"class", "confidence", "bbox"} dictionaries."""
+        boxes = self.boxes.tolist()
+        confidences = self.confidences.tolist()
+        return [
+            {"class": _class_name(self.classes, class_id), "confidence": round(confidence, 3), "bbox": box}
+            for box, confidence, class_id in zip(boxes, confidences, self.class_ids.tolist())
+        ]
+
+    @property
+    def labels(self):
+        """Class name of each detection."""
+        return [_class_name(self.classes, class_id) for class_id in self.class_ids.tolist()]
+
+    def max_confidence(self):
+        return round(float(self.confidences.max()), 3) if len(self) else 0.0
+
+    def scaled(self, scale):
+        """Copy with boxes scaled (e.g. for a resized image)."""
+        boxes = np.rint(self.boxes * scale).astype(np.int32)
+        return DetectionResult(boxes, self.confidences, self.class_ids, self.classes)
+
+
+def json_default(obj):
+    """json.dumps default= hook serializing DetectionResult as its list of dictionaries."""
+    if isinstance(obj, DetectionResult):
+        return obj.to_dicts()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def compact_detections(detections):
+    """
+    DetectionResult for a list of plain detection dictionaries.
+
+    Lists whose dictionaries carry extra keys (track ids) are returned
+    unchanged, and empty results become a plain (smaller) empty list.
+    """
+    if not detections:
+        return []
+    if isinstance(detections, DetectionResult):
+        return detections
+    if all(det.keys() == DETECTION_KEYS for det in detections):
+        return DetectionResult.from_dicts(detections)
+    return detections
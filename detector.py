@@ -3,24 +3,127 @@ import numpy as np
 import logging
 import time
 import os
+import threading
+
+from backends import create_backend
+from detection_result import DetectionResult
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+def parse_input_size(value):
+    """Parse "416" or "640x480" into a (width, height) tuple; empty means backend default."""
+    if not value:
+        return None
+    width, _, height = value.lower().partition("x")
+    return (int(width), int(height or width))
+
+def detector_options_from_env(environ=None):
+    """
+    Build ObjectDetector keyword arguments from DETECTOR_* environment variables
+    
+    Shared by app.py and the inference service so both configure the model the same way.
+    """
+    environ = os.environ if environ is None else environ
+    return {
+        "backend": environ.get("DETECTOR_BACKEND", "mock"),
+        "model_path": environ.get("DETECTOR_MODEL") or None,
+        "config_path": environ.get("DETECTOR_CONFIG") or None,
+        "classes_path": environ.get("DETECTOR_CLASSES") or None,
+        "input_size": parse_input_size(environ.get("DETECTOR_INPUT_SIZE", "")),  # e.g. "416" or "640x480"
+        "conf_threshold": float(environ["DETECTOR_CONF_THRESHOLD"]) if environ.get("DETECTOR_CONF_THRESHOLD") else None,
+        "nms_threshold": float(environ["DETECTOR_NMS_THRESHOLD"]) if environ.get("DETECTOR_NMS_THRESHOLD") else None,
+        "class_aware_nms": environ.get("DETECTOR_CLASS_AWARE_NMS", "0") == "1",
+        "warm_up": environ.get("DETECTOR_WARM_UP", "1") == "1"
+    }
+
 class ObjectDetector:
-    def __init__(self):
+    def __init__(self, backend="mock", model_path=None, config_path=None, classes_path=None,
+                 input_size=None, conf_threshold=None, nms_threshold=None, class_aware_nms=False,
+                 warm_up=True):
         """
         Initialize the object detector with a pre-trained model.
-        Using the COCO classes and YOLOv3 model for object detection.
+        
+        The backend is chosen from the registry in backends.py. Its model is not
+        read here but on first use (or via load_async), followed by a warm-up
+        inference so the first real request doesn't pay initialisation cost.
+        
+        Args:
+            backend: Registered backend name ("mock", "yolov3", "mobilenet_ssd", "onnx")
+            model_path: Model weights file
+            config_path: Model configuration file (Darknet cfg / Caffe prototxt)
+            classes_path: Text file with one class name per line (defaults to COCO)
+            input_size: (width, height) network input size, or None for the backend default
+            conf_threshold: Minimum confidence, or None for the backend default
+            nms_threshold: NMS IoU threshold, or None for the backend default
+            class_aware_nms: Only suppress overlapping boxes of the same class
+            warm_up: Run a warm-up inference right after loading
         """
-        self.classes = self._load_coco_classes()
+        self.classes = self._load_classes(classes_path) if classes_path else self._load_coco_classes()
         self.colors = np.random.uniform(0, 255, size=(len(self.classes), 3))
+        # Label -> class id, for drawing detections that only carry names
+        self._class_index = {label: class_id for class_id, label in enumerate(self.classes)}
+        
+        self.model = create_backend(
+            backend,
+            num_classes=len(self.classes),
+            model_path=model_path,
+            config_path=config_path,
+            input_size=input_size,
+            conf_threshold=conf_threshold,
+            nms_threshold=nms_threshold,
+            class_aware_nms=class_aware_nms
+        )
+        self.backend = backend
+        self.warm_up_enabled = warm_up
         
-        # Load YOLOv3 model
-        # For demonstration purposes, we'll use the mock detector
-        # since downloading the model files requires additional setup
-        logger.info("Using mock detector for demonstration purposes")
-        self.net = None
-        self.backend = "mock"
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        logger.info(f"Using {backend} detector backend (loaded on first use)")
+    
+    def config_signature(self):
+        """
+        Describe everything that affects detection output
+        
+        Returns:
+            String that changes whenever the backend, model or thresholds change
+        """
+        return self.model.signature()
+    
+    def load(self):
+        """Load the backend model and warm it up, if that hasn't happened yet"""
+        if self._loaded:
+            return
+        
+        with self._load_lock:
+            if self._loaded:
+                return
+            
+            start_time = time.time()
+            self.model.load()
+            logger.info(f"Loaded {self.backend} model in {time.time() - start_time:.2f}s")
+            
+            if self.warm_up_enabled:
+                self._warm_up()
+            self._loaded = True
+    
+    def load_async(self):
+        """Load the model in a background thread so startup isn't blocked"""
+        thread = threading.Thread(target=self.load, name="detector-load", daemon=True)
+        thread.start()
+        return thread
+    
+    def _warm_up(self):
+        """Run one inference on a blank frame to initialise backend buffers"""
+        width, height = self.model.input_size
+        start_time = time.time()
+        self.model.detect_batch([np.zeros((height, width, 3), dtype=np.uint8)])
+        logger.info(f"Warmed up {self.backend} model in {time.time() - start_time:.2f}s")
+    
+    def _load_classes(self, classes_path):
+        """Load class names from a text file, one per line"""
+        with open(classes_path, "r") as f:
+            return [line.strip() for line in f if line.strip()]
     
     def _load_coco_classes(self):
         """Load COCO class names"""
@@ -45,171 +148,67 @@ class ObjectDetector:
             image: numpy array of image (BGR format)
             
         Returns:
-            List of dictionaries containing detection info
+            DetectionResult (behaves as a list of detection dictionaries)
         """
-        if self.backend == "mock":
-            # Mock detector for demonstration if model doesn't load
-            return self._mock_detection(image)
-        
-        # Get image dimensions
-        height, width = image.shape[:2]
-        
-        if self.backend == "yolov3":
-            # Create blob from image for YOLOv3
-            blob = cv2.dnn.blobFromImage(image, 1/255.0, (416, 416), swapRB=True, crop=False)
-            self.net.setInput(blob)
-            
-            # Get outputs from YOLO's output layers
-            output_layers = self.net.getUnconnectedOutLayersNames()
-            outputs = self.net.forward(output_layers)
-            
-            # Initialize lists
-            boxes = []
-            confidences = []
-            class_ids = []
-            
-            # Process each output
-            for output in outputs:
-                for detection in output:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    
-                    # Filter weak detections
-                    if confidence > 0.5:
-                        # YOLO returns normalized coordinates
-                        center_x = int(detection[0] * width)
-                        center_y = int(detection[1] * height)
-                        w = int(detection[2] * width)
-                        h = int(detection[3] * height)
-                        
-                        # Rectangle coordinates
-                        x = int(center_x - w / 2)
-                        y = int(center_y - h / 2)
-                        
-                        boxes.append([x, y, w, h])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
-        
-        elif self.backend == "mobilenet_ssd":
-            # Prepare blob for MobileNet SSD
-            blob = cv2.dnn.blobFromImage(image, 0.007843, (300, 300), 127.5)
-            self.net.setInput(blob)
-            
-            # Get detections
-            detections = self.net.forward()
-            
-            # Initialize lists
-            boxes = []
-            confidences = []
-            class_ids = []
-            
-            # Process each detection
-            for i in range(detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                
-                if confidence > 0.5:
-                    class_id = int(detections[0, 0, i, 1])
-                    
-                    # SSD returns normalized coordinates
-                    box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-                    (startX, startY, endX, endY) = box.astype("int")
-                    
-                    # Convert to YOLO format [x, y, w, h]
-                    w = endX - startX
-                    h = endY - startY
-                    
-                    boxes.append([startX, startY, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-        
-        # Apply non-maximum suppression to remove redundant overlapping boxes
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, 0.5, 0.4)
-        
-        detections = []
-        if len(indices) > 0:
-            for i in indices.flatten():
-                # Get detection details
-                x, y, w, h = boxes[i]
-                class_id = class_ids[i]
-                confidence = confidences[i]
-                
-                # Ensure class_id is within range
-                if class_id < len(self.classes):
-                    label = self.classes[class_id]
-                else:
-                    label = f"Unknown-{class_id}"
-                
-                # Add detection to results
-                detections.append({
-                    "class": label,
-                    "confidence": round(confidence, 3),
-                    "bbox": [x, y, w, h]
-                })
-        
-        return detections
+        return self.detect_batch([image])[0]
     
-    def _mock_detection(self, image):
+    def detect_batch(self, images):
         """
-        Create mock detections for demonstration purposes when model can't be loaded
+        Detect objects in several images with a single forward pass
+        
+        All images are packed into one N-image blob, so the network runs
+        once per batch instead of once per image. Images may differ in size.
         
         Args:
-            image: Input image
+            images: List of numpy arrays (BGR format)
             
         Returns:
-            List of mock detections
+            List with one DetectionResult per input image
         """
-        height, width = image.shape[:2]
-        
-        # Create random detections
-        num_detections = np.random.randint(1, 5)
-        mock_detections = []
-        
-        for _ in range(num_detections):
-            # Random class
-            class_id = np.random.randint(0, len(self.classes))
-            label = self.classes[class_id]
-            
-            # Random box
-            w = np.random.randint(width // 10, width // 3)
-            h = np.random.randint(height // 10, height // 3)
-            x = np.random.randint(0, width - w)
-            y = np.random.randint(0, height - h)
-            
-            # Random confidence
-            confidence = np.random.uniform(0.6, 0.95)
-            
-            mock_detections.append({
-                "class": label,
-                "confidence": round(confidence, 3),
-                "bbox": [x, y, w, h]
-            })
+        if not images:
+            return []
         
-        return mock_detections
+        self.load()
+        with timed("inference"):
+            kept = self.model.detect_batch(images)
+        with timed("postprocess"):
+            return [
+                DetectionResult(boxes, confidences, class_ids, self.classes)
+                for boxes, confidences, class_ids in kept
+            ]
     
-    def draw_detections(self, image, detections):
+    def draw_detections(self, image, detections, copy=True):
         """
         Draw detection boxes and labels on the image
         
         Args:
             image: Input image
-            detections: List of detection dictionaries
+            detections: DetectionResult or list of detection dictionaries
+            copy: Draw on a copy; pass False to draw in place on a buffer the caller owns
             
         Returns:
             Image with drawn detections
         """
-        # Make a copy of the image to avoid modifying original
-        output_img = image.copy()
+        with timed("draw"):
+            return self._draw(image.copy() if copy else image, detections)
+    
+    def _draw(self, output_img, detections):
+        """Draw detections onto output_img in place"""
+        if isinstance(detections, DetectionResult):
+            if detections.classes is self.classes:
+                class_ids = detections.class_ids.tolist()
+            else:
+                class_ids = [self._class_index.get(label, 0) for label in detections.labels]
+            items = zip(detections.boxes.tolist(), detections.labels, detections.confidences.tolist(), class_ids)
+        else:
+            items = (
+                (detection["bbox"], detection["class"], detection["confidence"], self._class_index.get(detection["class"], 0))
+                for detection in detections
+            )
         
-        for detection in detections:
-            # Get detection info
-            x, y, w, h = detection["bbox"]
-            label = detection["class"]
-            confidence = detection["confidence"]
-            
+        for (x, y, w, h), label, confidence, class_id in items:
             # Get color for this class
-            class_id = self.classes.index(label) if label in self.classes else 0
-            color = self.colors[class_id].tolist()
+            color = self.colors[class_id if class_id < len(self.colors) else 0].tolist()
             
             # Draw bounding box
             cv2.rectangle(output_img, (x, y), (x + w, y + h), color, 2)
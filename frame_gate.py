@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameGate:
+    def __init__(self, wait_timeout=2.0, max_sources=256, idle_timeout=300.0):
+        """
+        Admit only the newest pending frame per stream source.
+
+        Clients tag frames with an increasing sequence number. While a
+        source's previous frame is still being processed, newer frames wait;
+        once the source is free, a frame is dropped if an even newer one has
+        arrived in the meantime. A server that falls behind therefore skips
+        stale frames instead of queueing them.
+
+        Sources are client-supplied stream ids, so their state is bounded:
+        sources idle for idle_timeout are forgotten, as are the least
+        recently used ones beyond max_sources. A source with a frame waiting
+        or in progress is never forgotten.
+
+        Args:
+            wait_timeout: Seconds a frame may wait for its source before being dropped
+            max_sources: Sources kept before the least recently used one is forgotten
+            idle_timeout: Seconds without frames after which a source is forgotten
+        """
+        self.wait_timeout = wait_timeout
+        self.max_sources = max_sources
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._sources = OrderedDict()
+        self.frames_admitted = 0
+        self.frames_dropped = 0
+
+    def _source_state(self, source, seq):
+        """Get or create a source's state, recording a frame in flight (lock held)."""
+        now = time.monotonic()
+        state = self._sources.get(source)
+        if state is None:
+            state = {"lock": threading.Lock(), "latest_seq": -1, "in_flight": 0, "last_seen": now}
+            self._sources[source] = state
+        self._sources.move_to_end(source)
+        state["latest_seq"] = max(state["latest_seq"], seq)
+        state["in_flight"] += 1
+        state["last_seen"] = now
+        self._evict(now)
+        return state
+
+    def _evict(self, now):
+        """Forget idle and least recently used sources, oldest first (lock held)."""
+        while self._sources:
+            source, state = next(iter(self._sources.items()))
+            if state["in_flight"]:
+                break
+            if len(self._sources) <= self.max_sources and now - state["last_seen"] < self.idle_timeout:
+                break
+            del self._sources[source]
+
+    def _mark_dropped(self):
+        with self._lock:
+            self.frames_dropped += 1
+
+    @contextmanager
+    def admit(self, source, seq):
+        """
+        Context manager guarding the processing of one frame.
+
+        Args:
+            source: Stream source name
+            seq: Client frame sequence number
+
+        Yields:
+            True if the frame should be processed, False if it is stale
+        """
+        with self._lock:
+            state = self._source_state(source, seq)
+
+        try:
+            if not state["lock"].acquire(timeout=self.wait_timeout):
+                self._mark_dropped()
+                yield False
+                return
+
+            try:
+                with self._lock:
+                    stale = seq < state["latest_seq"]
+                if stale:
+                    self._mark_dropped()
+                    yield False
+                    return
+
+                with self._lock:
+                    self.frames_admitted += 1
+                yield True
+            finally:
+                state["lock"].release()
+        finally:
+            with self._lock:
+                state["in_flight"] -= 1
+                state["last_seen"] = time.monotonic()
+
+    def stats(self):
+        """Admitted/dropped frame counters."""
+        with self._lock:
+            return {
+                "frames_admitted": self.frames_admitted,
+                "frames_dropped": self.frames_dropped
+            }
@@ -0,0 +1,163 @@
+import logging
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def attach_shared_memory(name):
+    """
+    Open an existing shared memory segment without taking ownership of it.
+
+    Before Python 3.13 attaching also registers the segment with the
+    resource tracker, which then unlinks it when the attaching process
+    exits, pulling it out from under the process that created it. The
+    registration is dropped again right after attaching. Processes started
+    from a common parent (gunicorn workers and the inference service) share
+    one tracker, so this can drop the creator's registration as well;
+    creators therefore remove segments with unlink_shared_memory.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def unlink_shared_memory(shm):
+    """Remove a segment created by this process (see attach_shared_memory)."""
+    if sys.version_info < (3, 13):
+        # unlink() unregisters the segment, which fails in the tracker if an
+        # attaching process sharing it already did
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+class FrameRing:
+    def __init__(self, num_slots, slot_bytes, name=None, shared=True):
+        """
+        Ring of preallocated frame buffers handed out by slot index.
+
+        Producers acquire a free slot, decode straight into it and pass the
+        slot index on; consumers map the same slot as a NumPy array, so the
+        frame itself is never copied or pickled. Slots are reference counted
+        and go back on the free list once the last holder releases them.
+
+        With shared=True the slots live in one multiprocessing.shared_memory
+        segment that other processes can attach to by name. Reference counts
+        are only tracked by the process that created the ring; attached
+        processes just read and write slot contents.
+
+        Args:
+            num_slots: Number of frame buffers
+            slot_bytes: Size of each buffer (e.g. 1920 * 1080 * 3 for 1080p BGR)
+            name: Attach to an existing shared ring instead of creating one
+            shared: Back the slots with shared memory (False keeps them process-local)
+        """
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+
+        self._shm = None
+        if name is not None:
+            self._shm = attach_shared_memory(name)
+            self._buffer = self._shm.buf
+        elif shared:
+            self._shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+            self._buffer = self._shm.buf
+        else:
+            self._buffer = np.empty(num_slots * slot_bytes, dtype=np.uint8).data
+
+        self._cond = threading.Condition()
+        self._refcounts = [0] * num_slots
+        self._free = list(range(num_slots - 1, -1, -1))
+        self.acquired = 0
+        self.exhausted = 0
+
+    @property
+    def name(self):
+        """Shared memory segment name other processes attach with (None if process-local)."""
+        return self._shm.name if self._shm is not None else None
+
+    def fits(self, shape, dtype=np.uint8):
+        """Whether a frame of this shape and dtype fits in one slot."""
+        return int(np.prod(shape)) * np.dtype(dtype).itemsize <= self.slot_bytes
+
+    def frame(self, index, shape, dtype=np.uint8):
+        """
+        NumPy view of a slot's contents (no copy).
+
+        Views must be dropped before the ring is closed.
+        """
+        offset = index * self.slot_bytes
+        count = int(np.prod(shape))
+        return np.frombuffer(self._buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def acquire(self, timeout=None):
+        """
+        Take a free slot with a reference count of one.
+
+        Args:
+            timeout: Seconds to wait for a slot to be recycled (None waits forever, 0 doesn't wait)
+
+        Returns:
+            Slot index, or None if no slot became free in time
+        """
+        with self._cond:
+            if not self._free and timeout != 0:
+                self._cond.wait_for(lambda: self._free, timeout)
+            if not self._free:
+                self.exhausted += 1
+                return None
+            index = self._free.pop()
+            self._refcounts[index] = 1
+            self.acquired += 1
+            return index
+
+    def retain(self, index):
+        """Add a reference to an acquired slot."""
+        with self._cond:
+            if self._refcounts[index] <= 0:
+                raise ValueError(f"Frame slot {index} is not acquired")
+            self._refcounts[index] += 1
+
+    def release(self, index):
+        """Drop a reference; the slot is recycled when none are left."""
+        with self._cond:
+            if self._refcounts[index] <= 0:
+                raise ValueError(f"Frame slot {index} is not acquired")
+            self._refcounts[index] -= 1
+            if self._refcounts[index] == 0:
+                self._free.append(index)
+                self._cond.notify()
+
+    def close(self, unlink=None):
+        """
+        Detach from the shared segment.
+
+        Args:
+            unlink: Also remove the segment (defaults to True for the creating process)
+        """
+        self._buffer = None
+        if self._shm is None:
+            return
+        self._shm.close()
+        if unlink is None:
+            unlink = self.owner
+        if unlink:
+            unlink_shared_memory(self._shm)
+        self._shm = None
+
+    def stats(self):
+        """Slot usage counters."""
+        with self._cond:
+            return {
+                "slots": self.num_slots,
+                "slot_bytes": self.slot_bytes,
+                "slots_in_use": self.num_slots - len(self._free),
+                "acquired": self.acquired,
+                "exhausted": self.exhausted
+            }
@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration.
+
+When INFERENCE_SERVICE is set, the gunicorn master starts one shared
+inference service as a separate process before forking web workers, and
+every worker sends its frames there instead of loading its own copy of the
+model. Without INFERENCE_AUTHKEY a random key is generated and passed to
+the service and the workers through the environment.
+"""
+import os
+
+inference_process = None
+
+
+def on_starting(server):
+    global inference_process
+    if not os.environ.get("INFERENCE_SERVICE"):
+        return
+
+    from inference_service import authkey_from_env, start_service_process
+
+    authkey_from_env(generate=True)
+    inference_process = start_service_process()
+    server.log.info(f"Inference service started on {os.environ['INFERENCE_SERVICE']} (pid {inference_process.pid})")
+
+
+def on_exit(server):
+    if inference_process is not None:
+        inference_process.terminate()
+        inference_process.join(10)
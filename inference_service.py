@@ -0,0 +1,491 @@
+"""
+Local multi-process inference service.
+
+A fixed pool of detector processes is shared by every gunicorn worker:
+web workers send frames over a local connection and receive detections
+back, so the model is loaded once per inference process instead of once
+per web worker, and OpenCV/NumPy thread pools are sized per process
+instead of oversubscribing the CPU.
+
+Frames travel through a FrameRing of preallocated shared memory slots
+owned by the service: clients acquire slots, write frames into them and
+send only slot indices, shapes and dtypes over the connection. Frames that
+don't fit a slot, or arrive while every slot is busy, fall back to a
+one-off shared memory segment.
+
+Connections carry pickled messages, so every client must present the
+shared INFERENCE_AUTHKEY; there is no built-in key. The default address is
+a Unix socket readable only by the service's user.
+
+Run standalone with `python inference_service.py`, or let gunicorn.conf.py
+start it as a separate process when INFERENCE_SERVICE is set.
+
+numpy and cv2 are only imported inside the worker processes after their
+thread limits are applied, so keep module-level imports light.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+logger = logging.getLogger(__name__)
+
+# Listen address when INFERENCE_SERVICE doesn't name one
+DEFAULT_ADDRESS = "inference.sock"
+
+# Seconds between checks for dead worker processes
+SUPERVISE_INTERVAL = 1.0
+
+
+def authkey_from_env(generate=False):
+    """
+    Read the service's shared secret from INFERENCE_AUTHKEY.
+
+    Args:
+        generate: When the variable is unset, create a random key and store it
+            in os.environ so processes started afterwards inherit it
+
+    Raises:
+        RuntimeError: If the variable is unset and generate is False
+    """
+    authkey = os.environ.get("INFERENCE_AUTHKEY")
+    if not authkey:
+        if not generate:
+            raise RuntimeError("INFERENCE_AUTHKEY must be set to use the inference service")
+        authkey = secrets.token_hex(32)
+        os.environ["INFERENCE_AUTHKEY"] = authkey
+    return authkey.encode()
+
+
+def parse_address(address):
+    """Parse "host:port" into an AF_INET tuple; anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and not address.startswith("/"):
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _worker_main(worker_index, task_queue, result_queue, detector_options, num_threads, ring_info):
+    """Inference worker process: own detector, bounded thread pools."""
+    # Must happen before numpy/cv2 are imported in this process
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+
+    import cv2
+    import numpy as np
+    from detector import ObjectDetector
+    from frame_ring import FrameRing, attach_shared_memory
+
+    cv2.setNumThreads(num_threads)
+    ring = FrameRing(ring_info[1], ring_info[2], name=ring_info[0]) if ring_info else None
+    detector = ObjectDetector(**detector_options)
+    detector.load()
+    result_queue.put(("ready", worker_index, detector.config_signature()))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        request_id, frames = task
+        # Lets the service fail this request if the process dies on it
+        result_queue.put(("busy", worker_index, request_id))
+        segments = []
+        images = []
+        try:
+            for kind, location, shape, dtype in frames:
+                if kind == "ring":
+                    images.append(ring.frame(location, shape, dtype))
+                else:
+                    segment = attach_shared_memory(location)
+                    segments.append(segment)
+                    images.append(np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+            result_queue.put((request_id, "ok", detector.detect_batch(images)))
+        except Exception as e:
+            result_queue.put((request_id, "error", f"{type(e).__name__}: {e}"))
+        finally:
+            del images
+            for segment in segments:
+                segment.close()
+
+
+class InferenceService:
+    def __init__(self, address, authkey, num_workers=None,
+                 threads_per_worker=None, detector_options=None, request_timeout=60.0,
+                 ring_slots=16, slot_bytes=1920 * 1080 * 3):
+        """
+        Initialize the inference service (call start() to run it).
+
+        Worker processes that die are replaced by a supervisor thread; the
+        request a dead worker was running fails instead of timing out.
+
+        Args:
+            address: "host:port" or Unix socket path to listen on
+            authkey: Shared secret clients must present
+            num_workers: Number of detector processes
+            threads_per_worker: OpenCV/BLAS threads in each detector process
+            detector_options: ObjectDetector keyword arguments for every worker
+            request_timeout: Seconds to wait for a worker result
+            ring_slots: Shared frame slots (0 sends every frame in its own segment)
+            slot_bytes: Size of each frame slot
+        """
+        cpu_count = os.cpu_count() or 1
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.num_workers = num_workers or max(1, cpu_count // 2)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+        self.detector_options = detector_options or {}
+        self.request_timeout = request_timeout
+        self.ring_slots = ring_slots
+        self.slot_bytes = slot_bytes
+        self.ring = None
+
+        # spawn keeps workers free of the parent's threads and locks
+        self._ctx = multiprocessing.get_context("spawn")
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._workers = []
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._request_slots = {}
+        # Request each worker is running, by worker index
+        self._busy = {}
+        self._stopping = threading.Event()
+        self._listener = None
+        self._ring_info = None
+        self.signature = None
+        self.workers_restarted = 0
+
+    def start(self):
+        """Start the worker processes and the connection listener."""
+        if self.ring_slots:
+            from frame_ring import FrameRing
+
+            self.ring = FrameRing(self.ring_slots, self.slot_bytes)
+            self._ring_info = (self.ring.name, self.ring_slots, self.slot_bytes)
+
+        self._workers = [self._start_worker(i) for i in range(self.num_workers)]
+
+        # Wait until every worker has loaded and warmed up its model
+        for _ in range(self.num_workers):
+            _, worker_index, signature = self._result_queue.get()
+            self.signature = signature
+            logger.info(f"Inference worker {worker_index} ready")
+
+        threading.Thread(target=self._dispatch_results, name="inference-results", daemon=True).start()
+        threading.Thread(target=self._supervise, name="inference-supervisor", daemon=True).start()
+
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self._listener = Listener(self.address, authkey=self.authkey)
+            # Only the service's user may connect (the authkey is still required)
+            os.chmod(self.address, 0o600)
+        else:
+            logger.warning("Inference service listens on TCP; any local user can connect, "
+                           "so keep INFERENCE_AUTHKEY secret or use a Unix socket")
+            self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, name="inference-accept", daemon=True).start()
+        logger.info(f"Inference service listening on {self.address} with {self.num_workers} workers "
+                    f"x {self.threads_per_worker} threads")
+
+    def _start_worker(self, worker_index):
+        worker = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_index, self._task_queue, self._result_queue, self.detector_options,
+                  self.threads_per_worker, self._ring_info),
+            name=f"inference-worker-{worker_index}",
+            daemon=True
+        )
+        worker.start()
+        return worker
+
+    def _supervise(self):
+        """Replace worker processes that exited, failing the request each was running."""
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            for worker_index, worker in enumerate(self._workers):
+                if worker.is_alive() or self._stopping.is_set():
+                    continue
+                logger.error(f"Inference worker {worker_index} exited with code {worker.exitcode}, restarting it")
+                with self._pending_lock:
+                    request_id = self._busy.pop(worker_index, None)
+                if request_id is not None:
+                    # Routed like a normal result, so its slots are recycled too
+                    self._result_queue.put((request_id, "error", "Inference worker died"))
+                self._workers[worker_index] = self._start_worker(worker_index)
+                self.workers_restarted += 1
+
+    def stop(self):
+        """Stop the listener and worker processes."""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if self.ring is not None:
+            self.ring.close()
+
+    def _dispatch_results(self):
+        """Route worker results back to the waiting connection threads."""
+        while True:
+            request_id, status, payload = self._result_queue.get()
+            if request_id == "busy":
+                with self._pending_lock:
+                    self._busy[status] = payload
+                continue
+            if request_id == "ready":
+                logger.info(f"Inference worker {status} ready")
+                continue
+            with self._pending_lock:
+                for worker_index, busy_id in list(self._busy.items()):
+                    if busy_id == request_id:
+                        del self._busy[worker_index]
+                waiter = self._pending.pop(request_id, None)
+                slots = self._request_slots.pop(request_id, ())
+            # Recycle only once the worker is done reading, even if the request timed out
+            for index in slots:
+                self.ring.release(index)
+            if waiter is not None:
+                waiter["result"] = (status, payload)
+                waiter["event"].set()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # Listener closed
+                break
+            except Exception as e:
+                logger.warning(f"Rejected inference client: {str(e)}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        # Slots acquired by this client but not yet submitted for detection
+        held_slots = set()
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    break
+
+                kind = message[0]
+                if kind == "signature":
+                    conn.send(("ok", self.signature))
+                elif kind == "ring":
+                    conn.send(("ok", (self.ring.name, self.ring_slots, self.slot_bytes) if self.ring else None))
+                elif kind == "acquire":
+                    conn.send(("ok", self._acquire_slots(message[1], held_slots)))
+                elif kind == "detect":
+                    conn.send(self._run(message[1], held_slots))
+                else:
+                    conn.send(("error", f"Unknown request: {kind}"))
+        finally:
+            conn.close()
+            for index in held_slots:
+                self.ring.release(index)
+
+    def _acquire_slots(self, sizes, held_slots):
+        """Acquire one ring slot per frame size without waiting; None where no slot is available."""
+        slots = []
+        for size in sizes:
+            index = None
+            if self.ring is not None and size <= self.slot_bytes:
+                index = self.ring.acquire(timeout=0)
+            if index is not None:
+                held_slots.add(index)
+            slots.append(index)
+        return slots
+
+    def _run(self, frames, held_slots):
+        """Hand one batch of frame descriptors to the worker pool and wait for the result."""
+        request_id = next(self._request_ids)
+        waiter = {"event": threading.Event(), "result": None}
+
+        # The request takes over the client's slots; the result dispatcher releases them
+        slots = [location for kind, location, _, _ in frames if kind == "ring" and location in held_slots]
+        held_slots.difference_update(slots)
+        with self._pending_lock:
+            self._pending[request_id] = waiter
+            self._request_slots[request_id] = slots
+        self._task_queue.put((request_id, frames))
+
+        if not waiter["event"].wait(self.request_timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            return ("error", "Timed out waiting for an inference worker")
+        return waiter["result"]
+
+
+class InferenceClient:
+    def __init__(self, address, authkey):
+        """
+        Client for InferenceService with the same detect API as ObjectDetector.
+
+        Each thread keeps its own connection, so concurrent requests in a
+        threaded web worker don't serialize on one socket.
+
+        Args:
+            address: "host:port" or Unix socket path of the service
+            authkey: Shared secret configured on the service
+        """
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+        self._signature = None
+        self._ring = None
+        self._ring_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, message):
+        try:
+            conn = self._connection()
+            conn.send(message)
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            # Service restarted; drop the connection so the next call reconnects
+            self._local.conn = None
+            raise
+        if status != "ok":
+            raise RuntimeError(f"Inference service error: {payload}")
+        return payload
+
+    def config_signature(self):
+        """Configuration signature of the detectors in the service."""
+        if self._signature is None:
+            self._signature = self._request(("signature",))
+        return self._signature
+
+    def _frame_ring(self):
+        """The service's frame ring, attached on first use (None if the service has none)."""
+        with self._ring_lock:
+            if self._ring is None:
+                from frame_ring import FrameRing
+
+                info = self._request(("ring",))
+                self._ring = FrameRing(info[1], info[2], name=info[0]) if info else False
+            return self._ring or None
+
+    def detect(self, image):
+        """Detect objects in one image (see ObjectDetector.detect)."""
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """Detect objects in several images in one worker call (see ObjectDetector.detect_batch)."""
+        if not images:
+            return []
+
+        from frame_ring import unlink_shared_memory
+
+        ring = self._frame_ring()
+        slots = self._request(("acquire", [image.nbytes for image in images])) if ring else [None] * len(images)
+
+        segments = []
+        try:
+            frames = []
+            for image, index in zip(images, slots):
+                if index is not None:
+                    ring.frame(index, image.shape, image.dtype)[...] = image
+                    frames.append(("ring", index, image.shape, image.dtype.str))
+                    continue
+
+                segment = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+                segments.append(segment)
+                view = type(image)(image.shape, dtype=image.dtype, buffer=segment.buf)
+                view[...] = image
+                del view
+                frames.append(("shm", segment.name, image.shape, image.dtype.str))
+            return self._request(("detect", frames))
+        finally:
+            for segment in segments:
+                segment.close()
+                unlink_shared_memory(segment)
+
+
+def service_from_env():
+    """
+    Build an InferenceService from the same environment variables app.py uses.
+
+    Raises:
+        RuntimeError: If INFERENCE_AUTHKEY is not set
+    """
+    from detector import detector_options_from_env
+
+    return InferenceService(
+        os.environ.get("INFERENCE_SERVICE") or DEFAULT_ADDRESS,
+        authkey=authkey_from_env(),
+        num_workers=int(os.environ.get("INFERENCE_WORKERS", "0")) or None,
+        threads_per_worker=int(os.environ.get("INFERENCE_THREADS", "0")) or None,
+        ring_slots=int(os.environ.get("INFERENCE_RING_SLOTS", "16")),
+        slot_bytes=int(os.environ.get("INFERENCE_SLOT_BYTES", str(1920 * 1080 * 3))),
+        detector_options=detector_options_from_env()
+    )
+
+
+def run_service(ready=None):
+    """Run the service from the environment until SIGTERM or Ctrl-C."""
+    logging.basicConfig(level=logging.INFO)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    service = service_from_env()
+    service.start()
+    if ready is not None:
+        ready.set()
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    service.stop()
+
+
+def start_service_process(timeout=600):
+    """
+    Run the service in its own process (e.g. next to a gunicorn master).
+
+    The caller keeps no service threads, so processes it forks later don't
+    inherit half-copied service state. The child inherits os.environ,
+    including INFERENCE_AUTHKEY.
+
+    Args:
+        timeout: Seconds to wait for every inference worker to load its model
+
+    Returns:
+        The started multiprocessing.Process; terminate() stops the service
+
+    Raises:
+        RuntimeError: If the service exits or isn't ready within timeout
+    """
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    # Not a daemon: it starts worker processes of its own
+    process = ctx.Process(target=run_service, args=(ready,), name="inference-service")
+    process.start()
+    deadline = time.monotonic() + timeout
+    while not ready.wait(1.0):
+        if not process.is_alive() or time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError("Inference service failed to start")
+    return process
+
+
+if __name__ == "__main__":
+    run_service()
@@ -0,0 +1,684 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+
+from metrics import timed
+from preprocess import ImageDecoder, scale_detections
+
+try:
+    import fcntl
+except ImportError:
+    # No inter-process locking (Windows): the single server process always ingests
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Image files picked up from watched directories
+DIRECTORY_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+# Seconds of history behind the per-source throughput figure
+THROUGHPUT_WINDOW = 10.0
+
+# Weight of the newest frame in the smoothed per-source lag
+LAG_SMOOTHING = 0.2
+
+
+def parse_sources(value):
+    """
+    Parse ingestion source specs from a JSON string.
+
+    Format: [{"name": "gate", "url": "rtsp://...", "fps": 2},
+    {"name": "drop", "directory": "/srv/drop", "fps": 10}, ...]. A spec has
+    either a url (stream URL or local video file) or a directory to watch.
+
+    Raises:
+        ValueError: If the value is not valid source JSON
+    """
+    if not value:
+        return []
+    specs = json.loads(value)
+    if not isinstance(specs, list):
+        raise ValueError("Ingestion sources must be a JSON list of source objects")
+    names = set()
+    for spec in specs:
+        if not isinstance(spec, dict) or not spec.get("name"):
+            raise ValueError("Every ingestion source needs a name")
+        if ("url" in spec) == ("directory" in spec):
+            raise ValueError(f"Ingestion source {spec['name']} needs exactly one of url or directory")
+        if spec["name"] in names:
+            raise ValueError(f"Duplicate ingestion source name: {spec['name']}")
+        names.add(spec["name"])
+    return specs
+
+
+def create_source(spec, decode=None):
+    """
+    Build an ingestion source from a parsed spec.
+
+    Args:
+        spec: Source spec dictionary (see parse_sources)
+        decode: Image decoder for directory sources (see DirectorySource)
+
+    Returns:
+        CaptureSource or DirectorySource (not started)
+    """
+    options = {key: value for key, value in spec.items() if key not in ("name", "url", "directory")}
+    if "directory" in spec:
+        return DirectorySource(spec["name"], spec["directory"], decode=decode, **options)
+    return CaptureSource(spec["name"], spec["url"], **options)
+
+
+def acquire_ingest_lock(path):
+    """
+    Take an exclusive lock so only one process (e.g. one gunicorn worker) ingests.
+
+    Without fcntl (Windows, where gunicorn doesn't run) the lock is not
+    enforced and the caller always ingests.
+
+    Returns:
+        The open lock file, which must be kept open to hold the lock, or None
+        if another process holds it
+    """
+    lock_file = open(path, "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class IngestFrame:
+    __slots__ = ("image", "captured_at", "source_name", "scale", "path")
+
+    def __init__(self, image, captured_at, source_name, scale=1, path=None):
+        """
+        One frame waiting for the scheduler.
+
+        Args:
+            image: Decoded BGR array
+            captured_at: time.monotonic() when the frame was read (or the file arrived)
+            source_name: Name logged with the frame's detections
+            scale: Original size divided by decoded size
+            path: File the frame came from (directory sources)
+        """
+        self.image = image
+        self.captured_at = captured_at
+        self.source_name = source_name
+        self.scale = scale
+        self.path = path
+
+
+class IngestSource:
+    source_type = None
+    # Whether frames older than the scheduler's max_lag are dropped
+    drop_stale = True
+
+    def __init__(self, name, fps=1.0):
+        """
+        Base class for a source read continuously on its own thread.
+
+        The reader thread keeps at most one frame ready; the scheduler takes
+        it once the source is due according to its target frame rate.
+
+        Args:
+            name: Source name (used in logs and stats)
+            fps: Target frames processed per second
+
+        Raises:
+            ValueError: If fps is not positive
+        """
+        if fps <= 0:
+            raise ValueError(f"Ingestion source {name}: fps must be positive")
+        self.name = name
+        self.fps = fps
+        self.interval = 1.0 / fps
+        # Earliest time.monotonic() the scheduler takes the next frame; owned by the scheduler
+        self.next_due = 0.0
+        self.state = "stopped"
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._stop = threading.Event()
+        self._notify = None
+        self._thread = None
+
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.frames_stale = 0
+        self.errors = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._processed_at = deque()
+
+    def start(self, notify):
+        """
+        Start the reader thread.
+
+        Args:
+            notify: Callable invoked whenever a new frame is ready
+        """
+        self._notify = notify
+        self._stop.clear()
+        self.state = "starting"
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the reader thread and discard any pending frame."""
+        self._stop.set()
+        with self._cond:
+            self._frame = None
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.state = "stopped"
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _post(self, frame):
+        """Make a frame available, replacing (dropping) one the scheduler hasn't taken yet."""
+        with self._cond:
+            if self._frame is not None:
+                self.frames_dropped += 1
+            self._frame = frame
+            self.frames_read += 1
+        self._notify()
+
+    def has_frame(self):
+        with self._cond:
+            return self._frame is not None
+
+    def take(self):
+        """Remove and return the pending frame (None if there is none)."""
+        with self._cond:
+            frame, self._frame = self._frame, None
+            self._cond.notify_all()
+            return frame
+
+    def mark_stale(self):
+        """Count a taken frame the scheduler dropped for being too old."""
+        with self._cond:
+            self.frames_stale += 1
+
+    def record_processed(self, frame, finished_at):
+        """
+        Record a frame whose detections were logged.
+
+        Args:
+            frame: The IngestFrame
+            finished_at: time.monotonic() when its detections were logged
+        """
+        lag = finished_at - frame.captured_at
+        with self._cond:
+            self.frames_processed += 1
+            self.lag = lag if self.frames_processed == 1 else self.lag + LAG_SMOOTHING * (lag - self.lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._processed_at.append(finished_at)
+            self._trim_processed(finished_at)
+
+    def record_error(self, frame):
+        """Count a frame whose detection failed."""
+        with self._cond:
+            self.errors += 1
+
+    def done(self, frame):
+        """Called once a frame's detections were logged."""
+
+    def _trim_processed(self, now):
+        while self._processed_at and self._processed_at[0] <= now - THROUGHPUT_WINDOW:
+            self._processed_at.popleft()
+
+    def stats(self):
+        """Frame counters, lag and throughput."""
+        with self._cond:
+            self._trim_processed(time.monotonic())
+            return {
+                "name": self.name,
+                "type": self.source_type,
+                "state": self.state,
+                "target_fps": self.fps,
+                "throughput_fps": len(self._processed_at) / THROUGHPUT_WINDOW,
+                "lag_seconds": self.lag,
+                "max_lag_seconds": self.max_lag,
+                "frames_read": self.frames_read,
+                "frames_processed": self.frames_processed,
+                "frames_dropped": self.frames_dropped,
+                "frames_stale": self.frames_stale,
+                "errors": self.errors
+            }
+
+
+class CaptureSource(IngestSource):
+    source_type = "stream"
+
+    def __init__(self, name, url, fps=1.0, loop=False, realtime=None,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        """
+        A camera stream or video file read through cv2.VideoCapture.
+
+        Every frame is grabbed to keep up with the stream, but frames are only
+        decoded when the scheduler will want one soon, and a decoded frame
+        that isn't taken before the next one arrives is dropped. Streams that
+        fail to open or stop delivering frames are reopened with exponential
+        backoff.
+
+        Args:
+            name: Source name
+            url: RTSP/HTTP stream URL or local video file path
+            fps: Target frames processed per second
+            loop: Restart a local video file when it ends (instead of finishing)
+            realtime: Read at the video's own frame rate; defaults to True for
+                local files, which otherwise decode far faster than a live feed
+            reconnect_delay: Seconds before the first reconnect attempt
+            max_reconnect_delay: Longest wait between reconnect attempts
+        """
+        super().__init__(name, fps)
+        self.url = url
+        self.is_file = os.path.isfile(url)
+        self.loop = loop
+        self.realtime = self.is_file if realtime is None else realtime
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            cap = cv2.VideoCapture(self.url)
+            if cap.isOpened():
+                self.state = "running"
+                try:
+                    read_any = self._read_frames(cap)
+                finally:
+                    cap.release()
+                if self._stop.is_set():
+                    break
+                if self.is_file and not self.loop:
+                    self.state = "finished"
+                    logger.info(f"Ingestion source {self.name} reached the end of its video")
+                    return
+                if read_any:
+                    delay = self.reconnect_delay
+                if self.is_file:
+                    continue
+            else:
+                cap.release()
+                with self._cond:
+                    self.errors += 1
+
+            self.state = "reconnecting"
+            self.reconnects += 1
+            logger.warning(f"Ingestion source {self.name} unavailable, reconnecting in {delay:g}s")
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _read_frames(self, cap):
+        """Read until the capture ends or the source stops; returns whether any frame was read."""
+        native_fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / native_fps if 0 < native_fps < 1000 else 0.0
+        started = time.monotonic()
+        grabbed = 0
+        while not self._stop.is_set():
+            if not cap.grab():
+                return grabbed > 0
+            grabbed += 1
+            now = time.monotonic()
+            if self.realtime and frame_interval:
+                wait = started + grabbed * frame_interval - now
+                if wait > 0:
+                    self._stop.wait(wait)
+                    now = time.monotonic()
+
+            # Only decode frames that will be due before the next one arrives
+            if now + frame_interval < self.next_due:
+                continue
+            ok, image = cap.retrieve()
+            if not ok:
+                return grabbed > 0
+            self._post(IngestFrame(image, now, self.name))
+        return grabbed > 0
+
+    def stats(self):
+        stats = super().stats()
+        stats["reconnects"] = self.reconnects
+        return stats
+
+
+class DirectorySource(IngestSource):
+    source_type = "image"
+    # Every dropped file is an event of its own; a backlog waits on disk instead
+    drop_stale = False
+
+    def __init__(self, name, directory, fps=10.0, poll_interval=1.0, settle_time=1.0,
+                 processed_dir=None, failed_dir=None, decode=None, max_attempts=3):
+        """
+        A watched drop directory, the offline stand-in for a camera.
+
+        Image files are processed oldest first, one at a time, and moved to
+        processed_dir once their detections are logged (or to failed_dir if
+        they can't be decoded), so each file is handled once even across
+        restarts. Files modified within settle_time are left alone while they
+        may still be being written. A file whose detection or logging fails is
+        retried after a growing delay, and moved to failed_dir once it has
+        failed max_attempts times.
+
+        Args:
+            name: Source name
+            directory: Directory to watch
+            fps: Target files processed per second
+            poll_interval: Seconds between directory scans when idle
+            settle_time: Seconds a file must be unmodified before it is read
+            processed_dir: Destination of processed files (default <directory>/processed)
+            failed_dir: Destination of unreadable files (default <directory>/failed)
+            decode: Callable turning file bytes into a DecodedImage or None
+                (default: ImageDecoder().decode)
+            max_attempts: Failed detection attempts after which a file is moved to failed_dir
+        """
+        super().__init__(name, fps)
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.processed_dir = processed_dir or os.path.join(directory, "processed")
+        self.failed_dir = failed_dir or os.path.join(directory, "failed")
+        self.decode = decode or ImageDecoder().decode
+        self.max_attempts = max_attempts
+
+        self._backlog = deque()
+        # Files queued or in flight, so rescans don't pick them up again
+        self._seen = set()
+        # Files whose detection failed: path -> (failed attempts, monotonic time of the next try)
+        self._retries = {}
+        # Serializes picking a free destination name with the move itself
+        self._move_lock = threading.Lock()
+
+        for path in (self.directory, self.processed_dir, self.failed_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _run(self):
+        self.state = "running"
+        while not self._stop.is_set():
+            if not self._backlog:
+                self._scan()
+            if not self._backlog:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            # Wait until the scheduler has taken the previous file
+            with self._cond:
+                while self._frame is not None and not self._stop.is_set():
+                    self._cond.wait(self.poll_interval)
+            if self._stop.is_set():
+                break
+
+            path, mtime = self._backlog.popleft()
+            frame = self._read(path, mtime)
+            if frame is not None:
+                self._post(frame)
+
+    def _scan(self):
+        cutoff = time.time() - self.settle_time
+        now = time.monotonic()
+        with self._cond:
+            backing_off = {path for path, (_, retry_at) in self._retries.items() if retry_at > now}
+        found = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.path in self._seen or entry.path in backing_off or not entry.is_file():
+                        continue
+                    if entry.name.rsplit(".", 1)[-1].lower() not in DIRECTORY_EXTENSIONS:
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime <= cutoff:
+                        found.append((mtime, entry.name, entry.path))
+        except OSError as e:
+            with self._cond:
+                self.errors += 1
+            logger.error(f"Error scanning ingestion directory {self.directory}: {str(e)}")
+            return
+        for mtime, _, path in sorted(found):
+            self._seen.add(path)
+            self._backlog.append((path, mtime))
+
+    def _read(self, path, mtime):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            # Deleted or unreadable; a rescan retries it if it's still there
+            self._seen.discard(path)
+            with self._cond:
+                self._retries.pop(path, None)
+            logger.warning(f"Could not read {path}: {str(e)}")
+            return None
+
+        decoded = self.decode(data)
+        if decoded is None:
+            with self._cond:
+                self.errors += 1
+            logger.warning(f"Could not decode {path}, moving it to {self.failed_dir}")
+            self._move(path, self.failed_dir)
+            return None
+
+        # Lag counts from when the file landed, not from when it was read
+        captured_at = time.monotonic() - max(0.0, time.time() - mtime)
+        return IngestFrame(decoded.image, captured_at, f"{self.name}/{os.path.basename(path)}",
+                           decoded.scale, path)
+
+    def _move(self, path, destination):
+        """Move a file into destination, adding a counter to its name if the name is taken."""
+        stem, ext = os.path.splitext(os.path.basename(path))
+        try:
+            with self._move_lock:
+                target = os.path.join(destination, stem + ext)
+                counter = 0
+                while os.path.exists(target):
+                    # Cameras often reuse names like image.jpg; keep the earlier file
+                    counter += 1
+                    target = os.path.join(destination, f"{stem}-{counter}{ext}")
+                os.replace(path, target)
+        except OSError as e:
+            logger.error(f"Could not move {path} to {destination}: {str(e)}")
+        with self._cond:
+            self._retries.pop(path, None)
+        self._seen.discard(path)
+
+    def done(self, frame):
+        self._move(frame.path, self.processed_dir)
+
+    def record_error(self, frame):
+        super().record_error(frame)
+        with self._cond:
+            attempts = self._retries.get(frame.path, (0, 0))[0] + 1
+            self._retries[frame.path] = (attempts, time.monotonic() + self.poll_interval * 2 ** attempts)
+        if attempts >= self.max_attempts:
+            logger.warning(f"Detection failed {attempts} times for {frame.path}, moving it to {self.failed_dir}")
+            self._move(frame.path, self.failed_dir)
+            return
+        # Leave the file in place for a later scan to retry
+        self._seen.discard(frame.path)
+
+    def stats(self):
+        stats = super().stats()
+        stats["backlog"] = len(self._backlog)
+        return stats
+
+
+class IngestionScheduler:
+    def __init__(self, detector, detection_logger, sources=(), batch_size=8, max_lag=2.0):
+        """
+        Continuously detect objects in frames pulled from several sources.
+
+        Each source reads on its own thread and keeps its newest frame ready.
+        A single dispatcher thread takes ready frames from the sources that
+        are due, earliest due first, so a fast or busy source can't starve
+        the others, packs up to batch_size of them into one detect_batch call
+        on the shared detector, and logs the results through the detection
+        logger, one bulk write per source type. When the detector can't keep
+        up, sources fall behind their target rate evenly and their readers
+        replace untaken frames with newer ones; frames that still waited
+        longer than max_lag are dropped instead of being processed late.
+
+        Args:
+            detector: ObjectDetector (or InferenceClient) used for inference
+            detection_logger: DetectionLogger that receives the detections
+            sources: Initial IngestSource instances
+            batch_size: Most frames per detect_batch call
+            max_lag: Seconds after which an untaken stream frame is dropped (0 = never)
+        """
+        self.detector = detector
+        self.detection_logger = detection_logger
+        self.batch_size = batch_size
+        self.max_lag = max_lag
+
+        self._sources = OrderedDict()
+        self._sources_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+
+        for source in sources:
+            self.add_source(source)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start every source and the dispatcher thread."""
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        for source in sources:
+            source.start(self._wake.set)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Ingesting from {len(sources)} sources: {', '.join(s.name for s in sources)}")
+
+    def stop(self, timeout=10):
+        """Stop the dispatcher (after its current batch) and every source."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        for source in sources:
+            source.stop()
+
+    def add_source(self, source):
+        """
+        Add a source (started right away if the scheduler is running).
+
+        Raises:
+            ValueError: If a source with the same name exists
+        """
+        with self._sources_lock:
+            if source.name in self._sources:
+                raise ValueError(f"Ingestion source {source.name} already exists")
+            self._sources[source.name] = source
+        if self.running:
+            source.start(self._wake.set)
+
+    def remove_source(self, name):
+        """Stop and remove a source; returns whether it existed."""
+        with self._sources_lock:
+            source = self._sources.pop(name, None)
+        if source is None:
+            return False
+        source.stop()
+        return True
+
+    def stats(self):
+        """Scheduler counters and per-source stats."""
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        return {
+            "running": self.running,
+            "batches": self.batches,
+            "sources": [source.stats() for source in sources]
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before looking, so a frame posted meanwhile wakes the wait below
+            self._wake.clear()
+            now = time.monotonic()
+            batch = self._next_batch(now)
+            if batch:
+                self._process(batch)
+            else:
+                self._wake.wait(self._idle_timeout(now))
+
+    def _next_batch(self, now):
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        ready = sorted(
+            (source for source in sources if source.next_due <= now and source.has_frame()),
+            key=lambda source: source.next_due
+        )
+
+        batch = []
+        for source in ready:
+            if len(batch) == self.batch_size:
+                break
+            frame = source.take()
+            if frame is None:
+                continue
+            if source.drop_stale and self.max_lag and now - frame.captured_at > self.max_lag:
+                source.mark_stale()
+                continue
+            # A source that fell behind starts afresh instead of bursting to catch up
+            source.next_due = max(source.next_due + source.interval, now)
+            batch.append((source, frame))
+        return batch
+
+    def _idle_timeout(self, now, longest=0.5):
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        due = [source.next_due for source in sources if source.has_frame()]
+        if not due:
+            return longest
+        return min(max(min(due) - now, 0.001), longest)
+
+    def _process(self, batch):
+        start = time.perf_counter()
+        try:
+            with timed("ingest_detect"):
+                results = self.detector.detect_batch([frame.image for _, frame in batch])
+        except Exception as e:
+            logger.error(f"Error detecting objects in {len(batch)} ingested frames: {str(e)}")
+            for source, frame in batch:
+                source.record_error(frame)
+            return
+        process_time = (time.perf_counter() - start) / len(batch)
+
+        records = {}
+        for (source, frame), detections in zip(batch, results):
+            records.setdefault(source.source_type, []).append(
+                (frame.source_name, scale_detections(detections, frame.scale), process_time))
+        try:
+            for source_type, source_records in records.items():
+                self.detection_logger.log_detections_bulk(source_type, source_records)
+        except Exception as e:
+            logger.error(f"Error logging detections for {len(batch)} ingested frames: {str(e)}")
+            for source, frame in batch:
+                source.record_error(frame)
+            return
+
+        self.batches += 1
+        finished = time.monotonic()
+        for source, frame in batch:
+            source.record_processed(frame, finished)
+            source.done(frame)
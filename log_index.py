@@ -0,0 +1,242 @@
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+
+from detection_result import DetectionResult, compact_detections
+
+logger = logging.getLogger(__name__)
+
+# Per-detection payloads left out of the summary projection
+HEAVY_FIELDS = ("detections", "frame_detections", "detected_classes")
+
+
+def iter_entry_detections(log_entry):
+    """Yield every detection recorded by a log entry (image/webcam or video)."""
+    if "frame_detections" in log_entry:
+        for frame in log_entry["frame_detections"]:
+            yield from frame["detections"]
+    else:
+        yield from log_entry.get("detections", [])
+
+
+def entry_labels(log_entry):
+    """Class name of every detection in a log entry (image/webcam or video)."""
+    if "detected_classes" in log_entry:
+        return log_entry["detected_classes"]
+    if "frame_detections" in log_entry:
+        return [label for frame in log_entry["frame_detections"] for label in _labels(frame["detections"])]
+    return _labels(log_entry.get("detections", []))
+
+
+def _labels(detections):
+    if isinstance(detections, DetectionResult):
+        return detections.labels
+    return [det["class"] for det in detections]
+
+
+def entry_max_confidence(log_entry):
+    """Highest detection confidence in a log entry (0.0 without detections)."""
+    if isinstance(log_entry.get("detections"), DetectionResult):
+        return log_entry["detections"].max_confidence()
+    return max((det["confidence"] for det in iter_entry_detections(log_entry)), default=0.0)
+
+
+def compact_log_entry(log_entry):
+    """
+    Shrink a log entry for the in-memory history.
+
+    Detection lists become DetectionResult arrays and the detected_classes
+    list, which only repeats their class names, is dropped (log_view()
+    restores it).
+    """
+    log_entry.pop("detected_classes", None)
+    if "frame_detections" in log_entry:
+        log_entry["frame_detections"] = [
+            {**frame, "detections": compact_detections(frame["detections"])}
+            for frame in log_entry["frame_detections"]
+        ]
+    elif "detections" in log_entry:
+        log_entry["detections"] = compact_detections(log_entry["detections"])
+    return log_entry
+
+
+def log_view(log_entry):
+    """Full log entry as returned by the API and written to the store, with detected_classes."""
+    return {**log_entry, "detected_classes": entry_labels(log_entry)}
+
+
+def summarize_log(log_entry):
+    """
+    Project a log entry down to its summary fields.
+
+    Args:
+        log_entry: Full log entry
+
+    Returns:
+        Copy of the entry without per-detection payloads, with class counts
+        and the highest confidence instead
+    """
+    summary = {key: value for key, value in log_entry.items() if key not in HEAVY_FIELDS}
+    summary["class_counts"] = dict(Counter(entry_labels(log_entry)))
+    summary["max_confidence"] = entry_max_confidence(log_entry)
+    return summary
+
+
+class LogIndex:
+    def __init__(self):
+        """
+        Initialize in-memory secondary indexes over the detection log list.
+
+        Every index stores positions into the log list in ascending order, so
+        filtered pages can be cut out with binary search instead of scanning
+        the whole history. Log ids and timestamps are assumed to increase in
+        append order.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all indexes."""
+        self.ids = []
+        self.timestamps = []
+        self.max_confidence = []
+        self.by_source = defaultdict(list)
+        self.by_class = defaultdict(list)
+
+    def rebuild(self, logs):
+        """
+        Rebuild all indexes from a full list of log entries.
+
+        Args:
+            logs: List of log entries
+        """
+        with self._lock:
+            self.reset()
+            for log_entry in logs:
+                self._add(log_entry)
+
+    def add(self, log_entry):
+        """
+        Index a newly appended log entry.
+
+        Args:
+            log_entry: Log entry appended to the end of the log list
+        """
+        with self._lock:
+            self._add(log_entry)
+
+    def _add(self, log_entry):
+        position = len(self.ids)
+        self.ids.append(log_entry["id"])
+        self.timestamps.append(log_entry["timestamp"])
+        self.max_confidence.append(entry_max_confidence(log_entry))
+        self.by_source[log_entry["source_type"]].append(position)
+        for class_name in set(entry_labels(log_entry)):
+            self.by_class[class_name].append(position)
+
+    def drop_head(self, count):
+        """
+        Forget the first count entries after they were removed from the front of the log list.
+
+        Remaining positions shift down by count.
+        """
+        with self._lock:
+            del self.ids[:count]
+            del self.timestamps[:count]
+            del self.max_confidence[:count]
+            for index in (self.by_source, self.by_class):
+                for key in list(index):
+                    postings = index[key]
+                    start = bisect_left(postings, count)
+                    if start == len(postings):
+                        del index[key]
+                    else:
+                        index[key] = [position - count for position in postings[start:]]
+
+    def count_before(self, timestamp):
+        """Number of entries with a timestamp earlier than the given ISO timestamp."""
+        with self._lock:
+            return bisect_left(self.timestamps, timestamp)
+
+    def source_types(self):
+        """Return the source types present in the index."""
+        with self._lock:
+            return sorted(self.by_source)
+
+    def position_of(self, log_id):
+        """
+        Find the list position of a log id.
+
+        Returns:
+            Position in the log list, or None if the id is not present
+        """
+        with self._lock:
+            position = bisect_left(self.ids, log_id)
+            if position < len(self.ids) and self.ids[position] == log_id:
+                return position
+            return None
+
+    def query(self, source_type=None, detected_class=None, since=None, until=None,
+              min_confidence=None, cursor=None, limit=50):
+        """
+        Find matching log positions, newest first.
+
+        Args:
+            source_type: Only entries from this source type
+            detected_class: Only entries containing this class
+            since: Only entries with timestamp >= since (ISO format)
+            until: Only entries with timestamp <= until (ISO format)
+            min_confidence: Only entries with a detection at or above this confidence
+            cursor: Only entries with an id lower than this (from a previous page)
+            limit: Maximum number of positions to return
+
+        Returns:
+            Tuple of (positions, next_cursor); next_cursor is None on the last page
+        """
+        with self._lock:
+            # Restrict to a contiguous position range using the time and cursor bounds
+            low = bisect_left(self.timestamps, since) if since else 0
+            high = bisect_right(self.timestamps, until) if until else len(self.ids)
+            if cursor is not None:
+                high = min(high, bisect_left(self.ids, cursor))
+
+            # Walk the most selective index available
+            candidates = None
+            for key, index in ((source_type, self.by_source), (detected_class, self.by_class)):
+                if key is None:
+                    continue
+                postings = index.get(key, [])
+                if candidates is None or len(postings) < len(candidates):
+                    candidates = postings
+
+            if candidates is None:
+                start, stop = high - 1, low - 1
+                candidate_iter = range(start, stop, -1)
+            else:
+                start = bisect_left(candidates, high) - 1
+                stop = bisect_left(candidates, low) - 1
+                candidate_iter = (candidates[i] for i in range(start, stop, -1))
+
+            source_positions = self.by_source.get(source_type, []) if source_type else None
+            class_positions = self.by_class.get(detected_class, []) if detected_class else None
+
+            positions = []
+            for position in candidate_iter:
+                if source_positions is not None and not _contains(source_positions, position):
+                    continue
+                if class_positions is not None and not _contains(class_positions, position):
+                    continue
+                if min_confidence is not None and self.max_confidence[position] < min_confidence:
+                    continue
+                if len(positions) == limit:
+                    # There is at least one more match beyond this page
+                    return positions, self.ids[positions[-1]]
+                positions.append(position)
+
+            return positions, None
+
+
+def _contains(sorted_positions, position):
+    i = bisect_left(sorted_positions, position)
+    return i < len(sorted_positions) and sorted_positions[i] == position
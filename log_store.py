@@ -0,0 +1,453 @@
+import json
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from detection_result import json_default
+
+try:
+    import fcntl
+except ImportError:
+    # No inter-process locking (Windows): only one process may use a store directory
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+# Hourly summaries of entries removed by retention compaction
+SUMMARY_FILE = "summaries.jsonl"
+# Locked by the process writing to the store
+LOCK_FILE = "store.lock"
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class JsonlLogStore:
+    def __init__(self, directory="detection_logs", legacy_file="detection_logs.json",
+                 segment_max_bytes=4 * 1024 * 1024, fsync_policy="interval", fsync_interval=1.0):
+        """
+        Initialize an append-only log store backed by JSON Lines segments.
+
+        Each log entry is written as one line to the newest segment file, so an
+        append costs O(1) regardless of history size. Segments are rotated once
+        they grow past segment_max_bytes.
+
+        Several processes (e.g. gunicorn workers) may share a directory:
+        writers hold locked(), an flock on the directory's lock file, and
+        call read_new() first to pick up what other processes appended, so
+        ids stay unique and every process sees the same sequence of entries.
+
+        Args:
+            directory: Directory holding the segment files
+            legacy_file: Path of the old single-file JSON array log to migrate from
+            segment_max_bytes: Size after which a new segment is started
+            fsync_policy: "always" (fsync every append), "interval" (fsync at most
+                every fsync_interval seconds) or "never" (leave it to the OS)
+            fsync_interval: Seconds between fsyncs for the "interval" policy
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_index = 0
+        self._last_fsync = time.monotonic()
+
+        # Highest entry id read or written by this process
+        self.last_id = 0
+        # End of what this process has read: segment index, byte offset and inode
+        self._read_index = 0
+        self._read_offset = 0
+        self._read_inode = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._process_lock = threading.Lock()
+        self._lock_file = open(os.path.join(self.directory, LOCK_FILE), "a") if fcntl else None
+
+    @contextmanager
+    def locked(self):
+        """Hold the store's write lock, shared with every process (and thread) using the directory."""
+        with self._process_lock:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{index:06d}{SEGMENT_SUFFIX}")
+
+    def _segment_indices(self):
+        """Return the indices of existing segment files in ascending order."""
+        indices = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    indices.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(indices)
+
+    def load(self):
+        """
+        Load every stored entry, migrating the legacy file and repairing torn writes.
+
+        Returns:
+            List of log entries in append order
+        """
+        with self._lock:
+            self._migrate_legacy_file()
+
+            entries = []
+            indices = self._segment_indices()
+            for position, index in enumerate(indices):
+                is_last = position == len(indices) - 1
+                entries.extend(self._read_segment(self._segment_path(index), repair=is_last))
+
+            self._segment_index = indices[-1] if indices else 1
+            self._read_index, self._read_offset, self._read_inode = self._segment_index, 0, None
+            if indices:
+                stat = os.stat(self._segment_path(self._segment_index))
+                self._read_offset, self._read_inode = stat.st_size, stat.st_ino
+            self.last_id = entries[-1]["id"] if entries else 0
+            return entries
+
+    def read_new(self):
+        """
+        Read the entries other processes appended since this process last read or wrote.
+
+        Call under locked(). A segment replaced or removed meanwhile (by
+        compaction in another process) is reread from the start, skipping
+        entries already seen.
+
+        Returns:
+            Tuple of (new entries in append order, whether a segment was rewritten or removed)
+        """
+        with self._lock:
+            entries = []
+            rewritten = False
+            indices = self._segment_indices()
+            if self._read_inode is not None and self._read_index not in indices:
+                rewritten = True
+            for index in indices:
+                if index < self._read_index:
+                    continue
+                path = self._segment_path(index)
+                try:
+                    inode = os.stat(path).st_ino
+                except FileNotFoundError:
+                    rewritten = True
+                    continue
+
+                offset = 0
+                if index == self._read_index:
+                    if self._read_inode in (None, inode):
+                        offset = self._read_offset
+                    else:
+                        rewritten = True
+                lines, end = self._read_lines(path, offset)
+                for entry in lines:
+                    if entry["id"] > self.last_id:
+                        entries.append(entry)
+                        self.last_id = entry["id"]
+                self._read_index, self._read_offset, self._read_inode = index, end, inode
+
+            if self._read_index > self._segment_index:
+                # Another process rotated to a newer segment
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._segment_index = self._read_index
+            return entries, rewritten
+
+    def has_new(self):
+        """
+        Cheap check, without the lock, whether read_new() may find anything.
+
+        Compares the segment this process last read against its recorded
+        size and inode, and looks for a newer segment.
+        """
+        try:
+            stat = os.stat(self._segment_path(self._read_index))
+        except FileNotFoundError:
+            if self._read_inode is not None:
+                return True
+        else:
+            if stat.st_ino != self._read_inode or stat.st_size != self._read_offset:
+                return True
+        return os.path.exists(self._segment_path(self._read_index + 1))
+
+    def _read_lines(self, path, offset):
+        """Parse the complete lines of a segment from offset on; returns (entries, end offset)."""
+        entries = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    # Still being written
+                    break
+                try:
+                    entries.append(json.loads(raw_line))
+                except ValueError:
+                    logger.warning(f"Skipping corrupt log line in {path} at offset {offset}")
+                offset += len(raw_line)
+        return entries, offset
+
+    def _read_segment(self, path, repair=False):
+        """
+        Read one segment file.
+
+        A crash in the middle of an append can leave a partial last line. When
+        repair is set, the segment is truncated back to the end of the last
+        complete entry so that new appends start on a clean line.
+        """
+        entries = []
+        good_offset = 0
+        with open(path, "rb") as f:
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    # Torn write at the tail of the segment
+                    break
+                try:
+                    entries.append(json.loads(raw_line))
+                except ValueError:
+                    logger.warning(f"Skipping corrupt log line in {path} at offset {good_offset}")
+                good_offset += len(raw_line)
+
+        if repair and good_offset < os.path.getsize(path):
+            logger.warning(f"Truncating incomplete write at end of {path} (offset {good_offset})")
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+        return entries
+
+    def _migrate_legacy_file(self):
+        """One-shot migration from the old JSON array file into the first segment."""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+
+        if self._segment_indices():
+            # A previous migration wrote the segment but did not get to retire
+            # the legacy file before stopping.
+            logger.info(f"Segments already present, retiring legacy log file {self.legacy_file}")
+            os.replace(self.legacy_file, self.legacy_file + ".migrated")
+            return
+
+        try:
+            with open(self.legacy_file, "r") as f:
+                legacy_logs = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading legacy log file for migration: {str(e)}")
+            return
+
+        target = self._segment_path(1)
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in legacy_logs:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Publish the segment atomically before retiring the legacy file
+        os.replace(tmp_path, target)
+        os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        logger.info(f"Migrated {len(legacy_logs)} logs from {self.legacy_file} to {target}")
+
+    def _open_segment(self):
+        path = self._segment_path(self._segment_index)
+        if self._file is not None:
+            # Compaction in another process may have replaced or removed the segment
+            try:
+                current = os.stat(path).st_ino == os.fstat(self._file.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if not current:
+                self._file.close()
+                self._file = None
+        if self._file is None:
+            self._file = open(path, "a")
+
+    def _mark_written(self, entries):
+        """Record that this process has seen everything up to the end of its own write."""
+        self.last_id = max(self.last_id, entries[-1]["id"])
+        stat = os.fstat(self._file.fileno())
+        self._read_index, self._read_offset, self._read_inode = self._segment_index, stat.st_size, stat.st_ino
+
+    def _rotate_if_needed(self):
+        if self._file.tell() >= self.segment_max_bytes:
+            self._sync(force=True)
+            self._file.close()
+            self._segment_index += 1
+            self._file = open(self._segment_path(self._segment_index), "a")
+            logger.debug(f"Rotated log store to segment {self._segment_index}")
+
+    def _sync(self, force=False):
+        self._file.flush()
+        if self.fsync_policy == "never":
+            return
+
+        now = time.monotonic()
+        if force or self.fsync_policy == "always" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def append(self, entry):
+        """
+        Append a single log entry.
+
+        Args:
+            entry: JSON-serializable log entry
+        """
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """
+        Append several log entries with a single write and sync.
+
+        Call under locked(), after read_new(), when other processes share the directory.
+
+        Args:
+            entries: JSON-serializable log entries, in id order
+        """
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry, separators=(",", ":"), default=json_default) + "\n" for entry in entries)
+        with self._lock:
+            self._open_segment()
+            self._file.write(lines)
+            self._sync()
+            self._mark_written(entries)
+            self._rotate_if_needed()
+
+    def _summary_path(self):
+        return os.path.join(self.directory, SUMMARY_FILE)
+
+    def load_summaries(self):
+        """
+        Load the hourly summaries written by compaction.
+
+        Returns:
+            Tuple of (summary records, id of the last compacted entry); entries
+            up to that id are already counted in the summaries
+        """
+        path = self._summary_path()
+        with self._lock:
+            if not os.path.exists(path):
+                return [], 0
+            records = self._read_segment(path, repair=True)
+        summaries = [record for record in records if "hour" in record]
+        return summaries, max((record.get("through_id", 0) for record in records), default=0)
+
+    def append_summaries(self, summaries, through_id):
+        """
+        Durably append summary records covering every entry up to through_id.
+
+        Always fsynced: the entries they replace are deleted right afterwards.
+        """
+        records = [{**summary, "through_id": through_id} for summary in summaries] or [{"through_id": through_id}]
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self._lock:
+            with open(self._summary_path(), "a") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def write_summaries(self, summaries, through_id):
+        """Atomically replace all summary records (e.g. after dropping expired ones)."""
+        path = self._summary_path()
+        tmp_path = path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                # The watermark survives even when every summary has been dropped
+                f.write(json.dumps({"through_id": through_id}) + "\n")
+                for summary in summaries:
+                    f.write(json.dumps(summary, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+    def drop_through(self, last_id):
+        """
+        Remove every entry with an id up to last_id.
+
+        Entries are stored in id order, so this deletes the oldest segments
+        outright and rewrites at most one segment (through a temporary file
+        and an atomic rename) to drop the leading entries it shares with
+        newer ones. The newest segment is emptied rather than deleted, so
+        segment numbering never restarts under other processes.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            indices = self._segment_indices()
+            for index in indices:
+                path = self._segment_path(index)
+                kept_lines = []
+                count = 0
+                with open(path, "rb") as f:
+                    for raw_line in f:
+                        if not raw_line.endswith(b"\n"):
+                            break
+                        try:
+                            entry_id = json.loads(raw_line)["id"]
+                        except (ValueError, KeyError):
+                            continue
+                        if entry_id <= last_id:
+                            count += 1
+                        else:
+                            kept_lines.append(raw_line)
+                if not count:
+                    break
+
+                if index == self._segment_index and self._file is not None:
+                    # Reopened on the next append
+                    self._file.close()
+                    self._file = None
+                if kept_lines or index == indices[-1]:
+                    tmp_path = path + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.writelines(kept_lines)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, path)
+                else:
+                    os.remove(path)
+                if index == self._read_index:
+                    # Callers have read everything, so continue after the kept lines
+                    if os.path.exists(path):
+                        stat = os.stat(path)
+                        self._read_offset, self._read_inode = stat.st_size, stat.st_ino
+                    else:
+                        self._read_offset, self._read_inode = 0, None
+                removed += count
+                if kept_lines:
+                    break
+        return removed
+
+    def close(self):
+        """Flush and close the active segment."""
+        with self._lock:
+            if self._file is not None:
+                self._sync(force=True)
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
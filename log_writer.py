@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODES = ("sync", "background")
+
+# Wakes the writer thread up to stop
+_STOP = object()
+
+
+class BackgroundLogWriter:
+    def __init__(self, write_batch, max_queued=10000, batch_size=256, flush_interval=0.5):
+        """
+        Write-behind persistence of log entries on a background thread.
+
+        Entries are queued by the request thread and written in batches once
+        batch_size entries are waiting or flush_interval seconds have passed
+        since the first one arrived, so requests no longer wait for the disk
+        or database. The queue is bounded: when it is full, submit() blocks
+        until the writer catches up instead of dropping entries.
+
+        Args:
+            write_batch: Callable persisting a list of entries in order
+            max_queued: Entries that may wait before submit() blocks
+            batch_size: Most entries written by one write_batch call
+            flush_interval: Longest time (seconds) an entry waits before being written
+        """
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.entries_written = 0
+        self.batches_written = 0
+        self.entries_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="detection-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        """Queue an entry for writing (blocks while the queue is full)."""
+        if self._closed:
+            raise RuntimeError("Log writer is closed")
+        self._queue.put(entry)
+
+    def queue_depth(self):
+        """Number of entries waiting to be written."""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every entry submitted so far has been written."""
+        self._queue.join()
+
+    def close(self, timeout=10):
+        """Write everything still queued and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Log writer did not drain within {timeout}s; {self.queue_depth()} entries not written")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+                # Let the batch fill up until the size or time threshold
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if stopping:
+                # Drain whatever was queued before close()
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+                    else:
+                        self._queue.task_done()
+
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+
+    def _write(self, batch):
+        try:
+            self.write_batch(batch)
+            self.entries_written += len(batch)
+            self.batches_written += 1
+        except Exception as e:
+            self.entries_failed += len(batch)
+            logger.error(f"Error writing {len(batch)} log entries: {str(e)}")
+
+    def stats(self):
+        """Queue depth and write counters."""
+        return {
+            "queued": self.queue_depth(),
+            "entries_written": self.entries_written,
+            "batches_written": self.batches_written,
+            "entries_failed": self.entries_failed
+        }
@@ -1,44 +1,239 @@
-import json
-import os
+import atexit
 import logging
+import threading
 from datetime import datetime
-from collections import Counter, defaultdict
+
+from analytics import DetectionAggregates
+from detection_result import compact_detections
+from log_index import LogIndex, compact_log_entry, log_view, summarize_log
+from log_store import JsonlLogStore
+from log_writer import WRITE_MODES, BackgroundLogWriter
+from metrics import timed
+from retention import BackgroundCompactor, merge_summaries, summarize_entries
 
 logger = logging.getLogger(__name__)
 
 class DetectionLogger:
-    def __init__(self):
+    def __init__(self, log_dir="detection_logs", legacy_log_file="detection_logs.json",
+                 fsync_policy="interval", segment_max_bytes=4 * 1024 * 1024, write_mode="sync",
+                 batch_size=256, flush_interval=0.5, max_queued=10000, retention=None):
         """
         Initialize the detection logger.
+        
+        Args:
+            log_dir: Directory of the append-only log segments
+            legacy_log_file: Old single-file JSON log, migrated on first start
+            fsync_policy: When appends are fsynced ("always", "interval", "never")
+            segment_max_bytes: Size at which a new log segment is started
+            write_mode: "sync" persists each entry before returning; "background"
+                queues it for a writer thread that persists entries in batches
+                (entries get their id and become queryable once written)
+            batch_size: Most entries per background write
+            flush_interval: Longest time (seconds) an entry waits in the background queue
+            max_queued: Background queue size at which logging calls block
+            retention: Optional RetentionPolicy; expired entries are compacted
+                into hourly summaries by a background thread
         """
         self.logs = []
-        self.log_file = "detection_logs.json"
+        self.aggregates = DetectionAggregates()
+        self.index = LogIndex()
+        self._lock = threading.Lock()
+        self._append_lock = threading.Lock()
+        self.store = JsonlLogStore(
+            directory=log_dir,
+            legacy_file=legacy_log_file,
+            segment_max_bytes=segment_max_bytes,
+            fsync_policy=fsync_policy
+        )
         
         # Load existing logs if available
-        self._load_logs()
+        with self.store.locked():
+            self._load_logs()
+        self.writer = self._start_writer(write_mode, batch_size, flush_interval, max_queued)
+        self.retention = retention
+        self.compactor = self._start_compactor(retention)
+    
+    def _start_writer(self, write_mode, batch_size, flush_interval, max_queued):
+        """Start the write-behind thread for the "background" write mode (None for "sync")."""
+        if write_mode not in WRITE_MODES:
+            raise ValueError(f"Unknown log write mode: {write_mode}")
+        if write_mode == "sync":
+            return None
+        writer = BackgroundLogWriter(self._write_batch, max_queued=max_queued,
+                                     batch_size=batch_size, flush_interval=flush_interval)
+        # Drain queued entries on interpreter (and gunicorn worker) exit
+        atexit.register(self.close)
+        return writer
+    
+    def _start_compactor(self, retention):
+        """Start background compaction if the retention policy expires raw entries."""
+        if retention is None or not retention.enabled:
+            return None
+        return BackgroundCompactor(self.compact, retention.interval)
     
     def _load_logs(self):
-        """Load existing logs from file if it exists."""
+        """Load existing logs from the log store, recovering from torn writes (call under store.locked())."""
+        summaries, through_id, logs = [], 0, []
         try:
-            if os.path.exists(self.log_file):
-                with open(self.log_file, 'r') as f:
-                    self.logs = json.load(f)
-                logger.info(f"Loaded {len(self.logs)} logs from file.")
-            else:
-                logger.info("No existing log file found. Starting with empty logs.")
+            summaries, through_id = self.store.load_summaries()
+            stored = self.store.load()
+            # Held as compact entries: detection arrays, no duplicated class list
+            logs = [compact_log_entry(log_entry) for log_entry in stored if log_entry["id"] > through_id]
+            if len(logs) < len(stored):
+                # Finish a compaction interrupted between writing summaries and trimming the store
+                self.store.drop_through(through_id)
+            logger.info(f"Loaded {len(logs)} logs and {len(summaries)} hourly summaries from {self.store.directory}.")
         except Exception as e:
             logger.error(f"Error loading logs: {str(e)}")
             # Start with empty logs if there's an error
-            self.logs = []
+            logs = []
+        # Ids continue after compacted entries even when none are left in the store
+        self.store.last_id = max(self.store.last_id, through_id)
+        
+        # Rebuild running analysis aggregates and query indexes once at load
+        with self._lock:
+            self.logs = logs
+            self.aggregates.rebuild(logs, summaries)
+            self.index.rebuild(logs)
     
-    def _save_logs(self):
-        """Save logs to file."""
-        try:
-            with open(self.log_file, 'w') as f:
-                json.dump(self.logs, f, indent=2)
-            logger.debug(f"Saved {len(self.logs)} logs to file.")
-        except Exception as e:
-            logger.error(f"Error saving logs: {str(e)}")
+    def _catch_up(self):
+        """Add the entries other processes appended to the store (call under store.locked())."""
+        seen = self.store.last_id
+        entries, rewritten = self.store.read_new()
+        if rewritten and self.store.load_summaries()[1] > seen:
+            # Another process compacted entries this one never saw; start over from the store
+            logger.info("Detection log compacted by another process, reloading")
+            self._load_logs()
+            return
+        if entries:
+            self._add([compact_log_entry(log_entry) for log_entry in entries])
+    
+    def _refresh(self):
+        """Pick up entries other processes wrote since this one last read the store."""
+        if self.store.has_new():
+            with self.store.locked():
+                self._catch_up()
+    
+    def _add(self, log_entries):
+        """Add persisted log entries to the in-memory list, aggregates and indexes."""
+        with timed("log_index"), self._lock:
+            for log_entry in log_entries:
+                self.logs.append(log_entry)
+                self.aggregates.add(log_entry)
+                self.index.add(log_entry)
+    
+    def _write_batch(self, log_entries):
+        """
+        Assign ids to log entries, persist them with one write and add them to memory.
+        
+        Runs under the store's inter-process lock after catching up with other
+        processes, so ids are unique and ids and timestamps keep increasing
+        across every process sharing the log directory.
+        """
+        with self.store.locked():
+            self._catch_up()
+            next_id = self.store.last_id + 1
+            last_timestamp = self.logs[-1]["timestamp"] if self.logs else ""
+            for log_entry in log_entries:
+                log_entry["id"] = next_id
+                next_id += 1
+                # Another process may have written a later timestamp meanwhile
+                log_entry["timestamp"] = max(log_entry["timestamp"], last_timestamp)
+                last_timestamp = log_entry["timestamp"]
+            
+            with timed("log_write"):
+                self.store.append_many([log_view(log_entry) for log_entry in log_entries])
+            self._add(log_entries)
+    
+    def _append(self, log_entry):
+        """Persist a new log entry (or queue it for the writer)."""
+        self._append_many([log_entry])
+    
+    def _stamp(self, log_entries):
+        """Set the timestamp of new log entries (callers hold the append lock)."""
+        timestamp = datetime.now().isoformat()
+        for log_entry in log_entries:
+            log_entry["timestamp"] = timestamp
+    
+    def _append_many(self, log_entries):
+        """Persist new log entries together (or queue them for the writer)."""
+        with self._append_lock:
+            # Stamped under the lock: the indexes and compaction rely on timestamps never decreasing
+            self._stamp(log_entries)
+            if self.writer is not None:
+                # Queued under the lock so entries reach the store in timestamp order
+                for log_entry in log_entries:
+                    self.writer.submit(log_entry)
+                return
+            
+            try:
+                self._write_batch(log_entries)
+            except Exception as e:
+                logger.error(f"Error saving logs: {str(e)}")
+    
+    def flush(self):
+        """Block until every logged entry has been persisted."""
+        if self.writer is not None:
+            self.writer.flush()
+    
+    def compact(self, now=None):
+        """
+        Apply the retention policy once.
+        
+        Entries older than the raw retention period are folded into hourly
+        summaries, which are made durable before the entries are deleted from
+        the store, then dropped from memory and the indexes. The analysis
+        aggregates already count them and stay unchanged. Summaries past
+        their own retention period are dropped along with their counts.
+        
+        Args:
+            now: Reference time (defaults to datetime.now())
+        
+        Returns:
+            Dictionary with "events_compacted" and "summaries_dropped" counts
+        """
+        result = {"events_compacted": 0, "summaries_dropped": 0}
+        
+        cutoff = self.retention.raw_cutoff(now)
+        if cutoff is not None:
+            # Holding the store lock keeps other writers (and processes) out meanwhile
+            with self.store.locked():
+                self._catch_up()
+                with self._lock:
+                    count = self.index.count_before(cutoff)
+                    expired = self.logs[:count]
+                if expired:
+                    # Another process sharing the store may have summarized some already
+                    _, compacted_through = self.store.load_summaries()
+                    fresh = [log_entry for log_entry in expired if log_entry["id"] > compacted_through]
+                    with timed("log_compact"):
+                        if fresh:
+                            self.store.append_summaries(summarize_entries(fresh), fresh[-1]["id"])
+                        self.store.drop_through(expired[-1]["id"])
+                    with self._lock:
+                        self.logs = self.logs[count:]
+                        self.index.drop_head(count)
+                    result["events_compacted"] = len(fresh)
+        
+        hour_cutoff = self.retention.summary_cutoff(now)
+        if hour_cutoff is not None:
+            with self.store.locked():
+                summaries, through_id = self.store.load_summaries()
+                kept = [summary for summary in summaries if summary["hour"] >= hour_cutoff]
+                if len(kept) < len(summaries):
+                    self.store.write_summaries(merge_summaries(kept), through_id)
+                    result["summaries_dropped"] = len(summaries) - len(kept)
+            self.aggregates.drop_before(hour_cutoff)
+        
+        return result
+    
+    def close(self):
+        """Persist queued entries and close the log store."""
+        if self.compactor is not None:
+            self.compactor.stop()
+        if self.writer is not None:
+            self.writer.close()
+        self.store.close()
     
     def log_detection(self, source_type, source_name, detections, process_time=0):
         """
@@ -51,26 +246,47 @@ class DetectionLogger:
             process_time: Time taken to process the detection (seconds)
         """
         # Create detection log entry
-        log_entry = {
-            "id": len(self.logs) + 1,
-            "timestamp": datetime.now().isoformat(),
-            "source_type": source_type,
-            "source_name": source_name,
-            "detections": detections,
-            "detection_count": len(detections),
-            "process_time": process_time,
-            "detected_classes": [det["class"] for det in detections]
-        }
+        log_entry = self._detection_entry(source_type, source_name, detections, process_time)
         
         # Add log entry
-        self.logs.append(log_entry)
-        
-        # Save logs to file
-        self._save_logs()
+        self._append(log_entry)
         
         logger.debug(f"Logged detection: {source_type} - {len(detections)} objects")
         return log_entry
     
+    def log_detections_bulk(self, source_type, records):
+        """
+        Log many detection events with a single store write.
+        
+        Args:
+            source_type: Type of source (image, webcam)
+            records: Iterable of (source_name, detections, process_time) tuples
+            
+        Returns:
+            List of the new log entries
+        """
+        log_entries = [
+            self._detection_entry(source_type, source_name, detections, process_time)
+            for source_name, detections, process_time in records
+        ]
+        if log_entries:
+            self._append_many(log_entries)
+        
+        logger.debug(f"Logged {len(log_entries)} {source_type} detections in bulk")
+        return log_entries
+    
+    def _detection_entry(self, source_type, source_name, detections, process_time):
+        """Compact log entry; detected_classes is derived from the detections when needed."""
+        return {
+            "id": None,
+            "timestamp": None,
+            "source_type": source_type,
+            "source_name": source_name,
+            "detections": compact_detections(detections),
+            "detection_count": len(detections),
+            "process_time": process_time
+        }
+    
     def log_video_detection(self, source_type, source_name, frame_detections):
         """
         Log a video detection event.
@@ -81,34 +297,29 @@ class DetectionLogger:
             frame_detections: List of detection results per frame
         """
         # Count total detections across all frames
-        all_detections = []
-        for frame in frame_detections:
-            all_detections.extend(frame["detections"])
+        total_detections = sum(len(frame["detections"]) for frame in frame_detections)
         
         # Create detection log entry
-        log_entry = {
-            "id": len(self.logs) + 1,
-            "timestamp": datetime.now().isoformat(),
+        log_entry = compact_log_entry({
+            "id": None,
+            "timestamp": None,
             "source_type": source_type,
             "source_name": source_name,
             "frame_count": len(frame_detections),
-            "total_detections": len(all_detections),
-            "detected_classes": [det["class"] for det in all_detections],
+            "total_detections": total_detections,
             "frame_detections": frame_detections
-        }
+        })
         
         # Add log entry
-        self.logs.append(log_entry)
-        
-        # Save logs to file
-        self._save_logs()
+        self._append(log_entry)
         
-        logger.debug(f"Logged video detection: {source_name} - {len(all_detections)} objects in {len(frame_detections)} frames")
+        logger.debug(f"Logged video detection: {source_name} - {total_detections} objects in {len(frame_detections)} frames")
         return log_entry
     
     def get_all_logs(self):
         """Get all detection logs."""
-        return self.logs
+        self._refresh()
+        return [log_view(log_entry) for log_entry in self.logs]
     
     def get_logs_by_source_type(self, source_type):
         """
@@ -120,45 +331,80 @@ class DetectionLogger:
         Returns:
             List of logs matching the source type
         """
-        return [log for log in self.logs if log["source_type"] == source_type]
+        self._refresh()
+        # Positions shift when compaction drops old entries; resolve them under the lock
+        with self._lock:
+            page = [self.logs[position] for position in self.index.by_source.get(source_type, [])]
+        return [log_view(log_entry) for log_entry in page]
     
-    def get_analysis_data(self):
+    def get_log(self, log_id):
         """
-        Generate analysis data from logs.
+        Get a single log entry by id.
         
         Returns:
-            Dictionary containing various analysis metrics
+            The full log entry, or None if it doesn't exist
         """
-        if not self.logs:
-            return {
-                "total_detections": 0,
-                "detection_by_source": {},
-                "detection_by_class": {},
-                "detection_over_time": {}
-            }
-        
-        # Count total detections
-        total_detections = sum(log.get("detection_count", log.get("total_detections", 0)) for log in self.logs)
-        
-        # Count detections by source type
-        detection_by_source = defaultdict(int)
-        for log in self.logs:
-            detection_by_source[log["source_type"]] += log.get("detection_count", log.get("total_detections", 0))
-        
-        # Count detections by class
-        detection_by_class = Counter()
-        for log in self.logs:
-            detection_by_class.update(log.get("detected_classes", []))
-        
-        # Group detections by day
-        detection_over_time = defaultdict(int)
-        for log in self.logs:
-            date = log["timestamp"].split("T")[0]  # Get date part only
-            detection_over_time[date] += log.get("detection_count", log.get("total_detections", 0))
+        self._refresh()
+        with self._lock:
+            position = self.index.position_of(log_id)
+            log_entry = self.logs[position] if position is not None else None
+        return log_view(log_entry) if log_entry is not None else None
+    
+    def count(self):
+        """Get the total number of log entries."""
+        self._refresh()
+        return len(self.logs)
+    
+    def get_source_types(self):
+        """Get the source types that have log entries."""
+        self._refresh()
+        return self.index.source_types()
+    
+    def query_logs(self, source_type=None, detected_class=None, since=None, until=None,
+                   min_confidence=None, cursor=None, limit=50, summary=True):
+        """
+        Get one page of logs, newest first, using the secondary indexes.
         
-        return {
-            "total_detections": total_detections,
-            "detection_by_source": dict(detection_by_source),
-            "detection_by_class": dict(detection_by_class),
-            "detection_over_time": dict(detection_over_time)
-        }
+        Args:
+            source_type: Only logs from this source type
+            detected_class: Only logs containing this object class
+            since: Only logs at or after this ISO timestamp
+            until: Only logs at or before this ISO timestamp
+            min_confidence: Only logs with a detection at or above this confidence
+            cursor: next_cursor value returned with the previous page
+            limit: Maximum number of logs per page
+            summary: Return summary projections without per-detection payloads
+            
+        Returns:
+            Tuple of (logs, next_cursor); next_cursor is None on the last page
+        """
+        self._refresh()
+        with self._lock:
+            positions, next_cursor = self.index.query(
+                source_type=source_type,
+                detected_class=detected_class,
+                since=since,
+                until=until,
+                min_confidence=min_confidence,
+                cursor=cursor,
+                limit=limit
+            )
+            page = [self.logs[position] for position in positions]
+        if summary:
+            page = [summarize_log(log_entry) for log_entry in page]
+        else:
+            page = [log_view(log_entry) for log_entry in page]
+        return page, next_cursor
+    
+    def get_analysis_data(self, window=None):
+        """
+        Get analysis data from the running aggregates.
+        
+        Args:
+            window: Optional time window ("hour", "day" or "week"); None for all time
+        
+        Returns:
+            Dictionary containing various analysis metrics
+        """
+        self._refresh()
+        return self.aggregates.snapshot(window)
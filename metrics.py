@@ -0,0 +1,212 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Stage timings are recorded with `timed(stage)`:
+
+    with timed("decode"):
+        img = cv2.imdecode(...)
+
+When metrics are disabled, timed() hands back a shared no-op context
+manager, so instrumented hot paths cost one attribute check.
+
+Each process keeps its own registry; under gunicorn every worker serves
+its own /metrics.
+"""
+import bisect
+import contextlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans sub-millisecond stages up to slow video requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Cumulative histogram of observed values, one series per label combination.
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the exposition
+            labelnames: Label names; observe() takes values in the same order
+            buckets: Upper bounds of the buckets (+Inf is added)
+        """
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: {**data, "counts": list(data["counts"])} for labels, data in self._series.items()}
+        for labels, data in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data["counts"]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {data['sum']!r}")
+            lines.append(f"{self.name}_count{label_text} {data['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        """Monotonically increasing count, one series per label combination."""
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class CallbackMetric:
+    def __init__(self, name, help_text, callback, metric_type="gauge", labelnames=()):
+        """
+        Metric read from existing state at scrape time (queue depths, cache counters).
+
+        Args:
+            callback: Returns a number, or a dict of label value tuples to numbers
+            metric_type: "gauge" or "counter"
+        """
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {str(e)}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "stage", "start")
+
+    def __init__(self, histogram, stage):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.stage)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        """
+        Collection of metrics rendered together on /metrics.
+
+        Args:
+            enabled: Record anything at all; when False, timed() and observe calls are no-ops
+        """
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.stage_seconds = self.histogram(
+            "detection_stage_seconds", "Time spent in each processing stage", ("stage",))
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def callback(self, name, help_text, callback, metric_type="gauge", labelnames=()):
+        """Register a metric computed at scrape time (replaces one of the same name)."""
+        metric = CallbackMetric(name, help_text, callback, metric_type, labelnames)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def timed(self, stage):
+        """Context manager recording the duration of a stage (a no-op when disabled)."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self.stage_seconds, stage)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by app.py, detector.py and logger.py
+REGISTRY = MetricsRegistry()
+
+
+def timed(stage):
+    """Time a stage in the process-wide registry."""
+    return REGISTRY.timed(stage)
@@ -0,0 +1,142 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MotionGate:
+    def __init__(self, pixel_threshold=25, min_changed_ratio=0.005, downscale_width=64,
+                 max_skipped=30, max_sources=256):
+        """
+        Skip inference on frames that haven't changed since the last detector run.
+
+        Each source keeps a small blurred grayscale copy of the last frame the
+        detector actually ran on. A new frame is compared against it by
+        downscaled frame differencing; if too few pixels changed, the
+        previous detections are reused instead of running the detector.
+        Comparing against the last detected frame (rather than the previous
+        frame) means slow drift still adds up and eventually triggers a run.
+
+        Args:
+            pixel_threshold: Grey-level difference (0-255) at which a pixel counts as changed
+            min_changed_ratio: Fraction of changed pixels at which a frame counts as moving
+            downscale_width: Width frames are shrunk to before differencing
+            max_skipped: Consecutive skipped frames after which the detector runs anyway (0 = no limit)
+            max_sources: Sources kept before the least recently used one is forgotten
+        """
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.downscale_width = downscale_width
+        self.max_skipped = max_skipped
+        self.max_sources = max_sources
+
+        self._lock = threading.Lock()
+        self._sources = OrderedDict()
+        self.frames_checked = 0
+        self.inferences_skipped = 0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.downscale_width, max(1, round(height * self.downscale_width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def _source_state(self, source):
+        """Get or create a source's state (lock held)."""
+        state = self._sources.get(source)
+        if state is None:
+            state = {"reference": None, "detections": None, "skipped": 0,
+                     "frames_checked": 0, "inferences_skipped": 0}
+            self._sources[source] = state
+        self._sources.move_to_end(source)
+        while len(self._sources) > self.max_sources:
+            self._sources.popitem(last=False)
+        return state
+
+    def _changed(self, reference, thumbnail):
+        if reference is None or reference.shape != thumbnail.shape:
+            return True
+        changed = np.count_nonzero(cv2.absdiff(reference, thumbnail) > self.pixel_threshold)
+        return changed >= self.min_changed_ratio * thumbnail.size
+
+    def check(self, source, frame, need_detections=False):
+        """
+        Decide whether a frame needs the detector.
+
+        A frame that needs it becomes the source's new reference frame.
+
+        Args:
+            source: Stream/source name
+            frame: BGR image
+            need_detections: Only count the frame as static if detections are stored to reuse
+
+        Returns:
+            True if the frame is static and the previous detections can be reused
+        """
+        thumbnail = self._thumbnail(frame)
+        with self._lock:
+            state = self._source_state(source)
+            state["frames_checked"] += 1
+            self.frames_checked += 1
+
+            static = (not self._changed(state["reference"], thumbnail)
+                      and not (self.max_skipped and state["skipped"] >= self.max_skipped)
+                      and not (need_detections and state["detections"] is None))
+            if static:
+                state["skipped"] += 1
+                state["inferences_skipped"] += 1
+                self.inferences_skipped += 1
+            else:
+                state["reference"] = thumbnail
+                state["skipped"] = 0
+            return static
+
+    def detect(self, source, frame, detect):
+        """
+        Run detect(frame) unless the frame is static for this source.
+
+        Args:
+            source: Stream/source name
+            frame: BGR image
+            detect: Callable running the detector on a frame
+
+        Returns:
+            Tuple of (detections, whether inference was skipped)
+        """
+        if self.check(source, frame, need_detections=True):
+            with self._lock:
+                state = self._sources.get(source)
+                if state is not None and state["detections"] is not None:
+                    return state["detections"], True
+
+        detections = detect(frame)
+        with self._lock:
+            self._source_state(source)["detections"] = detections
+        return detections, False
+
+    def reset(self, source):
+        """Forget a source's reference frame and detections."""
+        with self._lock:
+            self._sources.pop(source, None)
+
+    def stats(self):
+        """Checked/skipped counters, overall and per source."""
+        with self._lock:
+            return {
+                "frames_checked": self.frames_checked,
+                "inferences_skipped": self.inferences_skipped,
+                "skip_rate": round(self.inferences_skipped / self.frames_checked, 4) if self.frames_checked else 0.0,
+                "sources": {
+                    str(source): {
+                        "frames_checked": state["frames_checked"],
+                        "inferences_skipped": state["inferences_skipped"]
+                    }
+                    for source, state in self._sources.items()
+                }
+            }
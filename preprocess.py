@@ -0,0 +1,243 @@
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from detection_result import DetectionResult
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Decode-time downscaling factors libjpeg supports, largest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC)
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """
+    Read a JPEG's dimensions from its frame header without decoding it.
+
+    Returns:
+        (width, height) as stored in the file (before EXIF rotation), or None
+        if data isn't a JPEG
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length field
+            offset += 2
+            continue
+        if marker in _SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height = int.from_bytes(data[offset + 5:offset + 7], "big")
+            width = int.from_bytes(data[offset + 7:offset + 9], "big")
+            return width, height
+        offset += 2 + int.from_bytes(data[offset + 2:offset + 4], "big")
+    return None
+
+
+def reduction_factor(size, target_size, min_width=0):
+    """
+    Largest power-of-two downscale that keeps an image at least as large as needed.
+
+    The short side is compared against both target dimensions so the check
+    holds whichever way EXIF orientation turns the image.
+
+    Args:
+        size: (width, height) of the full image
+        target_size: (width, height) the image is resized to for the model
+        min_width: Smallest acceptable decoded width (e.g. an annotated image's width)
+
+    Returns:
+        8, 4, 2, or 1 for no downscaling
+    """
+    short_side = min(size)
+    needed = max(*target_size, min_width)
+    for factor, _ in REDUCED_DECODE_FLAGS:
+        # libjpeg rounds scaled dimensions up
+        if -(-short_side // factor) >= needed:
+            return factor
+    return 1
+
+
+def scale_detections(detections, scale):
+    """
+    Detections with their boxes multiplied by scale.
+
+    Args:
+        detections: DetectionResult or list of detection dictionaries
+            (other keys, such as track ids, are kept)
+        scale: Box scale factor
+
+    Returns:
+        Scaled copy of the same type
+    """
+    if scale == 1:
+        return detections
+    if isinstance(detections, DetectionResult):
+        return detections.scaled(scale)
+    return [
+        {**det, "bbox": [int(round(v * scale)) for v in det["bbox"]]}
+        for det in detections
+    ]
+
+
+class DecodedImage:
+    __slots__ = ("image", "scale", "original_size")
+
+    def __init__(self, image, scale=1, original_size=None):
+        """
+        An image that may have been decoded below its full resolution.
+
+        Args:
+            image: Decoded BGR array
+            scale: Original size divided by decoded size (1 for a full decode)
+            original_size: (width, height) of the full image, after EXIF rotation
+        """
+        self.image = image
+        self.scale = scale
+        self.original_size = original_size or (image.shape[1], image.shape[0])
+
+    def to_original(self, detections):
+        """Map detections made on the decoded image to original image coordinates."""
+        return scale_detections(detections, self.scale)
+
+
+class ImageDecoder:
+    def __init__(self, target_size=None, reduced=True):
+        """
+        Decode uploaded images at the smallest resolution the model still needs.
+
+        The network only sees target_size pixels, so a 4000x3000 photo
+        decoded in full is mostly thrown away again by the blob resize. JPEGs
+        whose frame header shows they are at least twice the input size are
+        decoded with IMREAD_REDUCED_COLOR_2/4/8 instead: libjpeg scales the
+        DCT blocks while decoding, which takes a fraction of the time and
+        memory of a full decode. Other formats are decoded in full, since
+        OpenCV would only resize them after a full decode anyway.
+
+        Args:
+            target_size: (width, height) network input size; None always decodes in full
+            reduced: Use reduced decoding for large JPEGs
+        """
+        self.target_size = tuple(target_size) if target_size else None
+        self.reduced = reduced and self.target_size is not None
+
+        self._lock = threading.Lock()
+        self.decoded = 0
+        self.reduced_decodes = 0
+
+    def signature(self):
+        """String that changes whenever decoding settings (and so detection inputs) change."""
+        return f"reduced={self.target_size}" if self.reduced else "full"
+
+    def decode(self, data, min_width=0, full_resolution=False):
+        """
+        Decode encoded image bytes.
+
+        Args:
+            data: Encoded image bytes
+            min_width: Smallest acceptable decoded width, on top of the model input size
+            full_resolution: Always decode in full (e.g. for tiled detection)
+
+        Returns:
+            DecodedImage, or None if the bytes aren't a readable image
+        """
+        with timed("decode"):
+            size = jpeg_size(data) if self.reduced and not full_resolution else None
+            factor = reduction_factor(size, self.target_size, min_width) if size else 1
+            flags = dict(REDUCED_DECODE_FLAGS).get(factor, cv2.IMREAD_COLOR)
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+        if image is None:
+            return None
+
+        with self._lock:
+            self.decoded += 1
+            if factor > 1:
+                self.reduced_decodes += 1
+        if factor == 1:
+            return DecodedImage(image)
+
+        width, height = size
+        if (image.shape[1] > image.shape[0]) != (width > height):
+            # EXIF orientation rotated the image by 90 degrees
+            width, height = height, width
+        return DecodedImage(image, factor, (width, height))
+
+    def stats(self):
+        """Decode counters."""
+        with self._lock:
+            return {"decoded": self.decoded, "reduced_decodes": self.reduced_decodes}
+
+
+class BlobBuilder:
+    def __init__(self, size, scalefactor=1.0, mean=(0.0, 0.0, 0.0), swap_rb=False):
+        """
+        Build NCHW network input blobs in reused buffers.
+
+        Produces the same values as cv2.dnn.blobFromImages(images, scalefactor,
+        size, mean, swap_rb, crop=False), but each image is resized straight
+        into a preallocated buffer and converted into a preallocated blob
+        instead of allocating fresh arrays per call. Buffers are per thread,
+        since worker threads prepare batches concurrently.
+
+        Args:
+            size: (width, height) network input size
+            scalefactor: Multiplier applied after mean subtraction
+            mean: Per-channel mean, in output channel order (RGB when swap_rb is set)
+            swap_rb: Swap the blue and red channels
+        """
+        self.size = tuple(size)
+        self.scalefactor = np.float32(scalefactor)
+        # Subtracted before the channel swap, so reorder to the image's BGR order
+        mean = np.asarray(mean, dtype=np.float32)
+        self.mean = mean[::-1].copy() if swap_rb else mean
+        self.swap_rb = swap_rb
+        self._local = threading.local()
+
+    def _buffers(self, count):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or len(buffers[0]) < count:
+            width, height = self.size
+            buffers = (
+                np.empty((count, 3, height, width), dtype=np.float32),
+                np.empty((height, width, 3), dtype=np.uint8),
+                np.empty((height, width, 3), dtype=np.float32)
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def build(self, images):
+        """
+        Fill the calling thread's blob from BGR images of any size.
+
+        The returned array is overwritten by this thread's next build() call.
+
+        Returns:
+            float32 [N, 3, height, width] blob
+        """
+        blob, resized, pixels = self._buffers(len(images))
+        for index, image in enumerate(images):
+            cv2.resize(image, self.size, dst=resized)
+            np.subtract(resized, self.mean, out=pixels)
+            np.multiply(pixels, self.scalefactor, out=pixels)
+            channels = pixels.transpose(2, 0, 1)
+            blob[index] = channels[::-1] if self.swap_rb else channels
+        return blob[:len(images)]
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from detection_result import json_default
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionResultCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_entries=4096):
+        """
+        Initialize a bounded LRU cache of detection results keyed by image content.
+
+        Entries hold the detections for an image plus any annotated renderings
+        produced for it. The in-memory tier is bounded by entry count and
+        approximate size; an optional on-disk tier keeps results across
+        restarts and gunicorn workers.
+
+        Args:
+            max_entries: Maximum entries in memory
+            max_bytes: Approximate maximum memory used by cached payloads
+            disk_dir: Directory for the on-disk tier (None disables it)
+            disk_max_entries: Maximum entries kept on disk
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._signature = None
+        self._disk_entries = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_entries = len(self._disk_names())
+
+    @staticmethod
+    def make_key(img_bytes, signature):
+        """
+        Build a cache key from the uploaded bytes and the detector configuration.
+
+        Args:
+            img_bytes: Raw uploaded image bytes
+            signature: Detector configuration signature (backend, model, thresholds)
+        """
+        digest = hashlib.sha256(img_bytes)
+        digest.update(signature.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def render_key(jpeg_quality, max_width):
+        return f"q{jpeg_quality}-w{max_width}"
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(json.dumps(entry["detections"], default=json_default)) + sum(len(image) for image in entry["images"].values())
+
+    def check_signature(self, signature):
+        """
+        Drop every cached result if the detector configuration has changed.
+
+        Args:
+            signature: Current detector configuration signature
+        """
+        with self._lock:
+            if self._signature == signature:
+                return
+            changed = self._signature is not None
+            self._signature = signature
+            if not changed:
+                return
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+        logger.info("Detector configuration changed, invalidating result cache")
+        self._clear_disk()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            Dictionary with "detections" and "images" (render key -> data URL), or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+            return entry
+
+    def put(self, key, detections, render_key=None, image=None):
+        """
+        Store detections for an image, optionally with one annotated rendering.
+
+        Args:
+            key: Cache key from make_key
+            detections: Detection list for the image
+            render_key: Render options the annotated image was produced with
+            image: Annotated image data URL
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            new = entry is None
+            if new:
+                entry = {"detections": detections, "images": {}}
+            else:
+                self._bytes -= self._entry_size(entry)
+            if render_key is not None and image is not None:
+                entry["images"][render_key] = image
+            self._store(key, entry)
+            # Serialized under the lock: another put may add a rendering to the same entry
+            payload = json.dumps(entry, default=json_default) if self.disk_dir else None
+            if new:
+                self._disk_entries += 1
+            trim = self._disk_entries > self.disk_max_entries
+
+        self._write_disk(key, payload)
+        if trim:
+            self._trim_disk()
+
+    def _store(self, key, entry):
+        """Insert into the memory tier and evict least recently used entries (lock held)."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._bytes += self._entry_size(entry)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, payload):
+        if not self.disk_dir:
+            return
+        try:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing result cache entry: {str(e)}")
+
+    def _disk_names(self):
+        return [name for name in os.listdir(self.disk_dir) if name.endswith(".json")]
+
+    def _trim_disk(self):
+        """
+        Remove the oldest on-disk entries once the tracked count passes the limit.
+
+        The count is kept incrementally by put (other workers' writes are
+        picked up here), and the directory is trimmed to 90% of the limit so
+        the listing and stats are paid once per many writes, not on every put.
+        """
+        try:
+            names = self._disk_names()
+            keep = self.disk_max_entries - self.disk_max_entries // 10
+            removed = 0
+            if len(names) > self.disk_max_entries:
+                paths = sorted((os.path.join(self.disk_dir, name) for name in names), key=os.path.getmtime)
+                for path in paths[:len(paths) - keep]:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        except OSError as e:
+            logger.error(f"Error trimming result cache: {str(e)}")
+            return
+        with self._lock:
+            self._disk_entries = len(names) - removed
+
+    def _clear_disk(self):
+        if not self.disk_dir:
+            return
+        with self._lock:
+            self._disk_entries = 0
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.disk_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from analytics import entry_detection_count
+from log_index import entry_labels
+
+logger = logging.getLogger(__name__)
+
+# Length of an hour key ("YYYY-MM-DDTHH") cut from an ISO timestamp
+HOUR_KEY_LENGTH = 13
+
+
+class RetentionPolicy:
+    def __init__(self, raw_days=0, summary_days=0, interval=3600):
+        """
+        How long the detection history is kept, and at what resolution.
+
+        Raw events (with their detections and per-frame video payloads) are
+        kept for raw_days, then compacted into one summary record per hour
+        and source type holding event, detection and per-class counts. The
+        summaries keep feeding analysis, so its numbers don't change when raw
+        events expire. Summaries themselves can be dropped after summary_days.
+
+        Args:
+            raw_days: Days raw events are kept (0 keeps them forever)
+            summary_days: Days hourly summaries are kept (0 keeps them forever);
+                must not be shorter than raw_days
+            interval: Seconds between background compaction runs
+
+        Raises:
+            ValueError: If the periods are inconsistent
+        """
+        if raw_days < 0 or summary_days < 0 or interval <= 0:
+            raise ValueError("Retention periods must not be negative and the interval must be positive")
+        if summary_days and (not raw_days or summary_days < raw_days):
+            raise ValueError("Summary retention requires raw retention and must be at least as long")
+
+        self.raw_days = raw_days
+        self.summary_days = summary_days
+        self.interval = interval
+
+    @property
+    def enabled(self):
+        return bool(self.raw_days)
+
+    def raw_cutoff(self, now=None):
+        """ISO timestamp (on a whole hour) before which raw events are compacted, or None."""
+        if not self.raw_days:
+            return None
+        cutoff = (now or datetime.now()) - timedelta(days=self.raw_days)
+        return cutoff.replace(minute=0, second=0, microsecond=0).isoformat()
+
+    def summary_cutoff(self, now=None):
+        """Hour key before which summaries are dropped, or None."""
+        if not self.summary_days:
+            return None
+        return ((now or datetime.now()) - timedelta(days=self.summary_days)).strftime("%Y-%m-%dT%H")
+
+
+class HourlySummaries:
+    def __init__(self):
+        """Accumulate events into hourly summary records, one per hour and source type."""
+        self._summaries = {}
+
+    def add(self, timestamp, source_type, detection_count, labels):
+        """
+        Count one event.
+
+        Args:
+            timestamp: Event ISO timestamp
+            source_type: Event source type
+            detection_count: Objects detected by the event
+            labels: Class name of each detection
+        """
+        key = (timestamp[:HOUR_KEY_LENGTH], source_type)
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = {
+                "hour": key[0],
+                "source_type": source_type,
+                "events": 0,
+                "total_detections": 0,
+                "detection_by_class": Counter()
+            }
+            self._summaries[key] = summary
+        summary["events"] += 1
+        summary["total_detections"] += detection_count
+        summary["detection_by_class"].update(labels)
+
+    def add_summary(self, summary):
+        """Merge an existing summary record."""
+        key = (summary["hour"], summary["source_type"])
+        existing = self._summaries.get(key)
+        if existing is None:
+            self._summaries[key] = {**summary, "detection_by_class": Counter(summary["detection_by_class"])}
+            self._summaries[key].pop("through_id", None)
+            return
+        existing["events"] += summary["events"]
+        existing["total_detections"] += summary["total_detections"]
+        existing["detection_by_class"].update(summary["detection_by_class"])
+
+    def records(self):
+        """Summary records in hour order."""
+        return [
+            {**summary, "detection_by_class": dict(summary["detection_by_class"])}
+            for _, summary in sorted(self._summaries.items())
+        ]
+
+
+def summarize_entries(log_entries):
+    """Fold log entries into hourly summary records."""
+    summaries = HourlySummaries()
+    for log_entry in log_entries:
+        summaries.add(log_entry["timestamp"], log_entry["source_type"],
+                      entry_detection_count(log_entry), entry_labels(log_entry))
+    return summaries.records()
+
+
+def merge_summaries(records):
+    """Combine summary records covering the same hour and source type."""
+    summaries = HourlySummaries()
+    for summary in records:
+        summaries.add_summary(summary)
+    return summaries.records()
+
+
+class BackgroundCompactor:
+    def __init__(self, compact, interval):
+        """
+        Run log compaction periodically on a background thread.
+
+        The first run starts right away, so a history that has outgrown its
+        retention period shrinks soon after startup.
+
+        Args:
+            compact: Callable performing one compaction run and returning its
+                {"events_compacted", "summaries_dropped"} counts
+            interval: Seconds between runs
+        """
+        self.compact = compact
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self.runs = 0
+        self.events_compacted = 0
+        self.summaries_dropped = 0
+        self.last_duration = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="detection-log-compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                result = self.compact()
+                self.events_compacted += result["events_compacted"]
+                self.summaries_dropped += result["summaries_dropped"]
+                if result["events_compacted"] or result["summaries_dropped"]:
+                    logger.info(f"Compacted {result['events_compacted']} log entries into hourly summaries, "
+                                f"dropped {result['summaries_dropped']} expired summaries")
+            except Exception as e:
+                logger.error(f"Error compacting detection logs: {str(e)}")
+            self.runs += 1
+            self.last_duration = time.perf_counter() - start
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout=10):
+        """Stop after the current run (if any) finishes."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Run and compaction counters."""
+        return {
+            "runs": self.runs,
+            "events_compacted": self.events_compacted,
+            "summaries_dropped": self.summaries_dropped,
+            "last_duration": self.last_duration
+        }
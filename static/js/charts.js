@@ -22,7 +22,11 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Load analysis data from server
     function loadAnalysisData() {
-        fetch('/api/analysis')
+        // Pass through an optional ?window=hour|day|week from the page URL
+        const windowParam = new URLSearchParams(window.location.search).get('window');
+        const url = windowParam ? `/api/analysis?window=${encodeURIComponent(windowParam)}` : '/api/analysis';
+        
+        fetch(url)
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
@@ -71,9 +71,10 @@ document.addEventListener('DOMContentLoaded', function() {
         spinner.classList.remove('d-none');
         uploadBtn.disabled = true;
         
-        // Create form data
+        // Create form data (boxes are drawn here, so skip server-side annotation)
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('annotate', '0');
         
         // Send image to server
         fetch('/api/detect/image', {
@@ -87,9 +88,13 @@ document.addEventListener('DOMContentLoaded', function() {
             uploadBtn.disabled = false;
             
             if (data.success) {
-                // Show result image
-                resultImage.src = data.image;
-                resultImage.classList.remove('d-none');
+                // Show result image (server-annotated if provided, else drawn locally)
+                if (data.image) {
+                    resultImage.src = data.image;
+                    resultImage.classList.remove('d-none');
+                } else {
+                    renderDetections(preview, data.detections);
+                }
                 
                 // Display detections
                 displayDetections(data.detections);
@@ -115,6 +120,52 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Stable color per class name
+    function classColor(className) {
+        let hash = 0;
+        for (let i = 0; i < className.length; i++) {
+            hash = (hash * 31 + className.charCodeAt(i)) % 360;
+        }
+        return `hsl(${hash}, 90%, 55%)`;
+    }
+    
+    // Draw detection boxes over the uploaded image and show the result
+    function renderDetections(sourceImage, detections) {
+        const canvas = document.createElement('canvas');
+        canvas.width = sourceImage.naturalWidth;
+        canvas.height = sourceImage.naturalHeight;
+        
+        const context = canvas.getContext('2d');
+        context.drawImage(sourceImage, 0, 0);
+        context.lineWidth = 2;
+        context.font = '14px sans-serif';
+        
+        detections.forEach(detection => {
+            const [x, y, w, h] = detection.bbox;
+            const color = classColor(detection.class);
+            const text = `${detection.class}: ${detection.confidence.toFixed(2)}`;
+            
+            // Draw bounding box
+            context.strokeStyle = color;
+            context.strokeRect(x, y, w, h);
+            
+            // Draw label background and text
+            const textWidth = context.measureText(text).width;
+            context.fillStyle = color;
+            context.fillRect(x, y - 20, textWidth + 8, 20);
+            context.fillStyle = '#000';
+            context.fillText(text, x + 4, y - 5);
+        });
+        
+        canvas.toBlob(function(blob) {
+            if (resultImage.src.startsWith('blob:')) {
+                URL.revokeObjectURL(resultImage.src);
+            }
+            resultImage.src = URL.createObjectURL(blob);
+            resultImage.classList.remove('d-none');
+        }, 'image/png');
+    }
+    
     // Display detection results
     function displayDetections(detections) {
         // Clear previous results
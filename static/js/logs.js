@@ -10,39 +10,80 @@ document.addEventListener('DOMContentLoaded', function() {
     const exportLogsBtn = document.getElementById('exportLogs');
     const alertContainer = document.getElementById('alertContainer');
     
-    // Initialize log data
-    let allLogs = [];
-    let filteredLogs = [];
+    // Initialize log data (pages of log summaries loaded so far)
+    let loadedLogs = [];
+    let nextCursor = null;
+    let totalLogs = 0;
+    let filtersPopulated = false;
+    let objectFilterTimer = null;
     
     // Load logs from server
-    loadLogs();
+    loadLogs(true);
     
     // Set up event listeners
     sourceFilter.addEventListener('change', applyFilters);
     dateFilter.addEventListener('change', applyFilters);
-    objectFilter.addEventListener('input', applyFilters);
+    objectFilter.addEventListener('input', function() {
+        // Debounce typing so we don't query on every keystroke
+        clearTimeout(objectFilterTimer);
+        objectFilterTimer = setTimeout(applyFilters, 300);
+    });
     clearFiltersBtn.addEventListener('click', clearFilters);
     exportLogsBtn.addEventListener('click', exportLogs);
     
-    // Load logs from server
-    function loadLogs() {
-        // Show loading indicator
-        logsContainer.innerHTML = '<div class="text-center"><div class="spinner-border" role="status"></div><p class="mt-2">Loading logs...</p></div>';
+    // Build the /api/logs query string from the current filters
+    function buildLogsQuery(cursor, view) {
+        const params = new URLSearchParams();
+        const sourceType = sourceFilter.value;
+        const date = dateFilter.value;
+        const objectClass = objectFilter.value.trim().toLowerCase();
+        
+        if (sourceType && sourceType !== 'all') {
+            params.set('source_type', sourceType);
+        }
+        if (date) {
+            params.set('since', `${date}T00:00:00`);
+            params.set('until', `${date}T23:59:59.999999`);
+        }
+        if (objectClass) {
+            params.set('class', objectClass);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        if (view) {
+            params.set('view', view);
+        }
+        
+        return params.toString();
+    }
+    
+    // Load a page of logs from server (reset starts again from the newest)
+    function loadLogs(reset) {
+        if (reset) {
+            // Show loading indicator
+            logsContainer.innerHTML = '<div class="text-center"><div class="spinner-border" role="status"></div><p class="mt-2">Loading logs...</p></div>';
+        }
         
         // Fetch logs from server
-        fetch('/api/logs')
+        fetch('/api/logs?' + buildLogsQuery(reset ? null : nextCursor))
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
                     // Store logs
-                    allLogs = data.logs;
-                    filteredLogs = [...allLogs];
+                    loadedLogs = reset ? data.logs : loadedLogs.concat(data.logs);
+                    nextCursor = data.next_cursor;
+                    totalLogs = data.total_logs;
                     
                     // Display logs
-                    displayLogs(filteredLogs);
+                    displayLogs(loadedLogs);
+                    updateFilterSummary();
                     
                     // Populate filter options
-                    populateFilters(allLogs);
+                    if (!filtersPopulated) {
+                        populateFilters(data.source_types);
+                        filtersPopulated = true;
+                    }
                 } else {
                     // Handle error
                     logsContainer.innerHTML = `<div class="alert alert-danger">Error loading logs: ${data.error}</div>`;
@@ -61,10 +102,7 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
-        // Sort logs by timestamp (newest first)
-        logs.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-        
-        // Build HTML for logs table
+        // Build HTML for logs table (the server returns newest first)
         let logsHTML = `
             <div class="table-responsive">
                 <table class="table table-striped table-hover">
@@ -91,9 +129,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const detectionCount = log.detection_count || log.total_detections || 0;
             
             // Get detected classes
-            const detectedClasses = log.detected_classes || [];
-            const uniqueClasses = [...new Set(detectedClasses)];
-            const classesStr = uniqueClasses.join(', ');
+            const classesStr = Object.keys(log.class_counts || {}).join(', ');
             
             // Build the table row
             logsHTML += `
@@ -119,9 +155,22 @@ document.addEventListener('DOMContentLoaded', function() {
             </div>
         `;
         
+        // Offer the next page if there is one
+        if (nextCursor) {
+            logsHTML += `
+                <div class="text-center mb-3">
+                    <button class="btn btn-outline-secondary" id="loadMoreLogs">Load More</button>
+                </div>
+            `;
+        }
+        
         // Update container with logs table
         logsContainer.innerHTML = logsHTML;
         
+        if (nextCursor) {
+            document.getElementById('loadMoreLogs').addEventListener('click', () => loadLogs(false));
+        }
+        
         // Add event listeners to view details buttons
         document.querySelectorAll('.view-details').forEach(button => {
             button.addEventListener('click', function() {
@@ -132,10 +181,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Populate filter options
-    function populateFilters(logs) {
-        // Get unique source types
-        const sourceTypes = [...new Set(logs.map(log => log.source_type))];
-        
+    function populateFilters(sourceTypes) {
         // Clear current options (except "All")
         while (sourceFilter.options.length > 1) {
             sourceFilter.remove(1);
@@ -154,50 +200,16 @@ document.addEventListener('DOMContentLoaded', function() {
         dateFilter.setAttribute('max', today);
     }
     
-    // Apply filters to logs
+    // Apply filters to logs (filtering happens on the server)
     function applyFilters() {
-        const sourceType = sourceFilter.value;
-        const date = dateFilter.value;
-        const objectClass = objectFilter.value.toLowerCase();
-        
-        // Filter logs based on selected criteria
-        filteredLogs = allLogs.filter(log => {
-            // Source type filter
-            if (sourceType && sourceType !== 'all' && log.source_type !== sourceType) {
-                return false;
-            }
-            
-            // Date filter
-            if (date) {
-                const logDate = new Date(log.timestamp).toISOString().split('T')[0];
-                if (logDate !== date) {
-                    return false;
-                }
-            }
-            
-            // Object class filter
-            if (objectClass) {
-                const detectedClasses = log.detected_classes || [];
-                const hasClass = detectedClasses.some(cls => 
-                    cls.toLowerCase().includes(objectClass)
-                );
-                if (!hasClass) {
-                    return false;
-                }
-            }
-            
-            return true;
-        });
-        
-        // Update displayed logs
-        displayLogs(filteredLogs);
-        
-        // Show filter summary
-        const filterCount = filteredLogs.length;
-        const totalCount = allLogs.length;
-        
+        loadLogs(true);
+    }
+    
+    // Show filter summary
+    function updateFilterSummary() {
+        const more = nextCursor ? '+' : '';
         document.getElementById('filterSummary').textContent = 
-            `Showing ${filterCount} of ${totalCount} logs`;
+            `Showing ${loadedLogs.length}${more} of ${totalLogs} logs`;
     }
     
     // Clear all filters
@@ -206,27 +218,30 @@ document.addEventListener('DOMContentLoaded', function() {
         dateFilter.value = '';
         objectFilter.value = '';
         
-        // Reset filtered logs to all logs
-        filteredLogs = [...allLogs];
-        
-        // Update displayed logs
-        displayLogs(filteredLogs);
-        
-        // Reset filter summary
-        document.getElementById('filterSummary').textContent = 
-            `Showing all ${allLogs.length} logs`;
+        // Reload logs without filters
+        loadLogs(true);
     }
     
     // Show log details in modal
     function showLogDetails(logId) {
-        // Find the log entry
-        const log = allLogs.find(entry => entry.id === logId);
-        
-        if (!log) {
-            showAlert('error', 'Log entry not found');
-            return;
-        }
-        
+        // Fetch the full log entry (the table only holds summaries)
+        fetch(`/api/logs/${logId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    renderLogDetails(data.log);
+                } else {
+                    showAlert('error', data.error || 'Log entry not found');
+                }
+            })
+            .catch(error => {
+                console.error('Error loading log details:', error);
+                showAlert('error', 'Error loading log details');
+            });
+    }
+    
+    // Render a full log entry into the details modal
+    function renderLogDetails(log) {
         // Get modal elements
         const modalTitle = document.getElementById('logDetailsModalLabel');
         const modalBody = document.getElementById('logDetailsModalBody');
@@ -331,35 +346,52 @@ document.addEventListener('DOMContentLoaded', function() {
         modalBody.innerHTML = detailsHTML;
     }
     
+    // Fetch every page of full logs matching the current filters
+    function fetchAllFilteredLogs(cursor, collected) {
+        return fetch('/api/logs?' + buildLogsQuery(cursor, 'full') + '&limit=1000')
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error);
+                }
+                collected = collected.concat(data.logs);
+                return data.next_cursor ? fetchAllFilteredLogs(data.next_cursor, collected) : collected;
+            });
+    }
+    
     // Export logs to JSON file
     function exportLogs() {
-        // Prepare data to export (use filtered logs if any filters are applied)
-        const dataToExport = filteredLogs.length < allLogs.length ? filteredLogs : allLogs;
-        
-        // Convert to JSON string
-        const jsonStr = JSON.stringify(dataToExport, null, 2);
-        
-        // Create blob and download link
-        const blob = new Blob([jsonStr], { type: 'application/json' });
-        const url = URL.createObjectURL(blob);
-        
-        // Create download link
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `detection_logs_${new Date().toISOString().split('T')[0]}.json`;
-        
-        // Trigger download
-        document.body.appendChild(a);
-        a.click();
-        
-        // Clean up
-        setTimeout(() => {
-            document.body.removeChild(a);
-            URL.revokeObjectURL(url);
-        }, 100);
-        
-        // Show success message
-        showAlert('success', `Exported ${dataToExport.length} log entries`);
+        fetchAllFilteredLogs(null, [])
+            .then(dataToExport => {
+                // Convert to JSON string
+                const jsonStr = JSON.stringify(dataToExport, null, 2);
+                
+                // Create blob and download link
+                const blob = new Blob([jsonStr], { type: 'application/json' });
+                const url = URL.createObjectURL(blob);
+                
+                // Create download link
+                const a = document.createElement('a');
+                a.href = url;
+                a.download = `detection_logs_${new Date().toISOString().split('T')[0]}.json`;
+                
+                // Trigger download
+                document.body.appendChild(a);
+                a.click();
+                
+                // Clean up
+                setTimeout(() => {
+                    document.body.removeChild(a);
+                    URL.revokeObjectURL(url);
+                }, 100);
+                
+                // Show success message
+                showAlert('success', `Exported ${dataToExport.length} log entries`);
+            })
+            .catch(error => {
+                console.error('Error exporting logs:', error);
+                showAlert('error', 'Error exporting logs');
+            });
     }
     
     // Format time (seconds to MM:SS)
@@ -92,41 +92,32 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
         
-        // Handle response
+        // Handle response (the server queues a background job and returns its id)
         xhr.addEventListener('load', function() {
-            // Hide spinner and update progress
-            spinner.classList.add('d-none');
-            progressBar.style.width = '100%';
-            progressBar.setAttribute('aria-valuenow', 100);
-            progressBar.textContent = 'Processing complete';
-            progressBar.classList.remove('progress-bar-striped', 'progress-bar-animated');
+            let response = {};
+            try {
+                response = JSON.parse(xhr.responseText);
+            } catch (err) {
+                response = {};
+            }
+            
+            if (xhr.status === 202 && response.success) {
+                // Upload finished; track processing progress from here
+                progressBar.style.width = '0%';
+                progressBar.setAttribute('aria-valuenow', 0);
+                progressBar.textContent = 'Queued';
+                pollJob(response.job_id);
+                return;
+            }
             
-            // Re-enable upload button
+            // Hide spinner and re-enable upload button
+            spinner.classList.add('d-none');
             uploadBtn.disabled = false;
             
-            if (xhr.status === 200) {
-                // Parse response
-                const response = JSON.parse(xhr.responseText);
-                
-                if (response.success) {
-                    // Show results
-                    resultContainer.classList.remove('d-none');
-                    
-                    // Display detections
-                    displayDetections(response.detections);
-                    
-                    // Display stats
-                    displayStats(response.detections);
-                    
-                    // Show success message
-                    showAlert('success', `Video processing completed! Analyzed ${response.detections.length} frames.`);
-                } else {
-                    // Show error
-                    showAlert('error', response.error || 'Error processing video');
-                }
+            if (xhr.status === 503) {
+                showAlert('error', response.error || 'Server is busy, please try again shortly');
             } else {
-                // Show error
-                showAlert('error', 'Error processing video. Server returned status: ' + xhr.status);
+                showAlert('error', response.error || 'Error processing video. Server returned status: ' + xhr.status);
             }
         });
         
@@ -151,10 +142,65 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         // Open and send request
-        xhr.open('POST', '/api/detect/video', true);
+        xhr.open('POST', '/api/jobs/video', true);
         xhr.send(formData);
     });
     
+    // Poll a background video job until it completes
+    function pollJob(jobId) {
+        fetch(`/api/jobs/${jobId}?since=0`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Job not found');
+                }
+                
+                const job = data.job;
+                const percent = Math.round(job.progress);
+                progressBar.style.width = percent + '%';
+                progressBar.setAttribute('aria-valuenow', percent);
+                progressBar.textContent = job.status === 'queued' ? 'Queued' : `Processing ${percent}%`;
+                
+                if (job.status === 'completed') {
+                    finishJob(job.detections);
+                } else if (job.status === 'failed') {
+                    throw new Error(job.error || 'Error processing video');
+                } else {
+                    setTimeout(() => pollJob(jobId), 1000);
+                }
+            })
+            .catch(error => {
+                spinner.classList.add('d-none');
+                uploadBtn.disabled = false;
+                showAlert('error', error.message);
+            });
+    }
+    
+    // Show the results of a completed job
+    function finishJob(detections) {
+        // Hide spinner and update progress
+        spinner.classList.add('d-none');
+        progressBar.style.width = '100%';
+        progressBar.setAttribute('aria-valuenow', 100);
+        progressBar.textContent = 'Processing complete';
+        progressBar.classList.remove('progress-bar-striped', 'progress-bar-animated');
+        
+        // Re-enable upload button
+        uploadBtn.disabled = false;
+        
+        // Show results
+        resultContainer.classList.remove('d-none');
+        
+        // Display detections
+        displayDetections(detections);
+        
+        // Display stats
+        displayStats(detections);
+        
+        // Show success message
+        showAlert('success', `Video processing completed! Analyzed ${detections.length} frames.`);
+    }
+    
     // Display detection results
     function displayDetections(detections) {
         // Clear previous results
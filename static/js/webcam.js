@@ -8,6 +8,16 @@ let detectionInterval = null;
 let lastDetectionTime = 0;
 let detections = [];
 
+// Streaming settings: frames are posted as raw JPEG bytes and the server
+// answers with detection JSON, which is drawn here on the canvas
+const TARGET_FPS = 10;
+const MAX_IN_FLIGHT = 2;
+const JPEG_QUALITY = 0.8;
+let streamId = null;
+let frameSeq = 0;
+let inFlight = 0;
+let lastRenderedSeq = -1;
+
 // Initialize webcam functionality
 function initWebcam() {
     video = document.getElementById('webcam');
@@ -67,58 +77,106 @@ function stopWebcam() {
 
 // Start object detection at intervals
 function startDetection() {
-    // Set up detection at regular intervals (e.g., every 1 second)
-    detectionInterval = setInterval(detectObjects, 1000);
+    // New stream id per session so the server gates our frames separately
+    streamId = Math.random().toString(36).slice(2);
+    frameSeq = 0;
+    inFlight = 0;
+    lastRenderedSeq = -1;
+    
+    detectionInterval = setInterval(detectObjects, 1000 / TARGET_FPS);
 }
 
 // Capture frame from webcam and send for detection
 function detectObjects() {
     if (!isStreaming) return;
     
-    // Get the canvas context
-    const context = captureCanvas.getContext('2d');
+    // Skip this tick if the server hasn't caught up yet
+    if (inFlight >= MAX_IN_FLIGHT) return;
     
-    // Set canvas size to match video dimensions
-    captureCanvas.width = video.videoWidth;
-    captureCanvas.height = video.videoHeight;
+    // Capture the current video frame onto its own canvas so it can be
+    // drawn together with its detections when the response arrives
+    const frameCanvas = document.createElement('canvas');
+    frameCanvas.width = video.videoWidth;
+    frameCanvas.height = video.videoHeight;
+    frameCanvas.getContext('2d').drawImage(video, 0, 0, frameCanvas.width, frameCanvas.height);
     
-    // Draw the current video frame to the canvas
-    context.drawImage(video, 0, 0, captureCanvas.width, captureCanvas.height);
+    const seq = frameSeq++;
+    inFlight++;
     
-    // Convert canvas to data URL
-    const dataURL = captureCanvas.toDataURL('image/jpeg');
-    
-    // Send the image data to the server for object detection
-    fetch('/api/detect/webcam', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-            image: dataURL
+    frameCanvas.toBlob(function(blob) {
+        // Send the raw JPEG bytes to the server for object detection
+        fetch(`/api/detect/webcam/frame?stream=${streamId}&seq=${seq}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'image/jpeg'
+            },
+            body: blob
         })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            // Display the processed image with detections
-            displayProcessedImage(data.image);
-            
-            // Update detections list
-            detections = data.detections;
-            updateDetectionList(detections);
-            
-            // Update stats
-            lastDetectionTime = new Date();
-            updateStats(detections, data.process_time);
-        } else {
-            console.error('Detection error:', data.error);
-            showAlert('error', 'Detection error: ' + data.error);
-        }
-    })
-    .catch(error => {
-        console.error('Error sending image for detection:', error);
-        showAlert('error', 'Error sending image for detection');
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                // Ignore frames the server skipped and responses that arrive out of order
+                if (data.dropped || seq < lastRenderedSeq) return;
+                lastRenderedSeq = seq;
+                
+                // Draw the frame with its detections
+                drawFrameWithDetections(frameCanvas, data.detections);
+                
+                // Update detections list
+                detections = data.detections;
+                updateDetectionList(detections);
+                
+                // Update stats
+                lastDetectionTime = new Date();
+                updateStats(detections, data.process_time);
+            } else {
+                console.error('Detection error:', data.error);
+                showAlert('error', 'Detection error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error sending image for detection:', error);
+            showAlert('error', 'Error sending image for detection');
+        })
+        .finally(() => {
+            inFlight--;
+        });
+    }, 'image/jpeg', JPEG_QUALITY);
+}
+
+// Stable color per class name
+function classColor(className) {
+    let hash = 0;
+    for (let i = 0; i < className.length; i++) {
+        hash = (hash * 31 + className.charCodeAt(i)) % 360;
+    }
+    return `hsl(${hash}, 90%, 55%)`;
+}
+
+// Draw a frame and its detection boxes on the display canvas
+function drawFrameWithDetections(frameCanvas, detections) {
+    const context = canvas.getContext('2d');
+    canvas.width = frameCanvas.width;
+    canvas.height = frameCanvas.height;
+    context.drawImage(frameCanvas, 0, 0);
+    
+    context.lineWidth = 2;
+    context.font = '14px sans-serif';
+    detections.forEach(detection => {
+        const [x, y, w, h] = detection.bbox;
+        const color = classColor(detection.class);
+        const text = `${detection.class}: ${detection.confidence.toFixed(2)}`;
+        
+        // Draw bounding box
+        context.strokeStyle = color;
+        context.strokeRect(x, y, w, h);
+        
+        // Draw label background and text
+        const textWidth = context.measureText(text).width;
+        context.fillStyle = color;
+        context.fillRect(x, y - 20, textWidth + 8, 20);
+        context.fillStyle = '#000';
+        context.fillText(text, x + 4, y - 5);
     });
 }
 
@@ -247,7 +305,7 @@ function displayWebcamLogs() {
                     const timestamp = new Date(log.timestamp).toLocaleString();
                     
                     // Get unique detected classes
-                    const classes = [...new Set(log.detected_classes)].join(', ');
+                    const classes = Object.keys(log.class_counts || {}).join(', ');
                     
                     logsHTML += `
                         <tr>
@@ -290,12 +348,8 @@ function generateLogsSummary(logs) {
     // Count detections by class
     const classCounts = {};
     logs.forEach(log => {
-        log.detected_classes.forEach(className => {
-            if (classCounts[className]) {
-                classCounts[className]++;
-            } else {
-                classCounts[className] = 1;
-            }
+        Object.entries(log.class_counts || {}).forEach(([className, count]) => {
+            classCounts[className] = (classCounts[className] || 0) + count;
         });
     });
     
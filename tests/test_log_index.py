@@ -0,0 +1,108 @@
+import pytest
+
+from log_index import LogIndex
+
+CLASSES = ["person", "car", "dog"]
+SOURCES = ["image", "webcam", "video"]
+
+
+def make_log(log_id):
+    return {
+        "id": log_id,
+        "timestamp": f"2026-01-01T00:{log_id // 60:02d}:{log_id % 60:02d}",
+        "source_type": SOURCES[log_id % 3],
+        "detections": [{"class": CLASSES[log_id % 2 + (log_id % 5 == 0)], "confidence": (log_id % 10) / 10,
+                        "bbox": [0, 0, 1, 1]}],
+    }
+
+
+@pytest.fixture
+def logs():
+    return [make_log(log_id) for log_id in range(1, 201)]
+
+
+@pytest.fixture
+def index(logs):
+    log_index = LogIndex()
+    log_index.rebuild(logs)
+    return log_index
+
+
+def all_pages(index, logs, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        positions, cursor = index.query(cursor=cursor, limit=limit, **filters)
+        ids.extend(logs[position]["id"] for position in positions)
+        if cursor is None:
+            return ids
+
+
+def test_query_is_newest_first(index, logs):
+    positions, cursor = index.query(limit=5)
+    assert [logs[position]["id"] for position in positions] == [200, 199, 198, 197, 196]
+    assert cursor == 196
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, 200, 500])
+def test_cursor_pages_cover_every_entry_once(index, logs, limit):
+    assert all_pages(index, logs, limit) == list(range(200, 0, -1))
+
+
+def test_last_page_has_no_cursor(index):
+    positions, cursor = index.query(limit=200)
+    assert len(positions) == 200
+    assert cursor is None
+
+
+def test_cursor_excludes_ids_at_or_above_it(index, logs):
+    positions, _ = index.query(cursor=100, limit=3)
+    assert [logs[position]["id"] for position in positions] == [99, 98, 97]
+
+
+@pytest.mark.parametrize("filters", [
+    {"source_type": "webcam"},
+    {"detected_class": "dog"},
+    {"source_type": "video", "detected_class": "car"},
+    {"min_confidence": 0.8},
+    {"source_type": "image", "min_confidence": 0.5},
+])
+def test_filtered_pages_match_a_scan(index, logs, filters):
+    def matches(log):
+        detection = log["detections"][0]
+        return (log["source_type"] == filters.get("source_type", log["source_type"])
+                and detection["class"] == filters.get("detected_class", detection["class"])
+                and detection["confidence"] >= filters.get("min_confidence", 0))
+
+    expected = [log["id"] for log in reversed(logs) if matches(log)]
+    assert expected
+    assert all_pages(index, logs, 6, **filters) == expected
+
+
+def test_since_and_until_are_inclusive(index, logs):
+    since, until = logs[49]["timestamp"], logs[59]["timestamp"]
+    positions, cursor = index.query(since=since, until=until, limit=100)
+    assert [logs[position]["id"] for position in positions] == list(range(60, 49, -1))
+    assert cursor is None
+
+
+def test_time_bounds_combine_with_cursor_and_filters(index, logs):
+    since, until = logs[19]["timestamp"], logs[119]["timestamp"]
+    expected = [log["id"] for log in reversed(logs[19:120]) if log["source_type"] == "webcam"]
+    assert all_pages(index, logs, 4, source_type="webcam", since=since, until=until) == expected
+
+
+def test_empty_ranges(index):
+    assert index.query(since="2027-01-01T00:00:00") == ([], None)
+    assert index.query(until="2025-01-01T00:00:00") == ([], None)
+    assert index.query(cursor=1) == ([], None)
+    assert index.query(detected_class="giraffe") == ([], None)
+
+
+def test_drop_head_shifts_positions(index, logs):
+    index.drop_head(150)
+    remaining = logs[150:]
+    positions, _ = index.query(detected_class="dog", limit=100)
+    assert [remaining[position]["id"] for position in positions] == \
+        [log["id"] for log in reversed(remaining) if log["detections"][0]["class"] == "dog"]
+    assert index.position_of(151) == 0
+    assert index.position_of(150) is None
@@ -0,0 +1,150 @@
+import json
+import os
+
+from log_store import JsonlLogStore
+
+
+def make_entries(first_id, count):
+    return [{"id": i, "timestamp": f"2026-01-01T00:00:{i:02d}", "source_type": "image"}
+            for i in range(first_id, first_id + count)]
+
+
+def open_store(directory, **kwargs):
+    kwargs.setdefault("legacy_file", None)
+    kwargs.setdefault("fsync_policy", "never")
+    return JsonlLogStore(str(directory), **kwargs)
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+
+def test_append_and_reload(tmp_path):
+    store = open_store(tmp_path)
+    assert store.load() == []
+    store.append_many(make_entries(1, 3))
+    store.append(make_entries(4, 1)[0])
+    store.close()
+
+    store = open_store(tmp_path)
+    assert [entry["id"] for entry in store.load()] == [1, 2, 3, 4]
+    assert store.last_id == 4
+    store.close()
+
+
+def test_torn_write_is_truncated_on_load(tmp_path):
+    store = open_store(tmp_path)
+    store.load()
+    store.append_many(make_entries(1, 3))
+    store.close()
+    path = tmp_path / segment_files(tmp_path)[0]
+    intact_size = path.stat().st_size
+    with open(path, "a") as f:
+        f.write('{"id": 4, "timest')
+
+    store = open_store(tmp_path)
+    assert [entry["id"] for entry in store.load()] == [1, 2, 3]
+    assert path.stat().st_size == intact_size
+
+    # New appends start on a clean line
+    store.append_many(make_entries(4, 1))
+    store.close()
+    store = open_store(tmp_path)
+    assert [entry["id"] for entry in store.load()] == [1, 2, 3, 4]
+    store.close()
+
+
+def test_corrupt_line_is_skipped(tmp_path):
+    store = open_store(tmp_path)
+    store.load()
+    store.append_many(make_entries(1, 1))
+    store.close()
+    path = tmp_path / segment_files(tmp_path)[0]
+    with open(path, "a") as f:
+        f.write("not json\n")
+    store = open_store(tmp_path)
+    store.load()
+    store.append_many(make_entries(2, 1))
+    store.close()
+
+    store = open_store(tmp_path)
+    assert [entry["id"] for entry in store.load()] == [1, 2]
+    store.close()
+
+
+def test_entries_survive_segment_rotation(tmp_path):
+    store = open_store(tmp_path, segment_max_bytes=200)
+    store.load()
+    for i in range(1, 21):
+        store.append_many(make_entries(i, 1))
+    store.close()
+    assert len(segment_files(tmp_path)) > 1
+
+    store = open_store(tmp_path, segment_max_bytes=200)
+    assert [entry["id"] for entry in store.load()] == list(range(1, 21))
+    store.close()
+
+
+def test_legacy_file_is_migrated(tmp_path):
+    legacy = tmp_path / "detection_logs.json"
+    legacy.write_text(json.dumps(make_entries(1, 5)))
+
+    store = open_store(tmp_path / "logs", legacy_file=str(legacy))
+    assert [entry["id"] for entry in store.load()] == [1, 2, 3, 4, 5]
+    assert not legacy.exists()
+    assert (tmp_path / "detection_logs.json.migrated").exists()
+    store.append_many(make_entries(6, 1))
+    store.close()
+
+    # Migration happens once; later loads read the segments only
+    store = open_store(tmp_path / "logs", legacy_file=str(legacy))
+    assert [entry["id"] for entry in store.load()] == [1, 2, 3, 4, 5, 6]
+    store.close()
+
+
+def test_interrupted_migration_retires_legacy_file(tmp_path):
+    # Segment written, but the process stopped before renaming the legacy file
+    store = open_store(tmp_path / "logs")
+    store.load()
+    store.append_many(make_entries(1, 2))
+    store.close()
+    legacy = tmp_path / "detection_logs.json"
+    legacy.write_text(json.dumps(make_entries(1, 2)))
+
+    store = open_store(tmp_path / "logs", legacy_file=str(legacy))
+    assert [entry["id"] for entry in store.load()] == [1, 2]
+    assert not legacy.exists()
+    assert (tmp_path / "detection_logs.json.migrated").exists()
+    store.close()
+
+
+def test_unreadable_legacy_file_is_left_in_place(tmp_path):
+    legacy = tmp_path / "detection_logs.json"
+    legacy.write_text("[{")
+
+    store = open_store(tmp_path / "logs", legacy_file=str(legacy))
+    assert store.load() == []
+    assert legacy.exists()
+    store.close()
+
+
+def test_read_new_sees_appends_from_another_store(tmp_path):
+    writer = open_store(tmp_path, segment_max_bytes=300)
+    reader = open_store(tmp_path, segment_max_bytes=300)
+    writer.load()
+    reader.load()
+    assert not reader.has_new()
+
+    for i in range(1, 11):
+        with writer.locked():
+            writer.read_new()
+            writer.append_many(make_entries(i, 1))
+    assert reader.has_new()
+    with reader.locked():
+        entries, rewritten = reader.read_new()
+    assert [entry["id"] for entry in entries] == list(range(1, 11))
+    assert not rewritten
+    assert reader.last_id == 10
+    assert not reader.has_new()
+    writer.close()
+    reader.close()
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+from preprocess import jpeg_size
+
+
+def encode(width, height, *params):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    ok, data = cv2.imencode(".jpg", image, list(params))
+    assert ok
+    return data.tobytes()
+
+
+def sof_offset(data):
+    # Baseline (SOF0) or progressive (SOF2) frame header
+    return min(offset for offset in (data.find(b"\xff\xc0"), data.find(b"\xff\xc2")) if offset != -1)
+
+
+def test_baseline_jpeg():
+    assert jpeg_size(encode(640, 480)) == (640, 480)
+
+
+def test_progressive_jpeg():
+    data = encode(321, 123, cv2.IMWRITE_JPEG_PROGRESSIVE, 1)
+    assert b"\xff\xc2" in data
+    assert jpeg_size(data) == (321, 123)
+
+
+@pytest.mark.parametrize("params", [(), (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)])
+def test_truncated_after_frame_header(params):
+    data = encode(200, 100, *params)
+    assert jpeg_size(data[:sof_offset(data) + 9]) == (200, 100)
+    assert jpeg_size(data[:len(data) // 2]) == (200, 100)
+
+
+@pytest.mark.parametrize("params", [(), (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)])
+def test_truncated_before_frame_header(params):
+    data = encode(200, 100, *params)
+    offset = sof_offset(data)
+    for end in (2, 3, offset, offset + 4, offset + 8):
+        assert jpeg_size(data[:end]) is None
+
+
+def test_fill_bytes_before_marker():
+    data = encode(64, 48)
+    offset = sof_offset(data)
+    assert jpeg_size(data[:offset] + b"\xff\xff" + data[offset:]) == (64, 48)
+
+
+def test_not_a_jpeg():
+    ok, png = cv2.imencode(".png", np.zeros((10, 10, 3), np.uint8))
+    assert jpeg_size(png.tobytes()) is None
+    assert jpeg_size(b"") is None
+    assert jpeg_size(b"\xff\xd8garbage") is None
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from log_store import JsonlLogStore
+from logger import DetectionLogger
+from retention import RetentionPolicy
+
+NOW = datetime(2026, 3, 10, 12, 30)
+CLASSES = ["person", "car", "dog"]
+
+
+def make_entries(days=10, per_hour=2):
+    entries = []
+    timestamp = NOW - timedelta(days=days)
+    log_id = 0
+    while timestamp < NOW:
+        log_id += 1
+        detections = [{"class": CLASSES[(log_id + k) % 3], "confidence": 0.9, "bbox": [0, 0, 1, 1]}
+                      for k in range(log_id % 4)]
+        entries.append({"id": log_id, "timestamp": timestamp.isoformat(),
+                        "source_type": "image" if log_id % 2 else "webcam", "source_name": f"{log_id}.jpg",
+                        "detections": detections, "detection_count": len(detections), "process_time": 0.01})
+        timestamp += timedelta(hours=1) / per_hour
+    return entries
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    store = JsonlLogStore(str(tmp_path / "logs"), legacy_file=None, segment_max_bytes=4096, fsync_policy="never")
+    store.load()
+    store.append_many(make_entries())
+    store.close()
+    return str(tmp_path / "logs")
+
+
+def open_logger(log_dir, **retention):
+    detection_logger = DetectionLogger(log_dir=log_dir, legacy_log_file=None, fsync_policy="never")
+    # Set after construction so no background compactor runs against the real clock
+    if retention:
+        detection_logger.retention = RetentionPolicy(**retention)
+    return detection_logger
+
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        RetentionPolicy(raw_days=-1)
+    with pytest.raises(ValueError):
+        RetentionPolicy(summary_days=5)
+    with pytest.raises(ValueError):
+        RetentionPolicy(raw_days=7, summary_days=3)
+    assert not RetentionPolicy().enabled
+    assert RetentionPolicy(raw_days=3).raw_cutoff(NOW) == "2026-03-07T12:00:00"
+
+
+def test_compaction_keeps_recent_events_and_analysis(log_dir):
+    entries = make_entries()
+    cutoff = RetentionPolicy(raw_days=3).raw_cutoff(NOW)
+    expected = [entry["id"] for entry in entries if entry["timestamp"] >= cutoff]
+
+    reference = open_logger(log_dir)
+    analysis = reference.get_analysis_data()
+    reference.close()
+
+    detection_logger = open_logger(log_dir, raw_days=3)
+    result = detection_logger.compact(NOW)
+    assert result == {"events_compacted": len(entries) - len(expected), "summaries_dropped": 0}
+    assert [log["id"] for log in detection_logger.get_all_logs()] == expected
+    assert detection_logger.count() == len(expected)
+    assert detection_logger.get_log(1) is None
+    assert detection_logger.get_analysis_data() == analysis
+
+    # Nothing left to compact, and new events get fresh ids
+    assert detection_logger.compact(NOW)["events_compacted"] == 0
+    detection_logger.log_detection("image", "new.jpg", [], 0.01)
+    assert detection_logger.count() == len(expected) + 1
+    detection_logger.close()
+
+    # Summaries and the trimmed segments persist across a restart
+    reloaded = open_logger(log_dir, raw_days=3)
+    assert reloaded.count() == len(expected) + 1
+    assert reloaded.get_analysis_data()["total_detections"] == analysis["total_detections"]
+    assert reloaded.compact(NOW)["events_compacted"] == 0
+    reloaded.close()
+
+
+def test_expired_summaries_are_dropped(log_dir):
+    detection_logger = open_logger(log_dir, raw_days=3)
+    detection_logger.compact(NOW)
+    summaries, _ = detection_logger.store.load_summaries()
+    detection_logger.close()
+
+    detection_logger = open_logger(log_dir, raw_days=3, summary_days=5)
+    result = detection_logger.compact(NOW)
+    hour_cutoff = detection_logger.retention.summary_cutoff(NOW)
+    kept, _ = detection_logger.store.load_summaries()
+    assert result["summaries_dropped"] == len(summaries) - len(kept) > 0
+    assert all(summary["hour"] >= hour_cutoff for summary in kept)
+    detection_logger.close()
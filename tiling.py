@@ -0,0 +1,212 @@
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rois(value):
+    """
+    Parse per-source regions of interest from a JSON string.
+
+    Format: {"<source>": [[x, y, w, h], ...], "default": [...]}. Values that
+    are all <= 1 are fractions of the frame size, otherwise pixels.
+
+    Raises:
+        ValueError: If the value is not valid ROI JSON
+    """
+    if not value:
+        return {}
+    rois = json.loads(value)
+    if not isinstance(rois, dict):
+        raise ValueError("ROIs must be a JSON object mapping source names to region lists")
+    for source, regions in rois.items():
+        if not all(isinstance(region, list) and len(region) == 4 for region in regions):
+            raise ValueError(f"ROIs for {source} must be [x, y, w, h] lists")
+    return rois
+
+
+def resolve_roi(roi, width, height):
+    """Convert one [x, y, w, h] ROI to pixels clipped to the frame (None if it falls outside)."""
+    x, y, w, h = roi
+    if all(0 <= v <= 1 for v in roi):
+        x, y, w, h = x * width, y * height, w * width, h * height
+    x0, y0 = max(0, int(x)), max(0, int(y))
+    x1, y1 = min(width, int(round(x + w))), min(height, int(round(y + h)))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def _axis_starts(start, length, tile, stride):
+    """Tile offsets covering [start, start + length), the last one flush with the end."""
+    if length <= tile:
+        return [start]
+    starts = list(range(start, start + length - tile, stride))
+    starts.append(start + length - tile)
+    return starts
+
+
+def merge_detections(boxes, confidences, labels, iou_threshold=0.5, containment_threshold=0.8):
+    """
+    Merge detections from overlapping tiles.
+
+    Greedy per-class suppression, highest confidence (then largest) first.
+    A box is dropped if it overlaps a kept box by IoU, or if one of the two
+    lies mostly inside the other: a tile edge cuts objects into partial
+    boxes that a plain IoU test would keep. The kept box grows to cover the
+    partial boxes it absorbs, so an object cut by a tile edge is restored.
+
+    Returns:
+        Tuple of (indices of the kept detections, their merged [x, y, w, h] boxes)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.lexsort((-areas, -np.asarray(confidences, dtype=np.float32)))
+    labels = np.asarray(labels)
+    corners = np.hstack([boxes[:, 0:2], boxes[:, 0:2] + boxes[:, 2:4]])
+
+    keep = []
+    merged = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+
+        overlap = np.clip(np.minimum(corners[:, 2:4], corners[i, 2:4]) - np.maximum(corners[:, 0:2], corners[i, 0:2]), 0, None)
+        intersection = overlap[:, 0] * overlap[:, 1]
+        iou = intersection / np.maximum(areas + areas[i] - intersection, 1e-9)
+        contained = intersection / np.maximum(np.minimum(areas, areas[i]), 1e-9) > containment_threshold
+        # Degenerate (zero-area) boxes still count as covering themselves
+        contained[i] = True
+        same_class = (labels == labels[i]) & ~suppressed
+        duplicate = same_class & ((iou > iou_threshold) | contained)
+
+        partial = corners[same_class & contained]
+        box = np.concatenate([partial[:, 0:2].min(axis=0), partial[:, 2:4].max(axis=0)])
+        keep.append(int(i))
+        merged.append([int(box[0]), int(box[1]), int(box[2] - box[0]), int(box[3] - box[1])])
+        suppressed |= duplicate
+    return keep, merged
+
+
+class TiledDetector:
+    def __init__(self, detector, tile_size=(416, 416), overlap=0.2, rois=None, full_frame=True,
+                 max_batch=32, iou_threshold=0.5):
+        """
+        Detect small objects in large frames by running the model on tiles.
+
+        Each region of interest (the whole frame if none are set) is covered
+        by overlapping tiles at the model's input size, so objects are seen
+        at close to native resolution instead of being squashed with the rest
+        of the frame. All tiles of a frame go through detect_batch together,
+        boxes are shifted back to frame coordinates, and duplicates from
+        overlapping tiles are merged.
+
+        Args:
+            detector: ObjectDetector (or InferenceClient)
+            tile_size: (width, height) of each tile, normally the model input size
+            overlap: Fraction of a tile shared with its neighbours
+            rois: [x, y, w, h] regions to cover (pixels or fractions); None for the whole frame
+            full_frame: Also run each region as a single downscaled image to catch objects larger than a tile
+            max_batch: Most tiles passed to one detect_batch call
+            iou_threshold: IoU above which detections from different tiles are merged
+        """
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be in [0, 1)")
+
+        self.detector = detector
+        self.tile_size = tuple(tile_size)
+        self.overlap = overlap
+        self.rois = rois or None
+        self.full_frame = full_frame
+        self.max_batch = max_batch
+        self.iou_threshold = iou_threshold
+
+    def config_signature(self):
+        """Detector signature extended with the tiling settings."""
+        return (f"{self.detector.config_signature()}|tiled|{self.tile_size}|{self.overlap}|"
+                f"{json.dumps(self.rois)}|{self.full_frame}|{self.iou_threshold}")
+
+    def plan(self, width, height):
+        """
+        Regions and tiles for a frame size.
+
+        Returns:
+            Tuple of (regions, tiles), each a list of (x, y, w, h) in pixels
+        """
+        regions = [resolve_roi(roi, width, height) for roi in self.rois] if self.rois else [(0, 0, width, height)]
+        regions = [region for region in regions if region is not None]
+
+        tile_w, tile_h = self.tile_size
+        stride_x = max(1, int(tile_w * (1 - self.overlap)))
+        stride_y = max(1, int(tile_h * (1 - self.overlap)))
+
+        tiles = []
+        for x, y, w, h in regions:
+            for ty in _axis_starts(y, h, tile_h, stride_y):
+                for tx in _axis_starts(x, w, tile_w, stride_x):
+                    tile = (tx, ty, min(tile_w, w), min(tile_h, h))
+                    if tile not in tiles:
+                        tiles.append(tile)
+            # A region that fits in one tile is already seen whole
+            if self.full_frame and (w > tile_w or h > tile_h):
+                tiles.append((x, y, w, h))
+        return regions, tiles
+
+    def detect(self, image):
+        """Detect objects in one frame (see ObjectDetector.detect)."""
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """
+        Detect objects in several frames; the tiles of all frames share detect_batch calls.
+
+        Returns:
+            List with one list of detection dictionaries per input image
+        """
+        crops = []
+        owners = []
+        plans = []
+        for i, image in enumerate(images):
+            regions, tiles = self.plan(image.shape[1], image.shape[0])
+            plans.append(regions)
+            for x, y, w, h in tiles:
+                crops.append(image[y:y + h, x:x + w])
+                owners.append((i, x, y))
+
+        tile_results = []
+        for start in range(0, len(crops), self.max_batch):
+            tile_results.extend(self.detector.detect_batch(crops[start:start + self.max_batch]))
+
+        # Shift boxes back into frame coordinates
+        per_image = [[] for _ in images]
+        for (i, x, y), detections in zip(owners, tile_results):
+            for detection in detections:
+                bx, by, bw, bh = detection["bbox"]
+                per_image[i].append({**detection, "bbox": [bx + x, by + y, bw, bh]})
+
+        return [self._merge(detections, regions) for detections, regions in zip(per_image, plans)]
+
+    def _merge(self, detections, regions):
+        """Keep detections centred inside a region, then merge duplicates across tiles."""
+        if not detections:
+            return []
+        boxes = np.array([d["bbox"] for d in detections], dtype=np.float32)
+        centers = boxes[:, 0:2] + boxes[:, 2:4] / 2
+        inside = np.zeros(len(detections), dtype=bool)
+        for x, y, w, h in regions:
+            inside |= ((centers[:, 0] >= x) & (centers[:, 0] < x + w) &
+                       (centers[:, 1] >= y) & (centers[:, 1] < y + h))
+
+        candidates = [d for d, keep in zip(detections, inside) if keep]
+        if not candidates:
+            return []
+        keep, merged = merge_detections(
+            [d["bbox"] for d in candidates],
+            [d["confidence"] for d in candidates],
+            [d["class"] for d in candidates],
+            iou_threshold=self.iou_threshold
+        )
+        return [{**candidates[i], "bbox": box} for i, box in zip(keep, merged)]
@@ -0,0 +1,316 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lucas-Kanade parameters for propagating tracks between detector runs
+LK_PARAMS = {
+    "winSize": (15, 15),
+    "maxLevel": 2,
+    "criteria": (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
+}
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise intersection over union of two sets of [x, y, w, h] boxes.
+
+    Returns:
+        float array of shape [len(boxes_a), len(boxes_b)]
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    a_min, a_max = a[:, None, 0:2], a[:, None, 0:2] + a[:, None, 2:4]
+    b_min, b_max = b[None, :, 0:2], b[None, :, 0:2] + b[None, :, 2:4]
+
+    overlap = np.clip(np.minimum(a_max, b_max) - np.maximum(a_min, b_min), 0, None)
+    intersection = overlap[..., 0] * overlap[..., 1]
+    union = (a[:, None, 2] * a[:, None, 3]) + (b[None, :, 2] * b[None, :, 3]) - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    def __init__(self, track_id, detection, timestamp):
+        """
+        One tracked object.
+
+        Args:
+            track_id: Stable identifier
+            detection: Detection dictionary that started the track
+            timestamp: Time the object was first seen (seconds)
+        """
+        self.id = track_id
+        self.label = detection["class"]
+        self.confidence = detection["confidence"]
+        self.bbox = np.asarray(detection["bbox"], dtype=np.float32)
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.frames = 1
+        self.missed = 0
+        self.points = None
+
+    def to_detection(self):
+        x, y, w, h = np.round(self.bbox).astype(int).tolist()
+        return {
+            "class": self.label,
+            "confidence": self.confidence,
+            "bbox": [x, y, w, h],
+            "track_id": self.id
+        }
+
+    def summary(self):
+        return {
+            "track_id": self.id,
+            "class": self.label,
+            "first_seen": round(self.first_seen, 3),
+            "last_seen": round(self.last_seen, 3),
+            "dwell_time": round(self.last_seen - self.first_seen, 3),
+            "frames": self.frames
+        }
+
+
+class ObjectTracker:
+    def __init__(self, detector, detect_interval=5, iou_threshold=0.3, max_missed=2,
+                 min_points=4, min_tracked_ratio=0.5, max_finished=1000):
+        """
+        Track objects across frames, running the detector only when needed.
+
+        The detector runs every detect_interval frames, and earlier whenever
+        a track becomes uncertain (optical flow lost too many of its points).
+        In between, tracks are moved with sparse Lucas-Kanade optical flow.
+        Detections are associated with tracks by IoU (falling back to
+        centroid distance for small, fast objects), so each object keeps a
+        stable track id for as long as it stays in view.
+
+        Args:
+            detector: ObjectDetector (or InferenceClient) used on detection frames
+            detect_interval: Run the detector at least every this many frames
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_missed: Detector runs a track may go unmatched before it ends
+            min_points: Fewest flow points a track needs to be propagated
+            min_tracked_ratio: Fraction of a track's points that must survive optical flow
+            max_finished: Ended tracks kept for the dwell time summary
+        """
+        self.detector = detector
+        self.detect_interval = max(1, detect_interval)
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_points = min_points
+        self.min_tracked_ratio = min_tracked_ratio
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tracks = []
+        self._finished = deque(maxlen=max_finished)
+        self._prev_gray = None
+        self._since_detection = 0
+
+        self.frames_processed = 0
+        self.detector_runs = 0
+        self.tracks_started = 0
+
+    def update(self, frame, timestamp=None):
+        """
+        Process the next frame of the stream.
+
+        Args:
+            frame: BGR image
+            timestamp: Frame time in seconds (defaults to the wall clock)
+
+        Returns:
+            Tuple of (detection dictionaries with a "track_id", whether the detector ran)
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            confident = self._propagate(gray) if self._prev_gray is not None else False
+
+            self._since_detection += 1
+            run_detector = not confident or self._since_detection >= self.detect_interval
+            if run_detector:
+                # Plain list: association indexes detections repeatedly
+                self._associate(list(self.detector.detect(frame)), gray, timestamp)
+                self._since_detection = 0
+                self.detector_runs += 1
+            else:
+                for track in self._tracks:
+                    if track.missed == 0:
+                        track.last_seen = timestamp
+                        track.frames += 1
+
+            self._prev_gray = gray
+            self.frames_processed += 1
+            return [track.to_detection() for track in self._tracks if track.missed == 0], run_detector
+
+    def _seed_points(self, track, gray):
+        """Pick trackable corners inside the track's box (a grid if the region is flat)."""
+        height, width = gray.shape
+        x, y, w, h = np.round(track.bbox).astype(int).tolist()
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            track.points = None
+            return
+
+        corners = cv2.goodFeaturesToTrack(gray[y0:y1, x0:x1], maxCorners=20, qualityLevel=0.01, minDistance=3)
+        if corners is None or len(corners) < self.min_points:
+            xs, ys = np.meshgrid(np.linspace(0, x1 - x0 - 1, 3), np.linspace(0, y1 - y0 - 1, 3))
+            corners = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+        track.points = (corners + (x0, y0)).astype(np.float32)
+
+    def _propagate(self, gray):
+        """
+        Move every live track with optical flow from the previous frame.
+
+        Returns:
+            False if any track lost too many points to be trusted
+        """
+        tracks = [track for track in self._tracks if track.missed == 0]
+        if not tracks:
+            # Nothing to follow; look for new objects on schedule
+            return True
+        if any(track.points is None for track in tracks):
+            return False
+
+        counts = [len(track.points) for track in tracks]
+        old_points = np.concatenate([track.points for track in tracks])
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, old_points, None, **LK_PARAMS)
+        status = status.reshape(-1).astype(bool)
+
+        confident = True
+        offset = 0
+        for track, count in zip(tracks, counts):
+            old = old_points[offset:offset + count].reshape(-1, 2)
+            new = new_points[offset:offset + count].reshape(-1, 2)
+            good = status[offset:offset + count]
+            offset += count
+
+            if good.sum() < max(self.min_points, self.min_tracked_ratio * count):
+                confident = False
+                track.points = None
+                continue
+
+            old, new = old[good], new[good]
+            shift = np.median(new - old, axis=0)
+
+            # Scale change from the spread of the points around their centre
+            old_spread = np.linalg.norm(old - old.mean(axis=0), axis=1)
+            new_spread = np.linalg.norm(new - new.mean(axis=0), axis=1)
+            valid = old_spread > 1e-3
+            scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+            center = track.bbox[0:2] + track.bbox[2:4] / 2 + shift
+            size = track.bbox[2:4] * scale
+            track.bbox = np.concatenate([center - size / 2, size]).astype(np.float32)
+            track.points = new.reshape(-1, 1, 2).astype(np.float32)
+
+        return confident
+
+    def _associate(self, detections, gray, timestamp):
+        """Match fresh detections to tracks, start new tracks and end lost ones."""
+        live = list(self._tracks)
+        det_boxes = np.array([d["bbox"] for d in detections], dtype=np.float32).reshape(-1, 4)
+        track_boxes = np.array([t.bbox for t in live], dtype=np.float32).reshape(-1, 4)
+
+        scores = iou_matrix(track_boxes, det_boxes)
+        eligible = scores >= self.iou_threshold
+        # Centroid fallback: IoU is zero for small objects that moved more than their size
+        if len(live) and len(detections):
+            track_centers = track_boxes[:, 0:2] + track_boxes[:, 2:4] / 2
+            det_centers = det_boxes[:, 0:2] + det_boxes[:, 2:4] / 2
+            distance = np.linalg.norm(track_centers[:, None] - det_centers[None], axis=2)
+            reach = np.maximum(track_boxes[:, 2:4].max(axis=1), 1.0)[:, None]
+            near = ~eligible & (distance < reach)
+            scores = np.where(near, self.iou_threshold * (1 - distance / reach), scores)
+            eligible |= near
+
+        # Only associate objects of the same class
+        same_class = np.array([[t.label == d["class"] for d in detections] for t in live], dtype=bool).reshape(scores.shape)
+        scores = np.where(eligible & same_class, scores, 0.0)
+
+        matched_tracks = set()
+        matched_detections = set()
+        # Greedy assignment, best pairs first
+        for flat in np.argsort(-scores, axis=None):
+            t, d = np.unravel_index(flat, scores.shape)
+            if scores[t, d] <= 0:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+            track = live[t]
+            track.bbox = det_boxes[d].copy()
+            track.confidence = detections[d]["confidence"]
+            track.last_seen = timestamp
+            track.frames += 1
+            track.missed = 0
+
+        for t, track in enumerate(live):
+            if t not in matched_tracks:
+                track.missed += 1
+
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                live.append(Track(next(self._ids), detection, timestamp))
+                self.tracks_started += 1
+
+        self._tracks = []
+        for track in live:
+            if track.missed > self.max_missed:
+                self._finished.append(track)
+            else:
+                self._tracks.append(track)
+                if track.missed == 0:
+                    self._seed_points(track, gray)
+
+    def summary(self):
+        """Dwell time per track, ended tracks included, in order of appearance."""
+        with self._lock:
+            tracks = list(self._finished) + self._tracks
+            return [track.summary() for track in sorted(tracks, key=lambda t: t.id)]
+
+    def stats(self):
+        """Frame, detector run and track counters."""
+        with self._lock:
+            return {
+                "frames_processed": self.frames_processed,
+                "detector_runs": self.detector_runs,
+                "active_tracks": sum(1 for track in self._tracks if track.missed == 0),
+                "tracks_started": self.tracks_started
+            }
+
+
+class StreamTrackers:
+    def __init__(self, factory, max_streams=64):
+        """
+        One ObjectTracker per live stream, created on first use.
+
+        Args:
+            factory: Callable returning a new ObjectTracker
+            max_streams: Streams kept before the least recently used is dropped
+        """
+        self.factory = factory
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._trackers = OrderedDict()
+
+    def get(self, source):
+        with self._lock:
+            tracker = self._trackers.get(source)
+            if tracker is None:
+                tracker = self.factory()
+                self._trackers[source] = tracker
+            self._trackers.move_to_end(source)
+            while len(self._trackers) > self.max_streams:
+                self._trackers.popitem(last=False)
+            return tracker
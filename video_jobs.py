@@ -0,0 +1,409 @@
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from detection_result import json_default
+from video_pipeline import VideoPipeline
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 60.0
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue is at capacity and cannot accept more work."""
+
+
+class VideoJob:
+    def __init__(self, job_id, filepath, filename, sample_rate):
+        """
+        State of a single background video detection job.
+
+        Args:
+            job_id: Unique job identifier
+            filepath: Uploaded video on disk (removed when the job finishes)
+            filename: Original (sanitised) filename, used as the log source name
+            sample_rate: Frames analysed per second of video
+        """
+        self.id = job_id
+        self.filepath = filepath
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_total = None
+        self.detections = []
+        self.snapshot_offset = 0
+        self.error = None
+        self.lock = threading.Lock()
+        # Held for a whole snapshot write, so snapshots of one job never interleave
+        self.snapshot_lock = threading.Lock()
+
+    def progress(self):
+        """Completion percentage (0-100)."""
+        if self.status == "completed":
+            return 100.0
+        if not self.frames_total:
+            return 0.0
+        return round(min(99.9, 100.0 * len(self.detections) / self.frames_total), 1)
+
+    def to_dict(self, since=None, include_detections=True):
+        """
+        Serialize the job state.
+
+        Args:
+            since: Only include frame detections from this index onwards
+            include_detections: Include per-frame detections at all
+        """
+        with self.lock:
+            data = {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "progress": self.progress(),
+                "frames_analyzed": len(self.detections),
+                "frames_total": self.frames_total,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error
+            }
+            if include_detections:
+                start = max(0, since or 0)
+                data["detections_offset"] = start
+                data["detections"] = self.detections[start:]
+            return data
+
+
+def _process_alive(pid):
+    """Whether another live process has this pid."""
+    if not pid or pid == os.getpid():
+        return False
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; assume it is still running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class VideoJobManager:
+    def __init__(self, detector, detection_logger, workers=1, max_queued=8,
+                 job_dir=None, max_finished=100, pipeline_options=None, snapshot_ttl=None):
+        """
+        Initialize the background video job subsystem.
+
+        Jobs are pulled from a bounded in-process queue by worker threads; a
+        full queue rejects new submissions instead of growing without bound.
+        When job_dir is set, job state is also snapshotted to disk so status
+        and results survive restarts and are visible from every gunicorn
+        worker process. Each job has a small state file, rewritten as it
+        progresses, and a JSON-lines file its detections are appended to.
+        Jobs left queued or running by a process that no longer exists are
+        marked failed on startup.
+
+        Args:
+            detector: ObjectDetector used for inference
+            detection_logger: DetectionLogger that receives finished jobs
+            workers: Number of jobs processed concurrently
+            max_queued: Maximum jobs waiting to start
+            job_dir: Optional directory for on-disk job snapshots
+            max_finished: Finished jobs kept in memory before the oldest are evicted
+            pipeline_options: Extra VideoPipeline keyword arguments
+            snapshot_ttl: Seconds finished job snapshots are kept on disk (None keeps them)
+        """
+        self.detector = detector
+        self.detection_logger = detection_logger
+        self.job_dir = job_dir
+        self.max_finished = max_finished
+        self.pipeline_options = pipeline_options or {}
+        self.snapshot_ttl = snapshot_ttl
+        self._last_sweep = time.monotonic()
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+
+        if self.job_dir:
+            os.makedirs(self.job_dir, exist_ok=True)
+            self._sweep_snapshots(recover=True)
+
+        self._workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"video-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, filepath, filename, sample_rate=1.0):
+        """
+        Queue a saved video for background detection.
+
+        Args:
+            filepath: Path of the uploaded video
+            filename: Original (sanitised) filename
+            sample_rate: Frames analysed per second of video
+
+        Returns:
+            The queued VideoJob
+
+        Raises:
+            JobQueueFullError: If the queue is at capacity
+            ValueError: If sample_rate is not positive
+        """
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be positive")
+
+        job = VideoJob(uuid.uuid4().hex, filepath, filename, sample_rate)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        # Written before a worker can pick the job up, so it can't overwrite a later state
+        self._snapshot(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                del self._jobs[job.id]
+            self._remove_snapshot(job.id)
+            raise JobQueueFullError("Video job queue is full, try again later")
+
+        logger.info(f"Queued video job {job.id} for {filename}")
+        return job
+
+    def queue_depth(self):
+        """Number of jobs waiting to start."""
+        return self._queue.qsize()
+
+    def get(self, job_id, since=None, include_detections=True):
+        """
+        Get a job's state as a dictionary.
+
+        Returns:
+            Job dictionary, or None if the job is unknown
+        """
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict(since=since, include_detections=include_detections)
+        return self._load_snapshot(job_id, since=since, include_detections=include_detections)
+
+    def _snapshot_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _detections_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.jsonl")
+
+    def _snapshot(self, job):
+        """
+        Persist the job to disk (no-op without job_dir).
+
+        Detections not yet on disk are appended to the job's JSON-lines
+        file, then the small state file is replaced atomically. frames_analyzed
+        in the state file counts the detection lines written before it, so
+        readers never see a partially appended line.
+        """
+        if not self.job_dir:
+            return
+        with job.snapshot_lock:
+            try:
+                with job.lock:
+                    start = job.snapshot_offset
+                    pending = job.detections[start:]
+                if pending:
+                    lines = "".join(json.dumps(frame, default=json_default) + "\n" for frame in pending)
+                    with open(self._detections_path(job.id), "a") as f:
+                        f.write(lines)
+                    job.snapshot_offset = start + len(pending)
+
+                data = job.to_dict(include_detections=False)
+                data["frames_analyzed"] = job.snapshot_offset
+                self._write_state(job.id, {**data, "filepath": job.filepath, "owner_pid": os.getpid()})
+            except Exception as e:
+                logger.error(f"Error writing snapshot for job {job.id}: {str(e)}")
+
+    def _remove_snapshot(self, job_id):
+        if not self.job_dir:
+            return
+        for path in (self._snapshot_path(job_id), self._detections_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing snapshot {path}: {str(e)}")
+
+    def _write_state(self, job_id, data):
+        path = self._snapshot_path(job_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, default=json_default)
+        os.replace(tmp_path, path)
+
+    def _read_state(self, job_id):
+        try:
+            with open(self._snapshot_path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_detections(self, job_id, start, count):
+        """Detection lines [start, count) of a job's snapshot."""
+        detections = []
+        if start >= count:
+            return detections
+        try:
+            with open(self._detections_path(job_id), "r") as f:
+                for index, line in enumerate(f):
+                    if index >= count:
+                        break
+                    if index >= start:
+                        detections.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return detections
+
+    def _load_snapshot(self, job_id, since=None, include_detections=True):
+        # Job ids are hex uuids; anything else can't name a snapshot file
+        if not self.job_dir or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        data = self._read_state(job_id)
+        if data is None:
+            return None
+        data.pop("filepath", None)
+        data.pop("owner_pid", None)
+
+        # Snapshots from before detections were split out keep them inline
+        inline = data.pop("detections", None)
+        if include_detections:
+            start = max(0, since or 0)
+            data["detections_offset"] = start
+            if inline is not None:
+                data["detections"] = inline[start:]
+            else:
+                try:
+                    data["detections"] = self._read_detections(job_id, start, data["frames_analyzed"])
+                except (OSError, ValueError):
+                    return None
+        else:
+            data.pop("detections_offset", None)
+        return data
+
+    def _sweep_snapshots(self, recover=False):
+        """
+        Remove expired snapshots and, with recover, fail jobs orphaned by a restart.
+
+        Finished jobs whose state file is older than snapshot_ttl are
+        deleted. Jobs still queued or running under a process that no longer
+        exists can never finish, so they are marked failed and their
+        uploaded video is removed.
+        """
+        cutoff = time.time() - self.snapshot_ttl if self.snapshot_ttl else None
+        try:
+            names = os.listdir(self.job_dir)
+        except OSError as e:
+            logger.error(f"Error listing video job snapshots: {str(e)}")
+            return
+
+        for name in names:
+            path = os.path.join(self.job_dir, name)
+            try:
+                if name.endswith(".tmp"):
+                    if cutoff is not None and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                    continue
+                if not name.endswith(".json"):
+                    continue
+                job_id = name[:-len(".json")]
+                data = self._read_state(job_id)
+                if data is None:
+                    continue
+
+                if data["status"] in ("queued", "running"):
+                    if recover and not _process_alive(data.get("owner_pid")):
+                        self._fail_orphaned(job_id, data)
+                elif cutoff is not None and os.path.getmtime(path) < cutoff:
+                    self._remove_snapshot(job_id)
+            except OSError as e:
+                logger.error(f"Error sweeping video job snapshot {name}: {str(e)}")
+
+    def _fail_orphaned(self, job_id, data):
+        filepath = data.get("filepath")
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+        data.update({
+            "status": "failed",
+            "finished_at": datetime.now().isoformat(),
+            "error": "Job was interrupted by a server restart"
+        })
+        self._write_state(job_id, data)
+        logger.warning(f"Marked video job {job_id} as failed: interrupted by a restart")
+
+    def _evict_finished(self):
+        with self._jobs_lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+                self._evict_finished()
+                if self.job_dir and self.snapshot_ttl and time.monotonic() - self._last_sweep >= SWEEP_INTERVAL:
+                    self._last_sweep = time.monotonic()
+                    self._sweep_snapshots()
+
+    def _run(self, job):
+        """Process one job, publishing partial detections as frames complete."""
+        with job.lock:
+            job.status = "running"
+            job.started_at = datetime.now().isoformat()
+        self._snapshot(job)
+
+        try:
+            pipeline = VideoPipeline(self.detector, sample_rate=job.sample_rate, **self.pipeline_options)
+            fps, frame_count = pipeline.probe(job.filepath)
+            if fps and frame_count > 0:
+                step = max(1, int(round(fps / job.sample_rate)))
+                with job.lock:
+                    job.frames_total = math.ceil(frame_count / step)
+
+            last_snapshot = time.monotonic()
+            for frame_result in pipeline.process(job.filepath):
+                with job.lock:
+                    job.detections.append(frame_result)
+                # Throttle disk snapshots while running
+                if self.job_dir and time.monotonic() - last_snapshot >= 1.0:
+                    self._snapshot(job)
+                    last_snapshot = time.monotonic()
+
+            self.detection_logger.log_video_detection("video", job.filename, job.detections)
+            with job.lock:
+                job.status = "completed"
+            logger.info(f"Video job {job.id} completed: {len(job.detections)} frames analyzed")
+        except Exception as e:
+            logger.error(f"Error processing video job {job.id}: {str(e)}")
+            with job.lock:
+                job.status = "failed"
+                job.error = f"Error processing video: {str(e)}"
+        finally:
+            with job.lock:
+                job.finished_at = datetime.now().isoformat()
+            if os.path.exists(job.filepath):
+                os.remove(job.filepath)
+            self._snapshot(job)
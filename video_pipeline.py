@@ -0,0 +1,347 @@
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_ring import FrameRing
+from preprocess import scale_detections
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the decoded stream on the frame queue
+_END_OF_STREAM = object()
+
+
+class VideoPipeline:
+    def __init__(self, detector, sample_rate=1.0, batch_size=8, workers=None,
+                 queue_size=4, seek_threshold=300, motion_gate=None, target_size=None):
+        """
+        Initialize a pipelined decode -> detect -> aggregate video processor.
+
+        A decoder thread walks the video, fully decoding only the sampled
+        frames (unsampled frames are skipped with grab(), or with a seek for
+        long gaps) straight into recycled FrameRing slots, and hands batches
+        of slot views over a bounded queue. A pool of
+        worker threads runs detector.detect_batch on those batches while the
+        caller consumes results in frame order as they become available.
+
+        Args:
+            detector: ObjectDetector used for inference
+            sample_rate: Frames analysed per second of video
+            batch_size: Sampled frames per detect_batch call
+            workers: Detection worker threads (defaults to the CPU count)
+            queue_size: Maximum decoded batches waiting for a worker
+            seek_threshold: Gaps of at least this many frames are skipped by
+                seeking instead of grabbing frame by frame
+            motion_gate: Optional MotionGate; sampled frames that haven't changed
+                since the last detected one reuse its detections
+            target_size: (width, height) network input size; frames of videos at
+                least twice as large are scaled down towards it right after decoding
+        """
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be positive")
+
+        self.detector = detector
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.seek_threshold = seek_threshold
+        self.motion_gate = motion_gate
+        self.target_size = target_size
+
+    @staticmethod
+    def probe(filepath):
+        """
+        Read basic stream properties.
+
+        Returns:
+            Tuple of (fps, frame_count)
+        """
+        cap = cv2.VideoCapture(filepath)
+        try:
+            return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+
+    def process(self, filepath):
+        """
+        Run the pipeline over a video file.
+
+        Args:
+            filepath: Path of the video to analyse
+
+        Yields:
+            Dictionaries with "timestamp" (seconds) and "detections" for each
+            sampled frame, in frame order (plus "motion_skipped" with a motion gate)
+        """
+        max_in_flight = self.workers * 2
+        # Enough slots for every batch that can be queued, in flight, and being filled
+        frame_queue, stop_event, decoder = self._start_decoder(
+            filepath, self.queue_size + max_in_flight + 1, self.motion_gate
+        )
+
+        # Futures are kept in submission order so results come out in frame order
+        pending = deque()
+        previous = []
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="video-detect")
+        try:
+            while True:
+                item = frame_queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                timestamps, frames, ring, slots, skipped, scale = item
+                pending.append((timestamps, skipped, executor.submit(self._detect_batch, frames, ring, slots, scale)))
+
+                while pending and (pending[0][2].done() or len(pending) >= max_in_flight):
+                    previous = yield from self._collect(pending.popleft(), previous)
+
+            while pending:
+                previous = yield from self._collect(pending.popleft(), previous)
+        finally:
+            # Also reached when the consumer stops early (e.g. client disconnect)
+            stop_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._drain(frame_queue)
+            decoder.join()
+            if self.motion_gate is not None:
+                self.motion_gate.reset(filepath)
+
+    def track(self, filepath, tracker):
+        """
+        Run an ObjectTracker over the sampled frames of a video.
+
+        Frames are decoded ahead on the decoder thread, but tracking itself is
+        sequential; the tracker decides on which frames the detector runs.
+
+        Args:
+            filepath: Path of the video to analyse
+            tracker: ObjectTracker for this video
+
+        Yields:
+            Dictionaries with "timestamp", "detections" (with track ids) and
+            "detector_ran" for each sampled frame, in frame order
+        """
+        frame_queue, stop_event, decoder = self._start_decoder(filepath, self.queue_size + 1)
+        try:
+            while True:
+                item = frame_queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                timestamps, frames, ring, slots, _, scale = item
+                try:
+                    for timestamp, frame in zip(timestamps, frames):
+                        detections, detector_ran = tracker.update(frame, timestamp)
+                        yield {
+                            "timestamp": timestamp,
+                            "detections": scale_detections(detections, scale),
+                            "detector_ran": detector_ran
+                        }
+                finally:
+                    for index in slots:
+                        if index is not None:
+                            ring.release(index)
+        finally:
+            stop_event.set()
+            self._drain(frame_queue)
+            decoder.join()
+
+    def _start_decoder(self, filepath, max_batches, motion_gate=None):
+        """Start the decoder thread with frame slots for max_batches batches."""
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+        stop_event = threading.Event()
+        decoder = threading.Thread(
+            target=self._decode,
+            args=(filepath, frame_queue, stop_event, self.batch_size * max_batches, motion_gate),
+            name="video-decoder",
+            daemon=True
+        )
+        decoder.start()
+        return frame_queue, stop_event, decoder
+
+    def _detect_batch(self, frames, ring, slots, scale):
+        """Worker task: detect, map boxes to original frame size, then recycle the batch's frame slots."""
+        try:
+            return [scale_detections(detections, scale) for detections in self.detector.detect_batch(frames)]
+        finally:
+            del frames
+            for index in slots:
+                if index is not None:
+                    ring.release(index)
+
+    def _collect(self, pending_batch, previous):
+        """
+        Yield a batch's frame results; motion-skipped frames repeat the last detections.
+
+        Returns:
+            The last detections, for the next batch
+        """
+        timestamps, skipped, future = pending_batch
+        results = iter(future.result())
+        for timestamp, frame_skipped in zip(timestamps, skipped):
+            if not frame_skipped:
+                previous = next(results)
+            frame_result = {
+                "timestamp": timestamp,
+                "detections": previous
+            }
+            if self.motion_gate is not None:
+                frame_result["motion_skipped"] = frame_skipped
+            yield frame_result
+        return previous
+
+    @staticmethod
+    def _drain(frame_queue):
+        try:
+            while True:
+                frame_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _put(self, frame_queue, item, stop_event):
+        """Put with backpressure, giving up once the consumer has stopped."""
+        while not stop_event.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _acquire_slot(self, ring, stop_event):
+        """Wait for a recycled frame slot, giving up once the consumer has stopped."""
+        while not stop_event.is_set():
+            index = ring.acquire(timeout=0.1)
+            if index is not None:
+                return index
+        return None
+
+    def _decode(self, filepath, frame_queue, stop_event, num_slots, motion_gate=None):
+        """
+        Decoder thread: read sampled frames into ring slots and queue them in batches.
+
+        Queued items are (timestamps, frames, ring, slots, skipped, scale):
+        frames holds only the frames that need the detector, skipped flags
+        the timestamps whose frame the motion gate found static, and scale is
+        the original frame size divided by the decoded one.
+        """
+        cap = cv2.VideoCapture(filepath)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"Could not open video: {os.path.basename(filepath)}")
+
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            step = max(1, int(round(fps / self.sample_rate)))
+
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            reduced_size = self._reduced_size(width, height)
+            scale = 1
+
+            # Frames are decoded in place into preallocated buffers instead of a fresh array each;
+            # large frames are decoded into one reused buffer and resized into the slots
+            if reduced_size is None:
+                shape = (height, width, 3)
+                decode_buffer = None
+            else:
+                shape = (reduced_size[1], reduced_size[0], 3)
+                decode_buffer = np.empty((height, width, 3), dtype=np.uint8)
+            ring = FrameRing(num_slots, max(1, shape[0] * shape[1] * 3), shared=False)
+
+            timestamps = []
+            frames = []
+            slots = []
+            skipped = []
+            current_frame = 0
+            while not stop_event.is_set():
+                index = self._acquire_slot(ring, stop_event)
+                if index is None:
+                    return
+                buffer = ring.frame(index, shape)
+                ret, frame = cap.read(buffer if decode_buffer is None else decode_buffer)
+                if not ret:
+                    ring.release(index)
+                    break
+                if decode_buffer is not None:
+                    if current_frame == 0:
+                        scale = frame.shape[1] / reduced_size[0]
+                    frame = cv2.resize(frame, reduced_size, dst=buffer, interpolation=cv2.INTER_AREA)
+                elif not np.shares_memory(frame, buffer):
+                    # Frame size differs from the container header; OpenCV allocated its own array
+                    ring.release(index)
+                    index = None
+
+                timestamps.append(current_frame / fps)
+                static = motion_gate is not None and motion_gate.check(filepath, frame)
+                skipped.append(static)
+                if static:
+                    if index is not None:
+                        ring.release(index)
+                else:
+                    frames.append(frame)
+                    slots.append(index)
+                if len(timestamps) >= self.batch_size:
+                    if not self._put(frame_queue, (timestamps, frames, ring, slots, skipped, scale), stop_event):
+                        return
+                    timestamps, frames, slots, skipped = [], [], [], []
+
+                # Skip to the next sampled frame without decoding the ones in between
+                if not self._skip(cap, step - 1, current_frame):
+                    break
+                current_frame += step
+
+            if timestamps:
+                self._put(frame_queue, (timestamps, frames, ring, slots, skipped, scale), stop_event)
+        except Exception as e:
+            logger.error(f"Error decoding video: {str(e)}")
+            self._put(frame_queue, e, stop_event)
+        finally:
+            cap.release()
+            self._put(frame_queue, _END_OF_STREAM, stop_event)
+
+    def _reduced_size(self, width, height):
+        """
+        (width, height) sampled frames are scaled down to, or None to keep the decoded size.
+
+        File decoders ignore CAP_PROP_FRAME_WIDTH/HEIGHT, so frames are
+        resized after decoding instead: the short side is brought down to the
+        larger network input dimension, which keeps everything the model sees
+        while the motion gate, the tracker and the blob resize work on a
+        fraction of the pixels. Frames less than twice that size are left as
+        they are, as in ImageDecoder.
+        """
+        if self.target_size is None or not width or not height:
+            return None
+        factor = min(width, height) / max(self.target_size)
+        if factor < 2:
+            return None
+        return int(round(width / factor)), int(round(height / factor))
+
+    def _skip(self, cap, count, current_frame):
+        """
+        Advance the capture past `count` frames.
+
+        Returns:
+            False once the end of the stream has been reached
+        """
+        if count <= 0:
+            return True
+
+        if self.seek_threshold and count >= self.seek_threshold:
+            return cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame + 1 + count)
+
+        for _ in range(count):
+            if not cap.grab():
+                return False
+        return True